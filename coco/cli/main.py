@@ -0,0 +1,257 @@
+"""`coco` command-line interface.
+
+Startup is kept cheap (`coco --help` only imports Typer and `coco.config`): every command
+imports the data / plotting modules it needs inside its body. Tables are written to
+`--output` (format from the suffix: .csv, .parquet, .arrow) or as CSV to stdout, and logs
+go to stderr so commands compose in shell pipelines.
+"""
+
+from __future__ import annotations
+
+from enum import StrEnum
+from pathlib import Path
+import sys
+from typing import TYPE_CHECKING, Annotated, cast
+
+import typer
+
+if TYPE_CHECKING:
+    import polars as pl
+
+    from coco.gjp.viz.export import DataFormat
+
+app = typer.Typer(
+    name="coco",
+    help="Good Judgment Project forecasting data: load, baselines, correlations, figures.",
+    no_args_is_help=True,
+    add_completion=False,
+)
+figures_app = typer.Typer(help="Render figures into FIGURES_DIR/gjp.", no_args_is_help=True)
+app.add_typer(figures_app, name="figures")
+
+YearsOpt = Annotated[
+    list[int] | None, typer.Option("--year", "-y", help="Survey year (repeatable; default: all).")
+]
+OutputOpt = Annotated[
+    Path | None,
+    typer.Option("--output", "-o", help="Write to file (.csv/.parquet/.arrow); default: stdout."),
+]
+JobsOpt = Annotated[int | None, typer.Option("--jobs", "-j", help="Worker processes.")]
+
+
+class SidecarFormat(StrEnum):
+    """File format of chart data sidecars (`coco.gjp.viz.export.DataFormat`)."""
+
+    CSV = "csv"
+    ARROW = "arrow"
+
+
+DataFormatOpt = Annotated[
+    SidecarFormat | None, typer.Option(help="Write large chart data as sidecar files.")
+]
+
+
+def _log_to_stderr() -> None:
+    """Send the project logger to stderr (stdout carries command output)."""
+    from coco.config import get_logger, short_format
+
+    logger = get_logger()
+    logger.remove()
+    logger.add(sys.stderr, format=short_format, colorize=sys.stderr.isatty())
+
+
+def _years(years: list[int] | None) -> tuple[int, ...] | None:
+    return tuple(years) if years else None
+
+
+def _data_format(data_format: SidecarFormat | None) -> DataFormat | None:
+    return None if data_format is None else cast("DataFormat", data_format.value)
+
+
+def _write(df: pl.DataFrame, output: Path | None) -> None:
+    if output is None or str(output) == "-":
+        df.write_csv(sys.stdout)
+        return
+    output.parent.mkdir(parents=True, exist_ok=True)
+    match output.suffix:
+        case ".parquet":
+            df.write_parquet(output)
+        case ".arrow" | ".ipc" | ".feather":
+            df.write_ipc(output)
+        case ".csv":
+            df.write_csv(output)
+        case _:
+            msg = f"Unsupported output format {output.suffix!r} (use .csv, .parquet or .arrow)"
+            raise typer.BadParameter(msg, param_hint="--output")
+
+
+@app.command()
+def load(
+    years: YearsOpt = None,
+    compact: Annotated[bool, typer.Option(help="Dictionary-encode ID columns.")] = False,
+    output: OutputOpt = None,
+) -> None:
+    """Load (and cache) the survey forecasts; print the dataset version and row counts."""
+    _log_to_stderr()
+    import polars as pl
+
+    from coco.gjp.models.survey_fcasts import SurveyForecasts
+
+    sf = SurveyForecasts.load(years=_years(years), compact=compact)
+    counts = sf.lf.group_by("year").agg(pl.len().alias("n_rows")).sort("year").collect()
+    _write(counts.with_columns(pl.lit(sf.version).alias("version")), output)
+
+
+@app.command()
+def baselines(
+    years: YearsOpt = None,
+    user_ids: Annotated[
+        list[str] | None, typer.Option("--user-id", "-u", help="Restrict to user (repeatable).")
+    ] = None,
+    ifp_ids: Annotated[
+        list[str] | None, typer.Option("--ifp-id", "-i", help="Restrict to IFP (repeatable).")
+    ] = None,
+    p_a: Annotated[
+        bool, typer.Option("--p-a", help="One p(answer='a') row per user/IFP instead.")
+    ] = False,
+    output: OutputOpt = None,
+) -> None:
+    """Users' baseline (earliest) forecasts on the studied IFPs."""
+    _log_to_stderr()
+    from coco.gjp.models.encoding import decode
+    from coco.gjp.models.survey_fcasts import SurveyForecasts
+
+    sf = SurveyForecasts.load(years=_years(years))
+    query = sf.baseline_p_a_for if p_a else sf.baselines_for
+    _write(decode(query(user_ids=user_ids, ifp_ids=ifp_ids)).collect(), output)
+
+
+@app.command()
+def correlations(
+    first_k: Annotated[int | None, typer.Option(help="Only the first k IFPs (--sort-by).")] = None,
+    top_k: Annotated[int | None, typer.Option(help="Only the k strongest pairs.")] = None,
+    sort_by: Annotated[str, typer.Option(help="IFP order for --first-k: 'n' or 'ifp_id'.")] = "n",
+    min_n: Annotated[int, typer.Option(help="Min users per IFP and shared users per pair.")] = 2,
+    min_unique: Annotated[int, typer.Option(help="Min distinct baselines per IFP.")] = 2,
+    resamples: Annotated[
+        int, typer.Option(help="Bootstrap/permutation resamples (adds CIs, p/q-values).")
+    ] = 0,
+    ci: Annotated[
+        float,
+        typer.Option(min=0.0, max=1.0, help="Bootstrap confidence level (with --resamples)."),
+    ] = 0.95,
+    seed: Annotated[int, typer.Option(help="Resampling seed.")] = 0,
+    jobs: JobsOpt = None,
+    output: OutputOpt = None,
+) -> None:
+    """IFP pair correlations of users' baseline p(answer='a'), strongest first."""
+    _log_to_stderr()
+    from coco.gjp.models.survey_fcasts import SurveyForecasts
+    from coco.gjp.viz.plot_ifp_correlations import corr_pairs_table
+
+    table = corr_pairs_table(
+        SurveyForecasts.load().lf,
+        first_k=first_k,
+        top_k=top_k,
+        sort_by=sort_by,
+        min_n=min_n,
+        min_unique=min_unique,
+        n_resamples=resamples,
+        ci=ci,
+        seed=seed,
+        n_jobs=jobs,
+    )
+    _write(table.collect(), output)
+
+
+@figures_app.command("user-timelines")
+def user_timelines(
+    user_ids: Annotated[list[str] | None, typer.Argument(help="Users (default: all).")] = None,
+    years: YearsOpt = None,
+    jobs: JobsOpt = None,
+    resume: Annotated[bool, typer.Option(help="Skip users finished by a previous run.")] = True,
+    data_format: DataFormatOpt = None,
+    output: OutputOpt = None,
+) -> None:
+    """Per-user IFP timelines (batch; prints one status row per user)."""
+    _log_to_stderr()
+    from coco.gjp.viz.batch import render_user_timelines
+
+    summary = render_user_timelines(
+        user_ids or None,
+        years=_years(years),
+        n_jobs=jobs,
+        resume=resume,
+        data_format=_data_format(data_format),
+    )
+    _write(summary, output)
+
+
+@figures_app.command("ifp-hists")
+def ifp_hists(
+    ifp_ids: Annotated[list[str] | None, typer.Argument(help="IFPs (default: all).")] = None,
+    years: YearsOpt = None,
+    maxbins: Annotated[int, typer.Option(help="Max histogram bins.")] = 20,
+    jobs: JobsOpt = None,
+    resume: Annotated[bool, typer.Option(help="Skip IFPs finished by a previous run.")] = True,
+    data_format: DataFormatOpt = None,
+    output: OutputOpt = None,
+) -> None:
+    """Per-IFP baseline histograms (batch; prints one status row per IFP)."""
+    _log_to_stderr()
+    from coco.gjp.viz.batch import render_forecast_priors_hists
+
+    summary = render_forecast_priors_hists(
+        ifp_ids or None,
+        years=_years(years),
+        maxbins=maxbins,
+        n_jobs=jobs,
+        resume=resume,
+        data_format=_data_format(data_format),
+    )
+    _write(summary, output)
+
+
+@figures_app.command("corr-matrix")
+def corr_matrix(
+    first_k: Annotated[int, typer.Option(help="Number of IFPs (most baselines first).")] = 15,
+    data_format: DataFormatOpt = None,
+    force: Annotated[bool, typer.Option(help="Re-render even if current.")] = False,
+) -> None:
+    """IFP correlation matrix heatmap."""
+    _log_to_stderr()
+    from coco.config import FIGURES_DIR
+    from coco.gjp.models.survey_fcasts import SurveyForecasts
+    from coco.gjp.viz.plot_ifp_correlations import make_ifp_corr_matrix, save_ifp_corr_matrix
+
+    chart = make_ifp_corr_matrix(SurveyForecasts.load().lf, first_k=first_k)
+    save_ifp_corr_matrix(
+        chart,
+        corr_matrix_dir=FIGURES_DIR / "gjp" / "corr_matrix",
+        data_format=_data_format(data_format),
+        force=force,
+    )
+
+
+@figures_app.command("ifp-timeline")
+def ifp_timeline(
+    data_format: DataFormatOpt = None,
+    force: Annotated[bool, typer.Option(help="Re-render even if current.")] = False,
+) -> None:
+    """Timeline of all IFPs (open -> closed)."""
+    _log_to_stderr()
+    from coco.config import FIGURES_DIR
+    from coco.gjp.models.ifp import IFPs
+    from coco.gjp.viz.plot_ifp_timeline import make_ifp_timeline_chart, save_ifp_timeline_chart
+
+    chart = make_ifp_timeline_chart(IFPs.load().lf)
+    save_ifp_timeline_chart(
+        chart,
+        timeline_dir=FIGURES_DIR / "gjp" / "ifp_timeline",
+        data_format=_data_format(data_format),
+        force=force,
+    )
+
+
+if __name__ == "__main__":
+    app()
@@ -2,11 +2,17 @@
 
 Defines project-wide constants, directory structures, and logging setup.
 Automatically loads environment variables from .env if present.
+
+Importing this module is cheap: loguru (and tqdm) are only imported and configured the
+first time `logger` is accessed (`from coco.config import logger`).
 """
 
+from functools import cache
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from loguru import logger
+if TYPE_CHECKING:
+    from loguru import Logger
 
 # try:
 #     from dotenv import load_dotenv
@@ -35,7 +41,20 @@ INTERIM_DATA_DIR = DATA_DIR / "interim"
 PROCESSED_DATA_DIR = DATA_DIR / "processed"
 EXTERNAL_DATA_DIR = DATA_DIR / "external"
 
+# Parsed copies of the raw CSVs (see coco.gjp.models.columnar_cache)
+COLUMNAR_CACHE_DIR = INTERIM_DATA_DIR / "columnar_cache"
+# Per-user / per-IFP forecast layouts (see coco.gjp.models.forecast_layout)
+FORECAST_LAYOUT_DIR = INTERIM_DATA_DIR / "forecast_layout"
+# Persisted baselines (see coco.gjp.models.baseline_store)
+BASELINE_STORE_DIR = PROCESSED_DATA_DIR / "baselines"
+# Memory-mapped sparse baseline matrices (see coco.gjp.models.baseline_matrix)
+BASELINE_MATRIX_DIR = PROCESSED_DATA_DIR / "baseline_matrix"
+
 MODELS_DIR = PROJ_ROOT / "models"
+# Fitted belief HMMs, collective and per user (see coco.gjp.models.belief_fit)
+BELIEF_FIT_DIR = MODELS_DIR / "belief_hmm"
+# Cached train/test splits and per-user results tables (see coco.gjp.models.belief_eval)
+BELIEF_EVAL_DIR = PROCESSED_DATA_DIR / "belief_eval"
 
 REPORTS_DIR = PROJ_ROOT / "reports"
 FIGURES_DIR = REPORTS_DIR / "figures"
@@ -47,28 +66,42 @@ SRC_DIR = PROJ_ROOT / "coco"
 # Configure loguru with concise format for research notebooks
 short_format = "<green>{time:HH:mm:ss}</green> | <level>{message:<100}</level> - <cyan>{name}</cyan>:<cyan>{line}</cyan>"
 
-logger.remove(0)  # Remove default handler
 
-# Simple format: just level, message, and optional exception
-logger.add(
-    lambda msg: print(msg, end=""),
-    format=short_format,
-    colorize=True,
-)
+@cache
+def get_logger() -> "Logger":
+    """The project's loguru logger, configured on first use."""
+    from loguru import logger  # noqa: PLC0415
 
-# If tqdm is installed, use tqdm.write instead of print
-# https://github.com/Delgan/loguru/issues/135
-try:
-    from tqdm import tqdm
+    logger.remove(0)  # Remove default handler
 
-    logger.remove()  # Remove the print handler
+    # Simple format: just level, message, and optional exception
     logger.add(
-        lambda msg: tqdm.write(msg, end=""),
+        lambda msg: print(msg, end=""),
         format=short_format,
         colorize=True,
     )
-except ModuleNotFoundError:
-    pass
+
+    # If tqdm is installed, use tqdm.write instead of print
+    # https://github.com/Delgan/loguru/issues/135
+    try:
+        from tqdm import tqdm  # noqa: PLC0415
+
+        logger.remove()  # Remove the print handler
+        logger.add(
+            lambda msg: tqdm.write(msg, end=""),
+            format=short_format,
+            colorize=True,
+        )
+    except ModuleNotFoundError:
+        pass
+    return logger
+
+
+def __getattr__(name: str) -> "Logger":
+    if name == "logger":
+        return get_logger()
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
 
 
 # logger = _configure_logger("short")
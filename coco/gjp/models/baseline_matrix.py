@@ -0,0 +1,127 @@
+# Sparse user x IFP matrix of baseline p(answer_option="a")
+# %%
+
+import json
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+from pydantic import BaseModel, ConfigDict, Field
+from scipy import sparse
+
+from coco.gjp.models.encoding import decode
+
+
+class BaselineMatrix(BaseModel):
+    """Users x IFPs baseline matrix, stored column-major (CSC: one compressed column per IFP).
+
+    Missing (user, IFP) cells are simply absent. The arrays can be persisted with `save`
+    and re-opened memory-mapped with `open`, so several processes share one copy.
+    """
+
+    user_ids: list[str] = Field(description="Row index -> user_id (sorted)")
+    ifp_ids: list[str] = Field(description="Column index -> ifp_id (sorted)")
+    indptr: np.ndarray = Field(description="CSC column pointers, shape (n_ifps + 1,)")
+    indices: np.ndarray = Field(description="CSC row (user) indices, int32")
+    data: np.ndarray = Field(description="Baseline p(a) values, float64")
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    @classmethod
+    def from_baseline_p_a(cls, baseline_p_a_df: pl.DataFrame) -> "BaselineMatrix":
+        """Build from a `SurveyForecasts.baseline_p_a()` table (one row per user/IFP)."""
+        df = decode(baseline_p_a_df).drop_nulls("baseline_p_a")
+        user_ids = df["user_id"].unique().sort()
+        ifp_ids = df["ifp_id"].unique().sort()
+        coded = df.select(
+            pl.col("ifp_id").cast(pl.Enum(ifp_ids)).to_physical().alias("col"),
+            pl.col("user_id").cast(pl.Enum(user_ids)).to_physical().alias("row"),
+            pl.col("baseline_p_a"),
+        ).sort(["col", "row"])
+
+        col = coded["col"].to_numpy()
+        indptr = np.zeros(len(ifp_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(col, minlength=len(ifp_ids)), out=indptr[1:])
+        return cls(
+            user_ids=user_ids.to_list(),
+            ifp_ids=ifp_ids.to_list(),
+            indptr=indptr,
+            indices=coded["row"].to_numpy().astype(np.int32),
+            data=coded["baseline_p_a"].to_numpy().astype(np.float64),
+        )
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        """(n_users, n_ifps)."""
+        return len(self.user_ids), len(self.ifp_ids)
+
+    @property
+    def nnz(self) -> int:
+        """Number of stored (user, IFP) baselines."""
+        return len(self.data)
+
+    @property
+    def density(self) -> float:
+        """Fraction of (user, IFP) cells with a baseline."""
+        n_users, n_ifps = self.shape
+        return self.nnz / max(1, n_users * n_ifps)
+
+    def to_scipy(self) -> sparse.csc_array:
+        """`scipy.sparse` view over the (possibly memory-mapped) arrays."""
+        return sparse.csc_array((self.data, self.indices, self.indptr), shape=self.shape)
+
+    def ifp_positions(self, ifp_ids: list[str]) -> np.ndarray:
+        """Column indices of `ifp_ids`."""
+        index = {ifp_id: i for i, ifp_id in enumerate(self.ifp_ids)}
+        return np.array([index[ifp_id] for ifp_id in ifp_ids], dtype=np.int64)
+
+    def user_positions(self, user_ids: list[str]) -> np.ndarray:
+        """Row indices of `user_ids`."""
+        index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+        return np.array([index[user_id] for user_id in user_ids], dtype=np.int64)
+
+    def to_dense_frame(self, ifp_ids: list[str]) -> pl.DataFrame:
+        """Wide frame (`user_id` + one column per IFP, null where missing) for `ifp_ids`.
+
+        Only users with at least one value among `ifp_ids` are included, sorted by
+        `user_id`, i.e. the same frame as pivoting the long baseline table.
+        """
+        sub = self.to_scipy()[:, self.ifp_positions(ifp_ids)].tocoo()
+        rows = np.unique(sub.row)
+        dense = np.full((len(rows), len(ifp_ids)), np.nan)
+        dense[np.searchsorted(rows, sub.row), sub.col] = sub.data
+        return pl.DataFrame(
+            [
+                pl.Series("user_id", [self.user_ids[r] for r in rows], dtype=pl.String),
+                *(
+                    pl.Series(ifp_id, dense[:, j], nan_to_null=True)
+                    for j, ifp_id in enumerate(ifp_ids)
+                ),
+            ]
+        )
+
+    def save(self, path: Path) -> None:
+        """Persist as `.npy` arrays + JSON index maps in directory `path`."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ["indptr", "indices", "data"]:
+            np.save(path / f"{name}.npy", getattr(self, name))
+        # Written last: its presence marks a complete matrix
+        (path / "index.json").write_text(
+            json.dumps({"user_ids": self.user_ids, "ifp_ids": self.ifp_ids})
+        )
+
+    @classmethod
+    def exists(cls, path: Path) -> bool:
+        """Whether a complete matrix was saved to `path`."""
+        return (Path(path) / "index.json").exists()
+
+    @classmethod
+    def open(cls, path: Path, *, mmap: bool = True) -> "BaselineMatrix":
+        """Open a saved matrix; with `mmap`, arrays are read-only zero-copy memory maps."""
+        path = Path(path)
+        index = json.loads((path / "index.json").read_text())
+        arrays = {
+            name: np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None)
+            for name in ["indptr", "indices", "data"]
+        }
+        return cls(user_ids=index["user_ids"], ifp_ids=index["ifp_ids"], **arrays)
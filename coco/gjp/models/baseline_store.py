@@ -0,0 +1,247 @@
+# Persisted, incrementally maintained baseline table
+# %%
+
+from collections.abc import Callable, Mapping
+import hashlib
+import json
+from pathlib import Path
+
+import polars as pl
+
+from coco.config import BASELINE_STORE_DIR, logger
+from coco.gjp.models.baselines import BASELINE_ORDER_BY, earliest_rows
+
+BASELINE_KEYS = ["ifp_id", "user_id", "answer_option"]
+_STORED_VALUES = ["value", *BASELINE_ORDER_BY]
+_STORE_SCHEMA = {
+    "ifp_id": pl.String,
+    "user_id": pl.String,
+    "answer_option": pl.String,
+    "value": pl.Float64,
+    "timestamp": pl.Datetime("us"),
+    "fcast_date": pl.Date,
+    "forecast_id": pl.Int64,
+}
+
+
+def _earliest(lf: pl.LazyFrame) -> pl.LazyFrame:
+    return earliest_rows(
+        lf.select(list(_STORE_SCHEMA)).cast(_STORE_SCHEMA),  # pyright: ignore[reportArgumentType]
+        by=BASELINE_KEYS,
+        columns=_STORED_VALUES,
+        order_by=BASELINE_ORDER_BY,
+    )
+
+
+def _agg(baselines: pl.LazyFrame) -> pl.LazyFrame:
+    return baselines.group_by(["ifp_id", "answer_option"]).agg(
+        pl.col("value").mean().alias("avg_baseline"),
+        pl.col("value").median().alias("median_baseline"),
+        pl.col("user_id").n_unique().alias("n_users"),
+    )
+
+
+def _as_baselines(lf: pl.LazyFrame) -> pl.LazyFrame:
+    """Stored rows in the `SurveyForecasts.baselines()` layout."""
+    return lf.select(
+        *BASELINE_KEYS,
+        pl.col("value").alias("baseline_value"),
+        pl.col("timestamp").alias("baseline_timestamp"),
+        pl.col("fcast_date").alias("baseline_fcast_date"),
+    )
+
+
+class BaselineStore:
+    """Baselines persisted under `root`, updated only for keys touched by new data.
+
+    Layout:
+        - `partials/year={y}.parquet`: earliest studied row per (ifp, user, option) in year y
+        - `merged.parquet`: earliest row per key across all ingested years
+        - `agg.parquet`: `agg_baselines` statistics over `merged.parquet`
+        - `manifest.json`: fingerprint of the source each year partial was built from
+
+    A query for a subset of the ingested years combines the (small) year partials.
+
+    Every file is replaced atomically. A year partial is written after the merged and agg
+    tables and its fingerprint after the partial, so an interrupted update is redone by the
+    next `sync`. There is no locking: use a store directory from a single writer process.
+    """
+
+    def __init__(self, root: Path = BASELINE_STORE_DIR) -> None:
+        self.root = Path(root)
+
+    @property
+    def _manifest_path(self) -> Path:
+        return self.root / "manifest.json"
+
+    def _partial_path(self, year: int) -> Path:
+        return self.root / "partials" / f"year={year}.parquet"
+
+    @property
+    def _merged_path(self) -> Path:
+        return self.root / "merged.parquet"
+
+    @property
+    def _agg_path(self) -> Path:
+        return self.root / "agg.parquet"
+
+    def manifest(self) -> dict[int, str]:
+        """Year -> fingerprint of the data its partial was built from."""
+        try:
+            return {int(y): fp for y, fp in json.loads(self._manifest_path.read_text()).items()}
+        except FileNotFoundError:
+            return {}
+
+    @property
+    def years(self) -> tuple[int, ...]:
+        """Years currently ingested."""
+        return tuple(sorted(self.manifest()))
+
+    def state(self, years: tuple[int, ...] | None = None) -> str:
+        """Hash of the stored data of `years` (default: all ingested years).
+
+        Changes with every update of a year partial, including `ingest` calls without a
+        fingerprint; use it to key anything derived from the stored baselines.
+        """
+        manifest = self.manifest()
+        entries = []
+        for year in sorted(manifest if years is None else years):
+            path = self._partial_path(year)
+            stat = path.stat() if path.exists() else None
+            entries.append(
+                [year, manifest.get(year), stat and stat.st_size, stat and stat.st_mtime_ns]
+            )
+        return hashlib.sha256(json.dumps(entries).encode()).hexdigest()
+
+    def _read(self, path: Path) -> pl.DataFrame:
+        if path.exists():
+            return pl.read_parquet(path)
+        return pl.DataFrame(schema=_STORE_SCHEMA)
+
+    def _write(self, path: Path, df: pl.DataFrame) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        df.write_parquet(tmp)
+        tmp.replace(path)
+
+    def sync(
+        self,
+        fingerprints: Mapping[int, str],
+        load_year: Callable[[int], pl.LazyFrame],
+    ) -> None:
+        """(Re)build the partial of every year whose fingerprint differs from the manifest.
+
+        Args:
+            fingerprints: Year -> fingerprint of its current source data.
+            load_year: Returns the studied forecast rows of a year.
+        """
+        manifest = self.manifest()
+        for year, fingerprint in sorted(fingerprints.items()):
+            if manifest.get(year) == fingerprint:
+                continue
+            logger.info(f"Rebuilding baseline partial for year {year}")
+            self._replace_partial(year, _earliest(load_year(year)).collect())
+            self._set_fingerprint(year, fingerprint)
+
+    def ingest(self, lf: pl.LazyFrame, *, year: int, fingerprint: str | None = None) -> int:
+        """Merge newly arrived (studied) forecast rows of `year` into the store.
+
+        Only keys present in `lf` are re-evaluated. Returns the number of changed keys.
+        """
+        batch = _earliest(lf).collect()
+        old = self._read(self._partial_path(year))
+        touched = old.join(batch.select(BASELINE_KEYS), on=BASELINE_KEYS, how="semi")
+        new = pl.concat(
+            [
+                old.join(batch.select(BASELINE_KEYS), on=BASELINE_KEYS, how="anti"),
+                _earliest(pl.concat([touched, batch]).lazy()).collect(),
+            ]
+        )
+        n_changed = self._replace_partial(year, new)
+        if fingerprint is not None:
+            self._set_fingerprint(year, fingerprint)
+        return n_changed
+
+    def _set_fingerprint(self, year: int, fingerprint: str) -> None:
+        manifest = self.manifest()
+        manifest[year] = fingerprint
+        self._manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self._manifest_path.with_name(f".{self._manifest_path.name}.tmp")
+        tmp.write_text(json.dumps({str(y): fp for y, fp in manifest.items()}))
+        tmp.replace(self._manifest_path)
+
+    def _replace_partial(self, year: int, new: pl.DataFrame) -> int:
+        """Swap in a year partial and propagate its changed keys to merged/agg."""
+        old = self._read(self._partial_path(year))
+        changed = (
+            pl.concat(
+                [
+                    old.join(new, on=list(_STORE_SCHEMA), how="anti"),
+                    new.join(old, on=list(_STORE_SCHEMA), how="anti"),
+                ]
+            )
+            .select(BASELINE_KEYS)
+            .unique()
+        )
+        if changed.is_empty() and self._merged_path.exists():
+            self._write(self._partial_path(year), new)
+            return 0
+
+        # Re-evaluate only the changed keys across all year partials
+        partials = [
+            (new if y == year else self._read(self._partial_path(y))).join(
+                changed, on=BASELINE_KEYS, how="semi"
+            )
+            for y in {*self.manifest(), year}
+        ]
+        merged = self._read(self._merged_path)
+        merged = pl.concat(
+            [
+                merged.join(changed, on=BASELINE_KEYS, how="anti"),
+                _earliest(pl.concat(partials).lazy()).collect(),
+            ]
+        )
+        self._write(self._merged_path, merged)
+
+        changed_ifps = changed.select("ifp_id").unique()
+        agg = self._read_agg().join(changed_ifps, on="ifp_id", how="anti")
+        fresh = _agg(merged.lazy().join(changed_ifps.lazy(), on="ifp_id", how="semi")).collect()
+        self._write(self._agg_path, pl.concat([agg, fresh]))
+        # Written last: until then, a rerun sees the same changed keys and redoes merged/agg
+        self._write(self._partial_path(year), new)
+        logger.debug(f"Baseline store: {len(changed)} keys changed in year {year}")
+        return len(changed)
+
+    def _read_agg(self) -> pl.DataFrame:
+        if self._agg_path.exists():
+            return pl.read_parquet(self._agg_path)
+        return _agg(pl.LazyFrame(schema=_STORE_SCHEMA)).collect()
+
+    def _scan(self, years: tuple[int, ...] | None) -> pl.LazyFrame:
+        """Stored rows for `years` (default: all ingested years)."""
+        if years is None or set(years) == set(self.years):
+            return pl.scan_parquet(self._merged_path)
+        if missing := set(years) - set(self.years):
+            msg = f"Years not ingested in baseline store: {sorted(missing)}"
+            raise ValueError(msg)
+        return _earliest(pl.concat([pl.scan_parquet(self._partial_path(y)) for y in years]))
+
+    def baselines(self, years: tuple[int, ...] | None = None) -> pl.LazyFrame:
+        """Stored baselines, in the layout of `SurveyForecasts.baselines()`."""
+        return _as_baselines(self._scan(years))
+
+    def baseline_p_a(self, years: tuple[int, ...] | None = None) -> pl.LazyFrame:
+        """Stored baselines in the layout of `SurveyForecasts.baseline_p_a()`."""
+        return (
+            self._scan(years)
+            .filter(pl.col("answer_option") == "a")
+            .select("user_id", "ifp_id", pl.col("value").alias("baseline_p_a"))
+        )
+
+    def agg_baselines(self, years: tuple[int, ...] | None = None) -> pl.LazyFrame:
+        """Stored `agg_baselines` statistics (maintained incrementally for all years)."""
+        if years is None or set(years) == set(self.years):
+            agg = pl.scan_parquet(self._agg_path)
+        else:
+            agg = _agg(self._scan(years))
+        return agg.sort(["ifp_id", "answer_option"])
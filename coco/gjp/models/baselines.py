@@ -0,0 +1,38 @@
+# Baseline (earliest observed forecast) extraction
+# %%
+
+import polars as pl
+
+# Time fields that order a user's forecasts, from highest to lowest priority
+BASELINE_ORDER_BY = ["timestamp", "fcast_date", "forecast_id"]
+
+
+def earliest_mask(order_by: list[str]) -> pl.Expr:
+    """Boolean mask of the rows that are lexicographically smallest over `order_by`.
+
+    Evaluated inside a `group_by(...).agg(...)`, this is a per-group arg-min on the
+    composite key `(order_by[0], order_by[1], ...)` without sorting anything: each column
+    only breaks ties among rows still matching on the previous ones.
+    """
+    mask: pl.Expr | None = None
+    for col in order_by:
+        candidates = pl.col(col) if mask is None else pl.col(col).filter(mask)
+        is_min = pl.col(col) == candidates.min()
+        mask = is_min if mask is None else mask & is_min
+    return pl.lit(value=True) if mask is None else mask
+
+
+def earliest_rows(
+    lf: pl.LazyFrame,
+    *,
+    by: list[str],
+    columns: list[str],
+    order_by: list[str],
+) -> pl.LazyFrame:
+    """Values of `columns` on the earliest row (per `order_by`) of each `by` group.
+
+    Single hash-aggregation pass; equivalent to `lf.sort(order_by).group_by(by).first()`
+    (ties on every `order_by` column resolve to the first such row in `lf`).
+    """
+    mask = earliest_mask(order_by)
+    return lf.group_by(by).agg(pl.col(col).filter(mask).first() for col in columns)
@@ -0,0 +1,73 @@
+# Report emission tables for the belief HMM
+#
+# Reports are discretized into the same b equal-width bins as beliefs. The probability of
+# reporting into bin k given belief bin j is the mass of bin k under a [0, 1]-truncated
+# normal centred on bin j, so emissions for a given (sigma, b) are one (b + 1) x b table:
+# rows are observed report bins and the last row (index -1, a missing report) is log 1.
+# Inference gathers rows of this table instead of evaluating normal CDFs per observation.
+# %%
+
+from functools import cache
+
+import numpy as np
+from scipy.special import log_ndtr
+
+REPORT_SIGMA = 0.05
+MISSING = -1.0
+
+
+def bin_centers(n_bins: int) -> np.ndarray:
+    """Centers of `n_bins` equal-width belief bins over [0, 1]."""
+    return (np.arange(n_bins) + 0.5) / n_bins
+
+
+def report_bins(reports: np.ndarray, n_bins: int) -> np.ndarray:
+    """Report bin of each report (1.0 falls in the last bin), -1 where missing."""
+    r = np.asarray(reports, dtype=np.float64)
+    # Rounded before the floor so reports on a bin edge (0.29 * 100 = 28.999...) are not
+    # put one bin low
+    bins = np.clip(np.floor(np.round(r * n_bins, 9)), 0, n_bins - 1).astype(np.int16)
+    return np.where(r < 0, np.int16(-1), bins)
+
+
+def _log_ndtr_diff(lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """log(Phi(hi) - Phi(lo)) for lo < hi, accurate in both tails."""
+    # Above the mean, use the mirrored (lower-tail) CDFs to avoid 1 - 1 cancellation
+    flip = lo > 0
+    lo, hi = np.where(flip, -hi, lo), np.where(flip, -lo, hi)
+    log_hi = log_ndtr(hi)
+    return log_hi + np.log1p(-np.exp(log_ndtr(lo) - log_hi))
+
+
+@cache
+def emission_table(sigma: float, n_bins: int) -> np.ndarray:
+    """Log P(report bin | belief bin) for reports truncated-normal around the belief.
+
+    Cached per `(sigma, n_bins)` and read-only.
+
+    Returns:
+        Shape (n_bins + 1, n_bins): row k is report bin k, the last row (missing) is 0.
+    """
+    edges = np.linspace(0.0, 1.0, n_bins + 1)
+    centers = bin_centers(n_bins)
+    z = (edges[:, None] - centers) / sigma  # (edges, belief bins)
+    log_mass = _log_ndtr_diff(z[:-1], z[1:])
+    log_norm = _log_ndtr_diff(z[0], z[-1])
+    table = np.vstack([log_mass - log_norm, np.zeros(n_bins)])
+    table.setflags(write=False)
+    return table
+
+
+@cache
+def scaled_emission_table(sigma: float, n_bins: int) -> tuple[np.ndarray, np.ndarray]:
+    """`emission_table` as likelihoods scaled by their row max, and each row's log max.
+
+    Gathering a row and its shift gives one observation's scaled emission vector, which is
+    what the scaled forward recursions multiply by.
+    """
+    table = emission_table(sigma, n_bins)
+    shift = table.max(axis=1)
+    lik = np.exp(table - shift[:, None])
+    lik.setflags(write=False)
+    shift.setflags(write=False)
+    return lik, shift
@@ -0,0 +1,359 @@
+# Train/test evaluation of the belief HMM against collective baselines
+#
+# Each split holds out some of every user's observed reports (trajectory days with a
+# forecast). Splits are made per user: a random fraction of their reports, everything after
+# a cut-off tau of their forecasting span, or an interval [tau_start, tau_end] of it. The
+# held-out cells are cached as flat indexes into `Trajectories.reports`, keyed by the
+# trajectories, the split settings and the seed.
+#
+# Models are fitted on the training reports only (held-out cells set to missing), then three
+# predictors estimate every held-out report: the collective average of the IFP's training
+# reports, the smoothed belief under the collective model and under the user's own model.
+# HMM predictions run over a process pool in fixed chunks of users, on training reports saved
+# once and memory-mapped by every worker. The error of a user's predictions on one day is
+# the Euclidean distance between predicted and reported p(a) over the IFPs they reported
+# that day; each split x predictor gets one table of per-user scores.
+# %%
+
+from collections.abc import Sequence
+import hashlib
+import json
+from pathlib import Path
+import time
+from typing import Literal
+
+import numpy as np
+import polars as pl
+from pydantic import BaseModel, ConfigDict, Field
+
+from coco.config import BELIEF_EVAL_DIR, BELIEF_FIT_DIR, logger
+from coco.gjp.models.belief_fit import (
+    DEFAULT_WARM_START_STRENGTH,
+    UserFits,
+    fit_collective,
+    fit_users,
+    open_trajectories,
+    save_trajectories,
+    warm_start,
+)
+from coco.gjp.models.belief_hmm import DEFAULT_BINS, MISSING, BeliefHMM, Trajectories
+from coco.gjp.models.belief_smc import ThetaPosterior
+from coco.gjp.models.process_pool import pool_size, run_tasks
+from coco.gjp.models.survey_fcasts import SurveyForecasts
+
+Predictor = Literal["collective_average", "collective_model", "individual_model"]
+PREDICTORS: tuple[Predictor, ...] = ("collective_average", "collective_model", "individual_model")
+_HMM_PREDICTORS = ("collective_model", "individual_model")
+
+# Users per prediction work unit; fixed so chunk boundaries do not depend on `n_jobs`
+USERS_PER_CHUNK = 64
+
+
+class _WorkerInputs(BaseModel):
+    """Memory-mapped training reports, held-out cells and fitted models of a worker."""
+
+    reports: np.ndarray
+    user_ptr: np.ndarray
+    cells: np.ndarray
+    collective: BeliefHMM
+    user_fits: UserFits | None
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+
+# Set once per worker process by `_init_worker`
+_SHARED: _WorkerInputs | None = None
+
+
+class SplitSpec(BaseModel):
+    """How to split each user's reports; `tau*` are fractions of the user's forecasting span."""
+
+    kind: Literal["random", "cutoff", "interval"]
+    test_frac: float = Field(default=0.2, gt=0, lt=1, description="Held out by 'random'")
+    tau: float = Field(default=0.8, ge=0, lt=1, description="Cut-off of 'cutoff'")
+    tau_start: float = Field(default=0.4, ge=0, lt=1, description="Start of 'interval'")
+    tau_end: float = Field(default=0.6, gt=0, le=1, description="End of 'interval'")
+    seed: int = Field(default=0, description="Seed of 'random'")
+    model_config = ConfigDict(frozen=True)
+
+    @property
+    def name(self) -> str:
+        """Short label, used for file names and result keys."""
+        match self.kind:
+            case "random":
+                return f"random-{self.test_frac:g}-seed{self.seed}"
+            case "cutoff":
+                return f"cutoff-{self.tau:g}"
+            case "interval":
+                return f"interval-{self.tau_start:g}-{self.tau_end:g}"
+
+
+def _user_rows(user_ids: list[str]) -> np.ndarray:
+    """Dense user index of each trajectory (users in sorted order)."""
+    return np.unique(np.array(user_ids), return_inverse=True)[1]
+
+
+def split_cells(traj: Trajectories, spec: SplitSpec) -> np.ndarray:
+    """Held-out cells of `traj` under `spec`, as sorted flat indexes into `traj.reports`."""
+    rows, days = np.nonzero(traj.reports >= 0)
+    users = _user_rows(traj.user_ids)[rows]
+    if spec.kind == "random":
+        # Hold out the round(test_frac * n) lowest random keys among each user's n reports
+        keys = np.random.default_rng(spec.seed).random(len(rows))
+        order = np.lexsort((keys, users))
+        n_user = np.bincount(users)
+        first = np.r_[0, np.cumsum(n_user)[:-1]]
+        rank = np.empty(len(rows), dtype=np.int64)
+        rank[order] = np.arange(len(rows)) - first[users[order]]
+        test = rank < np.round(spec.test_frac * n_user)[users]
+    else:
+        date = traj.start.astype(np.int64)[rows] + days
+        first = np.full(users.max(initial=-1) + 1, np.iinfo(np.int64).max)
+        last = np.full_like(first, np.iinfo(np.int64).min)
+        np.minimum.at(first, users, date)
+        np.maximum.at(last, users, date)
+        span = (last - first)[users]
+        lo, hi = (spec.tau, 1.0) if spec.kind == "cutoff" else (spec.tau_start, spec.tau_end)
+        offset = date - first[users]
+        test = (offset > lo * span) & (offset <= hi * span)
+    return np.sort(np.ravel_multi_index((rows[test], days[test]), traj.reports.shape))
+
+
+def _split_key(traj: Trajectories, spec: SplitSpec) -> str:
+    digest = hashlib.sha256(spec.model_dump_json().encode())
+    digest.update(json.dumps(traj.user_ids).encode())
+    for array in [traj.reports, traj.start.astype(np.int64)]:
+        digest.update(memoryview(np.ascontiguousarray(array).ravel()).cast("B"))
+    return digest.hexdigest()[:16]
+
+
+def _trajectories_key(traj: Trajectories) -> str:
+    digest = hashlib.sha256(json.dumps(traj.user_ids).encode())
+    for array in [traj.reports, traj.lengths]:
+        digest.update(memoryview(np.ascontiguousarray(array).ravel()).cast("B"))
+    return digest.hexdigest()[:16]
+
+
+def load_split(
+    traj: Trajectories, spec: SplitSpec, *, out_dir: str | Path = BELIEF_EVAL_DIR
+) -> np.ndarray:
+    """`split_cells`, cached in `out_dir / splits` by trajectories, settings and seed."""
+    path = Path(out_dir) / "splits" / f"{spec.name}-{_split_key(traj, spec)}.npy"
+    if path.exists():
+        return np.load(path)
+    cells = split_cells(traj, spec)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npy")
+    np.save(tmp, cells)
+    tmp.replace(path)
+    return cells
+
+
+def training_trajectories(traj: Trajectories, cells: np.ndarray) -> Trajectories:
+    """`traj` with the held-out `cells` set to missing (lengths and padding unchanged)."""
+    reports = traj.reports.copy()
+    reports.flat[cells] = MISSING
+    return traj.model_copy(update={"reports": reports})
+
+
+def collective_average(train: Trajectories, cells: np.ndarray) -> np.ndarray:
+    """Mean training report on each held-out cell's IFP (overall mean for unseen IFPs)."""
+    ifps, ifp_rows = np.unique(np.array(train.ifp_ids), return_inverse=True)
+    observed = train.reports >= 0
+    per_row = np.where(observed, train.reports, 0.0).sum(axis=1)
+    sums = np.bincount(ifp_rows, weights=per_row, minlength=len(ifps))
+    counts = np.bincount(ifp_rows, weights=observed.sum(axis=1), minlength=len(ifps))
+    overall = sums.sum() / max(counts.sum(), 1)
+    means = np.where(counts > 0, sums / np.maximum(counts, 1), overall)
+    rows, _ = np.unravel_index(cells, train.reports.shape)
+    return means[ifp_rows[rows]]
+
+
+def _init_worker(
+    path: Path, cells: np.ndarray, collective: BeliefHMM, user_fits: UserFits | None
+) -> None:
+    global _SHARED  # noqa: PLW0603
+    reports, _, user_ptr = open_trajectories(path)
+    _SHARED = _WorkerInputs(
+        reports=reports,
+        user_ptr=user_ptr,
+        cells=cells,
+        collective=collective,
+        user_fits=user_fits,
+    )
+
+
+def _predict_chunk(first: int, stop: int) -> tuple[int, int, dict[str, np.ndarray]]:
+    """Smoothed beliefs on the held-out cells of users `first:stop`, per HMM predictor.
+
+    Returns:
+        The chunk's range of positions in the held-out cells and its predictions.
+    """
+    if _SHARED is None:
+        msg = "Prediction worker used before `_init_worker`"
+        raise RuntimeError(msg)
+    reports, ptr, cells = _SHARED.reports, _SHARED.user_ptr, _SHARED.cells
+    width = reports.shape[1]
+    lo, hi = np.searchsorted(cells, [ptr[first] * width, ptr[stop] * width])
+    chunk_cells = cells[lo:hi] - ptr[first] * width
+    rows = slice(int(ptr[first]), int(ptr[stop]))
+
+    collective = _SHARED.collective
+    beliefs = collective.expected_beliefs(collective.forward_backward(reports[rows])[0])
+    preds = {"collective_model": beliefs.ravel()[chunk_cells]}
+
+    user_fits = _SHARED.user_fits
+    if user_fits is not None:
+        beliefs = np.empty_like(beliefs)
+        for u in range(first, stop):
+            hmm = user_fits.posterior(user_fits.user_ids[u]).mean()
+            user_rows = slice(int(ptr[u] - ptr[first]), int(ptr[u + 1] - ptr[first]))
+            reports_u = reports[int(ptr[u]) : int(ptr[u + 1])]
+            beliefs[user_rows] = hmm.expected_beliefs(hmm.forward_backward(reports_u)[0])
+        preds["individual_model"] = beliefs.ravel()[chunk_cells]
+    return int(lo), int(hi), preds
+
+
+def predict_hmm(  # noqa: PLR0913
+    train: Trajectories,
+    cells: np.ndarray,
+    collective: BeliefHMM,
+    user_fits: UserFits | None = None,
+    *,
+    n_jobs: int | None = None,
+    out_dir: str | Path = BELIEF_EVAL_DIR,
+) -> dict[str, np.ndarray]:
+    """Collective (and, given `user_fits`, individual) HMM beliefs on the held-out `cells`.
+
+    `train` must be sorted by user (as built by `Trajectories.from_forecasts`) and
+    `user_fits` fitted on it. Its reports are saved once under `out_dir / trajectories`
+    and memory-mapped by the workers. Chunks of `USERS_PER_CHUNK` users are spread over
+    `n_jobs` processes (default: all cores).
+    """
+    users = _user_rows(train.user_ids)
+    if (np.diff(users) < 0).any():
+        msg = "Trajectories must be sorted by user"
+        raise ValueError(msg)
+    path = Path(out_dir) / "trajectories" / _trajectories_key(train)
+    if not (path / "users.json").exists():
+        save_trajectories(train, path)
+    n_users = len(json.loads((path / "users.json").read_text()))
+    chunks = [
+        (first, min(first + USERS_PER_CHUNK, n_users))
+        for first in range(0, n_users, USERS_PER_CHUNK)
+    ]
+    predictors = _HMM_PREDICTORS if user_fits is not None else _HMM_PREDICTORS[:1]
+    preds = {name: np.empty(len(cells)) for name in predictors}
+
+    def collect(lo: int, hi: int, chunk_preds: dict[str, np.ndarray]) -> None:
+        for name, values in chunk_preds.items():
+            preds[name][lo:hi] = values
+
+    for _, result in run_tasks(
+        _predict_chunk,
+        chunks,
+        n_jobs=pool_size(n_jobs, len(chunks)),
+        initializer=_init_worker,
+        initargs=(path, cells, collective, user_fits),
+    ):
+        collect(*result)
+    return preds
+
+
+def score_predictions(
+    traj: Trajectories, cells: np.ndarray, predictions: np.ndarray
+) -> pl.DataFrame:
+    """Per-user errors of `predictions` on the held-out `cells` of `traj`.
+
+    Returns:
+        One row per user with held-out reports: `n_test` reports over `n_days` days,
+        `mean_error` (mean over days of the Euclidean error across that day's IFPs) and
+        `mse` (mean squared error per report).
+    """
+    rows, days = np.unravel_index(cells, traj.reports.shape)
+    return (
+        pl.DataFrame(
+            {
+                "user_id": np.array(traj.user_ids)[rows],
+                "date": traj.start[rows] + days,
+                "sq_error": (predictions - traj.reports.flat[cells]) ** 2,
+            }
+        )
+        .group_by("user_id", "date")
+        .agg(pl.col("sq_error").sum(), pl.len().alias("n"))
+        .group_by("user_id")
+        .agg(
+            pl.col("n").sum().alias("n_test"),
+            pl.len().alias("n_days"),
+            pl.col("sq_error").sqrt().mean().alias("mean_error"),
+            (pl.col("sq_error").sum() / pl.col("n").sum()).alias("mse"),
+        )
+        .sort("user_id")
+    )
+
+
+def evaluate(  # noqa: PLR0913
+    traj: Trajectories,
+    specs: Sequence[SplitSpec],
+    *,
+    predictors: Sequence[Predictor] = PREDICTORS,
+    n_bins: int = DEFAULT_BINS,
+    strength: float = DEFAULT_WARM_START_STRENGTH,
+    out_dir: str | Path = BELIEF_EVAL_DIR,
+    fit_dir: str | Path = BELIEF_FIT_DIR,
+    n_jobs: int | None = None,
+) -> dict[tuple[str, str], pl.DataFrame]:
+    """Split, fit on the training reports, predict the held-out ones and score, per split.
+
+    Fits are cached in `fit_dir` (keyed by the training reports, see `belief_fit`) and each
+    results table is also written to `out_dir / results / {split}-{predictor}.parquet`.
+
+    Returns:
+        Per-user results (see `score_predictions`) keyed by (split name, predictor).
+    """
+    order = np.argsort(np.array(traj.user_ids), kind="stable")
+    traj = traj.take(order)
+    results = {}
+    for spec in specs:
+        t0 = time.perf_counter()
+        cells = load_split(traj, spec, out_dir=out_dir)
+        train = training_trajectories(traj, cells)
+        preds = {}
+        if "collective_average" in predictors:
+            preds["collective_average"] = collective_average(train, cells)
+        if set(_HMM_PREDICTORS) & set(predictors):
+            collective = fit_collective(train, prior=ThetaPosterior.prior(n_bins), out_dir=fit_dir)
+            user_fits = None
+            if "individual_model" in predictors:
+                prior = warm_start(collective, strength=strength)
+                user_fits = fit_users(train, prior, out_dir=fit_dir, n_jobs=n_jobs)
+            hmm_preds = predict_hmm(
+                train, cells, collective.mean(), user_fits, n_jobs=n_jobs, out_dir=out_dir
+            )
+            preds.update({name: hmm_preds[name] for name in predictors if name in hmm_preds})
+
+        for name in predictors:
+            table = score_predictions(traj, cells, preds[name])
+            path = Path(out_dir) / "results" / f"{spec.name}-{name}.parquet"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.tmp")
+            table.write_parquet(tmp)
+            tmp.replace(path)
+            results[spec.name, name] = table
+        logger.info(
+            "Evaluate {}: {} held-out reports in {:.1f}s",
+            spec.name,
+            len(cells),
+            time.perf_counter() - t0,
+        )
+    return results
+
+
+# %%
+if __name__ == "__main__":
+    logger.info("== Belief HMM: train/test evaluation")
+    results = evaluate(
+        Trajectories.from_survey_forecasts(SurveyForecasts.load()),
+        [SplitSpec(kind="random"), SplitSpec(kind="cutoff"), SplitSpec(kind="interval")],
+    )
+    for (split, predictor), table in results.items():
+        logger.info(f"{split} / {predictor}: mean error {table['mean_error'].mean():.4f}")
@@ -0,0 +1,316 @@
+# Two-phase belief HMM fitting: one collective fit, then one fit per user warm-started from it
+#
+# Per-user fits run over a process pool in fixed chunks of users, each chunk fitted in one
+# vectorized `fit_smc_groups` call. Trajectories are saved once as `.npy` arrays that every
+# worker memory-maps read-only; each finished chunk is written atomically to its own
+# `.npz`, so an interrupted run resumes from the chunks that are still missing.
+# %%
+
+from collections.abc import Collection
+import hashlib
+import json
+from pathlib import Path
+import time
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+
+from coco.config import BELIEF_FIT_DIR, logger
+from coco.gjp.models.belief_hmm import DEFAULT_BINS, Trajectories
+from coco.gjp.models.belief_smc import (
+    DEFAULT_SMC_BUDGET_BYTES,
+    ThetaPosterior,
+    fit_smc,
+    fit_smc_groups,
+)
+from coco.gjp.models.process_pool import pool_size, run_tasks
+from coco.gjp.models.survey_fcasts import SurveyForecasts
+
+# Users per work unit and checkpoint file. Fixed (not derived from the core count) so the
+# chunk files of an interrupted run stay valid when it is resumed with another `n_jobs`.
+USERS_PER_CHUNK = 64
+# Observations per transition row that the collective estimate is worth as a user prior
+DEFAULT_WARM_START_STRENGTH = 20.0
+
+
+class _WorkerInputs(BaseModel):
+    """Memory-mapped trajectories (sorted by user), prior and budget of a fit worker."""
+
+    reports: np.ndarray
+    lengths: np.ndarray
+    user_ptr: np.ndarray
+    prior: ThetaPosterior
+    memory_budget_bytes: int
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+
+# Set once per worker process by `_init_worker`
+_SHARED: _WorkerInputs | None = None
+
+
+def warm_start(
+    collective: ThetaPosterior, *, strength: float = DEFAULT_WARM_START_STRENGTH
+) -> ThetaPosterior:
+    """Prior centred on the collective posterior mean, worth `strength` reports per row.
+
+    The collective counts pool every user, so used as-is they would leave individual fits
+    nowhere to move; only their mean is kept.
+    """
+    mean = collective.mean()
+    return ThetaPosterior(
+        initial_counts=strength * mean.initial,
+        trans_counts=strength * mean.trans,
+        sigma=collective.sigma,
+    )
+
+
+class UserFits(BaseModel):
+    """Per-user Dirichlet posteriors from `fit_users`, stacked in `user_ids` order."""
+
+    user_ids: list[str] = Field(description="Row -> user_id (sorted)")
+    initial_counts: np.ndarray = Field(description="Per-user initial counts, (users, b)")
+    trans_counts: np.ndarray = Field(description="Per-user transition counts, (users, b, b)")
+    loglik: np.ndarray = Field(description="Summed log predictive likelihood per user")
+    sigma: float = Field(description="Report noise (std) shared by every fit")
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    def posterior(self, user_id: str) -> ThetaPosterior:
+        """The fitted posterior of `user_id`."""
+        i = self.user_ids.index(user_id)
+        return ThetaPosterior(
+            initial_counts=self.initial_counts[i],
+            trans_counts=self.trans_counts[i],
+            sigma=self.sigma,
+        )
+
+    @classmethod
+    def load(cls, run_dir: Path) -> "UserFits":
+        """Stack the chunk files of a complete `fit_users` run directory."""
+        run_dir = Path(run_dir)
+        user_ids = json.loads((run_dir / "trajectories" / "users.json").read_text())
+        run = json.loads((run_dir / "run.json").read_text())
+        if not user_ids:
+            b = run["n_bins"]
+            return cls(
+                user_ids=[],
+                initial_counts=np.zeros((0, b)),
+                trans_counts=np.zeros((0, b, b)),
+                loglik=np.zeros(0),
+                sigma=run["sigma"],
+            )
+        n_chunks = -(-len(user_ids) // USERS_PER_CHUNK)
+        chunks = [np.load(_chunk_path(run_dir, c)) for c in range(n_chunks)]
+        arrays = {
+            name: np.concatenate([chunk[name] for chunk in chunks])
+            for name in ["initial_counts", "trans_counts", "loglik"]
+        }
+        return cls(user_ids=user_ids, sigma=run["sigma"], **arrays)
+
+
+def _digest(*arrays: np.ndarray, **options: object) -> str:
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode())
+    for array in arrays:
+        digest.update(memoryview(np.ascontiguousarray(array).ravel()).cast("B"))
+    return digest.hexdigest()[:16]
+
+
+def _chunk_path(run_dir: Path, chunk: int) -> Path:
+    return run_dir / "chunks" / f"chunk-{chunk:05d}.npz"
+
+
+def save_trajectories(traj: Trajectories, path: Path) -> None:
+    """Persist reports (sorted by user) + per-user row pointers for `open_trajectories`."""
+    order = np.argsort(np.array(traj.user_ids), kind="stable")
+    user_ids = np.array(traj.user_ids, dtype=str)[order]
+    starts = np.flatnonzero(np.r_[len(order) > 0, user_ids[1:] != user_ids[:-1]])
+    path.mkdir(parents=True, exist_ok=True)
+    np.save(path / "reports.npy", traj.reports[order])
+    np.save(path / "lengths.npy", traj.lengths[order])
+    np.save(path / "user_ptr.npy", np.r_[starts, len(order)].astype(np.int64))
+    # Written last: its presence marks complete arrays
+    (path / "users.json").write_text(json.dumps(user_ids[starts].tolist()))
+
+
+def open_trajectories(path: Path) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Read-only memory maps of the reports, lengths and user row pointers under `path`."""
+    reports, lengths, user_ptr = (
+        np.load(path / f"{name}.npy", mmap_mode="r") for name in ["reports", "lengths", "user_ptr"]
+    )
+    return reports, lengths, user_ptr
+
+
+def _init_worker(path: Path, prior: ThetaPosterior, memory_budget_bytes: int) -> None:
+    global _SHARED  # noqa: PLW0603
+    reports, lengths, user_ptr = open_trajectories(path)
+    _SHARED = _WorkerInputs(
+        reports=reports,
+        lengths=lengths,
+        user_ptr=user_ptr,
+        prior=prior,
+        memory_budget_bytes=memory_budget_bytes,
+    )
+
+
+def _fit_chunk(chunk_path: Path, first: int, stop: int) -> int:
+    """Fit users `first:stop` (one group each) and write their posteriors to `chunk_path`."""
+    if _SHARED is None:
+        msg = "Fit worker used before `_init_worker`"
+        raise RuntimeError(msg)
+    ptr = _SHARED.user_ptr[first : stop + 1]
+    rows = slice(int(ptr[0]), int(ptr[-1]))
+    width = int(_SHARED.lengths[rows].max())
+    reports = np.asarray(_SHARED.reports[rows, :width])
+    groups = np.repeat(np.arange(stop - first), np.diff(ptr))
+    initial_counts, trans_counts, loglik = fit_smc_groups(
+        reports,
+        groups,
+        n_groups=stop - first,
+        prior=_SHARED.prior,
+        memory_budget_bytes=_SHARED.memory_budget_bytes,
+    )
+    tmp = chunk_path.with_suffix(".tmp.npz")
+    np.savez(
+        tmp,
+        initial_counts=initial_counts,
+        trans_counts=trans_counts,
+        loglik=np.bincount(groups, weights=loglik, minlength=stop - first),
+    )
+    tmp.replace(chunk_path)
+    return stop - first
+
+
+def fit_users(  # noqa: PLR0913
+    traj: Trajectories,
+    prior: ThetaPosterior,
+    *,
+    out_dir: str | Path = BELIEF_FIT_DIR,
+    n_jobs: int | None = None,
+    resume: bool = True,
+    memory_budget_bytes: int = DEFAULT_SMC_BUDGET_BYTES,
+) -> UserFits:
+    """Fit every user's trajectories separately, each starting from `prior` (see `warm_start`).
+
+    The run lives in `out_dir / users-{key}`, where the key hashes the trajectories and
+    the prior. Chunks of `USERS_PER_CHUNK` users are spread over `n_jobs` processes
+    (default: all cores) that memory-map the saved trajectories. With `resume`, chunks
+    already written by an earlier (interrupted) run with the same key are kept.
+
+    Returns:
+        The stacked per-user posteriors.
+    """
+    key = _digest(
+        traj.reports,
+        traj.lengths,
+        prior.initial_counts,
+        prior.trans_counts,
+        user_ids=traj.user_ids,
+        sigma=prior.sigma,
+    )
+    run_dir = Path(out_dir) / f"users-{key}"
+    shared = run_dir / "trajectories"
+    if not (shared / "users.json").exists():
+        save_trajectories(traj, shared)
+    (run_dir / "run.json").write_text(json.dumps({"sigma": prior.sigma, "n_bins": prior.n_bins}))
+    (run_dir / "chunks").mkdir(exist_ok=True)
+
+    n_users = len(json.loads((shared / "users.json").read_text()))
+    chunks = {
+        c: (c * USERS_PER_CHUNK, min((c + 1) * USERS_PER_CHUNK, n_users))
+        for c in range(-(-n_users // USERS_PER_CHUNK))
+    }
+    todo = {
+        c: bounds
+        for c, bounds in chunks.items()
+        if not (resume and _chunk_path(run_dir, c).exists())
+    }
+    logger.info(
+        "Fit users: {} users in {} chunks ({} chunks already done)",
+        n_users,
+        len(chunks),
+        len(chunks) - len(todo),
+    )
+
+    t_start = time.perf_counter()
+    n_jobs = pool_size(n_jobs, len(todo))
+    results = run_tasks(
+        _fit_chunk,
+        [(_chunk_path(run_dir, c), *bounds) for c, bounds in todo.items()],
+        n_jobs=n_jobs,
+        initializer=_init_worker,
+        initargs=(shared, prior, memory_budget_bytes // n_jobs),
+    )
+    n_done = sum(n for _, n in results)
+
+    elapsed = time.perf_counter() - t_start
+    logger.info(
+        "Fit users: {} users in {:.1f}s ({:.1f} users/s)",
+        n_done,
+        elapsed,
+        n_done / max(elapsed, 1e-9),
+    )
+    return UserFits.load(run_dir)
+
+
+def fit_collective(
+    traj: Trajectories,
+    *,
+    prior: ThetaPosterior | None = None,
+    out_dir: str | Path = BELIEF_FIT_DIR,
+    memory_budget_bytes: int = DEFAULT_SMC_BUDGET_BYTES,
+) -> ThetaPosterior:
+    """One fit over every trajectory (the collective model), saved and reused by key."""
+    prior = ThetaPosterior.prior() if prior is None else prior
+    key = _digest(
+        traj.reports,
+        prior.initial_counts,
+        prior.trans_counts,
+        user_ids=traj.user_ids,
+        sigma=prior.sigma,
+    )
+    path = Path(out_dir) / f"collective-{key}.npz"
+    if path.exists():
+        saved = np.load(path)
+        return ThetaPosterior(
+            initial_counts=saved["initial_counts"],
+            trans_counts=saved["trans_counts"],
+            sigma=prior.sigma,
+        )
+
+    t0 = time.perf_counter()
+    posterior, _ = fit_smc(traj.reports, prior=prior, memory_budget_bytes=memory_budget_bytes)
+    logger.info("Fit collective: {} trajectories in {:.1f}s", len(traj), time.perf_counter() - t0)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(tmp, initial_counts=posterior.initial_counts, trans_counts=posterior.trans_counts)
+    tmp.replace(path)
+    return posterior
+
+
+def fit_belief_models(  # noqa: PLR0913
+    sf: SurveyForecasts,
+    *,
+    user_ids: Collection[str] | None = None,
+    n_bins: int = DEFAULT_BINS,
+    strength: float = DEFAULT_WARM_START_STRENGTH,
+    out_dir: str | Path = BELIEF_FIT_DIR,
+    n_jobs: int | None = None,
+    resume: bool = True,
+) -> tuple[ThetaPosterior, UserFits]:
+    """Both phases on `sf`: the collective fit, then every user warm-started from it."""
+    traj = Trajectories.from_survey_forecasts(sf, user_ids=user_ids)
+    collective = fit_collective(traj, prior=ThetaPosterior.prior(n_bins), out_dir=out_dir)
+    user_fits = fit_users(
+        traj,
+        warm_start(collective, strength=strength),
+        out_dir=out_dir,
+        n_jobs=n_jobs,
+        resume=resume,
+    )
+    return collective, user_fits
+
+
+# %%
+if __name__ == "__main__":
+    logger.info("== Belief HMM: collective and per-user fits")
+    collective, user_fits = fit_belief_models(SurveyForecasts.load())
+    logger.info(f"Fitted {len(user_fits.user_ids)} users")
@@ -0,0 +1,242 @@
+# Hidden Markov Model of forecaster beliefs over discretized belief bins
+#
+# Each (user, IFP) trajectory is one chain: the hidden state on day t is the bin of the
+# user's belief Belief_(t, ifp) (b equal-width bins over [0, 1]) and the observation is the
+# reported p(a), or -1 when no forecast was made that day. Reports are emitted from a
+# [0, 1]-truncated normal around the bin center (sigma = 0.05) and observed at the same
+# bin resolution (see `belief_emission`); a missing report has likelihood 1. Transitions
+# are stationary and shared by every IFP of a trajectory batch.
+#
+# Inference is vectorized over trajectories and bins; only days are iterated. Trajectories
+# are left-aligned and padded with -1, which is exact for forward-backward (a missing
+# report after the last one changes neither the likelihood nor earlier posteriors).
+# %%
+
+from collections.abc import Collection
+
+import numpy as np
+import polars as pl
+from pydantic import BaseModel, ConfigDict, Field
+
+from coco.gjp.models.baselines import BASELINE_ORDER_BY
+from coco.gjp.models.belief_emission import (
+    MISSING,
+    REPORT_SIGMA,
+    bin_centers,
+    emission_table,
+    report_bins,
+    scaled_emission_table,
+)
+from coco.gjp.models.encoding import decode
+from coco.gjp.models.survey_fcasts import ForecastType, SurveyForecasts
+
+DEFAULT_BINS = 20
+
+
+class Trajectories(BaseModel):
+    """Daily p(a) reports of (user, IFP) trajectories, left-aligned and padded with -1.
+
+    Day 0 of a trajectory is the user's first forecast on the IFP and its last day is their
+    last (non-withdraw) forecast; days without a forecast are -1. When several forecasts
+    fall on one day, the latest counts.
+    """
+
+    user_ids: list[str] = Field(description="Trajectory -> user_id (sorted by user, IFP)")
+    ifp_ids: list[str] = Field(description="Trajectory -> ifp_id")
+    start: np.ndarray = Field(description="First forecast date per trajectory, datetime64[D]")
+    lengths: np.ndarray = Field(description="Days per trajectory (first to last report)")
+    reports: np.ndarray = Field(description="Reported p(a), shape (n, max(lengths)), -1 missing")
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    @classmethod
+    def from_forecasts(cls, forecasts_df: pl.DataFrame) -> "Trajectories":
+        """Build from (studied, binary) forecast rows: `user_id`, `ifp_id`, `answer_option`,
+        `value`, `fcast_type`, `fcast_date` (+ `timestamp`/`forecast_id` for ordering).
+        """
+        df = decode(forecasts_df)
+        order_by = [col for col in BASELINE_ORDER_BY if col in df.columns]
+        daily = (
+            df.filter(
+                (pl.col("answer_option") == "a")
+                & (pl.col("fcast_type") != ForecastType.WITHDRAW.value)
+            )
+            .group_by("user_id", "ifp_id", "fcast_date")
+            .agg(pl.col("value").sort_by(order_by).last())
+            .with_columns(pl.col("fcast_date").min().over("user_id", "ifp_id").alias("start"))
+            .with_columns((pl.col("fcast_date") - pl.col("start")).dt.total_days().alias("t"))
+        )
+        keys = (
+            daily.group_by("user_id", "ifp_id")
+            .agg(pl.col("start").first(), (pl.col("t").max() + 1).alias("length"))
+            .sort("user_id", "ifp_id")
+            .with_row_index("traj")
+        )
+        cells = daily.join(keys.select("user_id", "ifp_id", "traj"), on=["user_id", "ifp_id"])
+
+        lengths = keys["length"].to_numpy().astype(np.int64)
+        reports = np.full((len(keys), int(lengths.max(initial=0))), MISSING)
+        reports[cells["traj"].to_numpy(), cells["t"].to_numpy()] = cells["value"].to_numpy()
+        return cls(
+            user_ids=keys["user_id"].to_list(),
+            ifp_ids=keys["ifp_id"].to_list(),
+            start=keys["start"].to_numpy().astype("datetime64[D]"),
+            lengths=lengths,
+            reports=reports,
+        )
+
+    @classmethod
+    def from_survey_forecasts(
+        cls, sf: SurveyForecasts, *, user_ids: Collection[str] | None = None
+    ) -> "Trajectories":
+        """Trajectories of `user_ids` (default: every user) on the studied IFPs of `sf`."""
+        lf = sf.filter_studied(None if user_ids is None else sf.forecasts_for(user_ids=user_ids))
+        return cls.from_forecasts(lf.collect())
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def take(self, idx: np.ndarray) -> "Trajectories":
+        """Subset of trajectories `idx`, re-padded to their own longest length."""
+        idx = np.asarray(idx, dtype=np.int64)
+        lengths = self.lengths[idx]
+        return Trajectories(
+            user_ids=[self.user_ids[i] for i in idx],
+            ifp_ids=[self.ifp_ids[i] for i in idx],
+            start=self.start[idx],
+            lengths=lengths,
+            reports=self.reports[idx, : int(lengths.max(initial=0))],
+        )
+
+
+def report_lengths(reports: np.ndarray) -> np.ndarray:
+    """Index after the last observed report (or report bin) of each row (0 if none)."""
+    observed = reports >= 0
+    if observed.shape[1] == 0:
+        return np.zeros(len(observed), dtype=np.int64)
+    last = reports.shape[1] - np.argmax(observed[:, ::-1], axis=1)
+    return np.where(observed.any(axis=1), last, 0)
+
+
+class BeliefHMM(BaseModel):
+    """Stationary belief HMM parameters: initial bin distribution, bin transitions, sigma."""
+
+    initial: np.ndarray = Field(description="P(Belief_0 bin), shape (b,)")
+    trans: np.ndarray = Field(description="P(next bin | bin), shape (b, b), rows sum to 1")
+    sigma: float = Field(default=REPORT_SIGMA, gt=0, description="Report noise (std)")
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    @classmethod
+    def uniform(cls, n_bins: int = DEFAULT_BINS, *, sigma: float = REPORT_SIGMA) -> "BeliefHMM":
+        """Uniform initial beliefs and transitions (the report's starting point)."""
+        return cls(
+            initial=np.full(n_bins, 1 / n_bins),
+            trans=np.full((n_bins, n_bins), 1 / n_bins),
+            sigma=sigma,
+        )
+
+    @property
+    def n_bins(self) -> int:
+        """Number of belief bins b."""
+        return len(self.initial)
+
+    @property
+    def centers(self) -> np.ndarray:
+        """Belief bin centers."""
+        return bin_centers(self.n_bins)
+
+    def log_emissions(self, reports: np.ndarray) -> np.ndarray:
+        """Per-bin report log-likelihoods, shape `reports.shape + (b,)`."""
+        return emission_table(self.sigma, self.n_bins)[report_bins(reports, self.n_bins)]
+
+    def forward_backward(self, reports: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Posterior belief bins P(Belief_t | all reports) for a batch of trajectories.
+
+        Scaled recursions: each day's forward message is normalized and the log scale
+        (plus the emission shift) accumulated, so nothing under- or overflows.
+
+        Args:
+            reports: Shape (n, T), -1 for missing days (including padding).
+
+        Returns:
+            Posteriors of shape (n, T, b) and the log-likelihood of each trajectory (n,).
+        """
+        obs = report_bins(reports, self.n_bins)
+        lik, lik_shift = scaled_emission_table(self.sigma, self.n_bins)
+        n, n_days = obs.shape
+        alpha = np.empty((n, n_days, self.n_bins))
+        emit = np.empty((n, n_days, self.n_bins))
+        log_scale = np.zeros((n, n_days))
+
+        pred = np.broadcast_to(self.initial, (n, self.n_bins))
+        for t in range(n_days):
+            if t > 0:
+                pred = alpha[:, t - 1] @ self.trans
+            emit[:, t] = lik[obs[:, t]]
+            a = pred * emit[:, t]
+            scale = a.sum(axis=1)
+            alpha[:, t] = a / scale[:, None]
+            log_scale[:, t] = np.log(scale) + lik_shift[obs[:, t]]
+        loglik = log_scale.sum(axis=1)
+
+        post = alpha  # filled backwards in place: alpha_t is not needed after step t
+        beta = np.ones((n, self.n_bins))
+        for t in range(n_days - 2, -1, -1):
+            nxt = emit[:, t + 1] * beta
+            beta = nxt @ self.trans.T
+            beta /= beta.sum(axis=1, keepdims=True)
+            g = alpha[:, t] * beta
+            post[:, t] = g / g.sum(axis=1, keepdims=True)
+        return post, loglik
+
+    def loglik(self, reports: np.ndarray) -> np.ndarray:
+        """Log-likelihood of each trajectory (forward pass only, O(n * b) memory)."""
+        obs = report_bins(reports, self.n_bins)
+        lik, lik_shift = scaled_emission_table(self.sigma, self.n_bins)
+        n, n_days = obs.shape
+        a = np.broadcast_to(self.initial, (n, self.n_bins))
+        total = np.zeros(n)
+        for t in range(n_days):
+            a = (a if t == 0 else a @ self.trans) * lik[obs[:, t]]
+            scale = a.sum(axis=1)
+            a = a / scale[:, None]
+            total += np.log(scale) + lik_shift[obs[:, t]]
+        return total
+
+    def viterbi(self, reports: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Most likely belief-bin path of each trajectory (log-space max-product).
+
+        Padding after a trajectory's last report is skipped, so it does not bias the path.
+
+        Returns:
+            Bin indices of shape (n, T) (the last bin repeats over padding) and the joint
+            log-probability of each path with its reports (n,).
+        """
+        obs = report_bins(reports, self.n_bins)
+        table = emission_table(self.sigma, self.n_bins)
+        n, n_days = obs.shape
+        lengths = report_lengths(obs)
+        with np.errstate(divide="ignore"):
+            log_init, log_trans = np.log(self.initial), np.log(self.trans)
+
+        stay = np.arange(self.n_bins)
+        back = np.empty((n, n_days, self.n_bins), dtype=np.min_scalar_type(self.n_bins - 1))
+        delta = log_init + table[obs[:, 0]]
+        back[:, 0] = stay
+        for t in range(1, n_days):
+            scores = delta[:, :, None] + log_trans
+            best = scores.argmax(axis=1)
+            step = np.take_along_axis(scores, best[:, None], axis=1)[:, 0]
+            step += table[obs[:, t]]
+            active = (t < lengths)[:, None]
+            delta = np.where(active, step, delta)
+            back[:, t] = np.where(active, best, stay)
+
+        paths = np.empty((n, n_days), dtype=np.int64)
+        paths[:, -1] = delta.argmax(axis=1)
+        for t in range(n_days - 1, 0, -1):
+            paths[:, t - 1] = np.take_along_axis(back[:, t], paths[:, t, None], axis=1)[:, 0]
+        return paths, delta.max(axis=1)
+
+    def expected_beliefs(self, posteriors: np.ndarray) -> np.ndarray:
+        """Posterior mean belief (probability) per day, shape `posteriors.shape[:-1]`."""
+        return posteriors @ self.centers
@@ -0,0 +1,173 @@
+# Deterministic SMC estimation of belief HMM parameters theta = (Belief_0, trans)
+#
+# Follows the deterministic SMC of Vercauteren et al. (2005, Section 4): with a discrete
+# state space, particles are extended to every successor state instead of being sampled,
+# and the posterior over theta is a Dirichlet mixture indexed by the particles' paths.
+# Each trajectory carries one particle per belief bin (weighted by the filtering
+# distribution); the b x b extended particles of a day are merged into their expected
+# transition counts and added to one Dirichlet shared by every trajectory of the fit. The
+# state kept between days is therefore O(n_trajectories * b) plus the b x b counts,
+# whatever the number of days.
+#
+# Counts are only committed on days with a report. Reporting is assumed independent of
+# beliefs, so those days are an unbiased sample of transitions, while counting the purely
+# predicted transitions of silent days would feed the current estimate back into itself
+# (and, with sparse reports, pin it near the prior).
+# %%
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+
+from coco.gjp.models.belief_emission import REPORT_SIGMA, report_bins, scaled_emission_table
+from coco.gjp.models.belief_hmm import DEFAULT_BINS, BeliefHMM, report_lengths
+
+DEFAULT_SMC_BUDGET_BYTES = 256 * 2**20
+# float64 (trajectories x b x b) arrays alive at once while extending one chunk
+_ARRAYS_PER_STEP = 3
+
+
+class ThetaPosterior(BaseModel):
+    """Dirichlet posterior over theta: counts over initial bins and per-bin transition rows."""
+
+    initial_counts: np.ndarray = Field(description="Dirichlet parameters of Belief_0, (b,)")
+    trans_counts: np.ndarray = Field(description="Dirichlet parameters per trans row, (b, b)")
+    sigma: float = Field(default=REPORT_SIGMA, gt=0, description="Report noise (std)")
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    @classmethod
+    def prior(
+        cls,
+        n_bins: int = DEFAULT_BINS,
+        *,
+        concentration: float = 1.0,
+        sigma: float = REPORT_SIGMA,
+    ) -> "ThetaPosterior":
+        """Symmetric Dirichlet prior (`concentration` per cell; 1 is uniform)."""
+        return cls(
+            initial_counts=np.full(n_bins, concentration),
+            trans_counts=np.full((n_bins, n_bins), concentration),
+            sigma=sigma,
+        )
+
+    @property
+    def n_bins(self) -> int:
+        """Number of belief bins b."""
+        return len(self.initial_counts)
+
+    def mean(self) -> BeliefHMM:
+        """Posterior-mean parameters as a `BeliefHMM`."""
+        return BeliefHMM(
+            initial=self.initial_counts / self.initial_counts.sum(),
+            trans=self.trans_counts / self.trans_counts.sum(axis=1, keepdims=True),
+            sigma=self.sigma,
+        )
+
+
+def fit_smc_groups(
+    reports: np.ndarray,
+    groups: np.ndarray,
+    *,
+    n_groups: int,
+    prior: ThetaPosterior | None = None,
+    memory_budget_bytes: int = DEFAULT_SMC_BUDGET_BYTES,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """`fit_smc` for many independent fits at once (e.g. one per user), all from `prior`.
+
+    Trajectory i belongs to fit `groups[i]`; every fit keeps its own Dirichlet counts.
+
+    Returns:
+        Initial counts (n_groups, b), transition counts (n_groups, b, b) and each
+        trajectory's log predictive likelihood (n,).
+    """
+    prior = ThetaPosterior.prior() if prior is None else prior
+    groups = np.asarray(groups, dtype=np.int64)
+    n_bins = prior.n_bins
+    obs = report_bins(reports, n_bins)
+    lik, lik_shift = scaled_emission_table(prior.sigma, n_bins)
+    n, n_days = obs.shape
+    chunk = max(1, memory_budget_bytes // (_ARRAYS_PER_STEP * 8 * n_bins * n_bins))
+
+    initial_counts = np.tile(prior.initial_counts.astype(np.float64), (n_groups, 1))
+    trans_counts = np.tile(prior.trans_counts.astype(np.float64), (n_groups, 1, 1))
+    lengths = report_lengths(obs)
+    filt = np.zeros((n, n_bins))  # particle weights: P(Belief_t bin | reports <= t)
+    loglik = np.zeros(n)
+
+    for t in range(n_days):
+        active = np.flatnonzero(lengths > t)
+        if active.size == 0:
+            break
+        if t == 0:
+            g = groups[active]
+            initial = initial_counts / initial_counts.sum(axis=1, keepdims=True)
+            joint = initial[g] * lik[obs[active, 0]]
+            scale = joint.sum(axis=1)
+            filt[active] = joint / scale[:, None]
+            loglik[active] += np.log(scale) + lik_shift[obs[active, 0]]
+            np.add.at(initial_counts, g, filt[active])
+            continue
+
+        trans = trans_counts / trans_counts.sum(axis=2, keepdims=True)
+        observed = obs[active, t] >= 0
+        counts = np.zeros_like(trans_counts)
+        for start in range(0, active.size, chunk):
+            rows = active[start : start + chunk]
+            seen = observed[start : start + chunk]
+            # No report: particles only move (likelihood 1), and nothing is counted
+            silent = rows[~seen]
+            # (elementwise, not BLAS, so rows do not depend on how many share a call)
+            filt[silent] = (filt[silent, :, None] * trans[groups[silent]]).sum(axis=1)
+
+            rows = rows[seen]
+            obs_t = obs[rows, t]
+            # Extend each particle (previous bin) to every bin: (rows, previous, next)
+            xi = filt[rows, :, None] * trans[groups[rows]] * lik[obs_t, None, :]
+            scale = xi.sum(axis=(1, 2))
+            xi /= scale[:, None, None]
+            # Rows are added in order (sequential sums), so chunking does not change them
+            if n_groups == 1:
+                counts[0] += xi.sum(axis=0)
+            else:
+                np.add.at(counts, groups[rows], xi)
+            filt[rows] = xi.sum(axis=1)
+            loglik[rows] += np.log(scale) + lik_shift[obs_t]
+        trans_counts += counts
+
+    return initial_counts, trans_counts, loglik
+
+
+def fit_smc(
+    reports: np.ndarray,
+    *,
+    prior: ThetaPosterior | None = None,
+    memory_budget_bytes: int = DEFAULT_SMC_BUDGET_BYTES,
+) -> tuple[ThetaPosterior, np.ndarray]:
+    """Update `prior` (default: uniform) with a batch of trajectories, one day at a time.
+
+    Trajectories are left-aligned (day t is each trajectory's t-th day), so all of them
+    advance together; one that has ended drops out. Every trajectory active on day t uses
+    the same posterior-mean theta of days < t, so the result does not depend on their
+    order or on `memory_budget_bytes` (which only sets how many are extended at once).
+    Days without a report only propagate the particles.
+
+    Args:
+        reports: Shape (n, T), -1 for missing days (see `Trajectories.reports`).
+        prior: Dirichlet prior; also sets b and sigma.
+        memory_budget_bytes: Bound on the per-chunk (trajectories x b x b) arrays.
+
+    Returns:
+        The posterior, and each trajectory's log predictive likelihood
+        sum_t log p(report_t | reports_<t) under the evolving estimate.
+    """
+    prior = ThetaPosterior.prior() if prior is None else prior
+    initial_counts, trans_counts, loglik = fit_smc_groups(
+        reports,
+        np.zeros(len(reports), dtype=np.int64),
+        n_groups=1,
+        prior=prior,
+        memory_budget_bytes=memory_budget_bytes,
+    )
+    posterior = ThetaPosterior(
+        initial_counts=initial_counts[0], trans_counts=trans_counts[0], sigma=prior.sigma
+    )
+    return posterior, loglik
@@ -0,0 +1,247 @@
+# Limited-iteration MCMC ("burn-in bias") simulation over joint IFP outcomes
+#
+# Following Lieder et al. (2012), a forecaster forms beliefs by running a short Markov chain
+# over hypotheses from some starting point; with few iterations the visited states are
+# biased towards the start. Hypotheses are joint outcomes s in {0, 1}^k of k studied IFPs,
+# under an Ising-like target p(s) ~ exp(h . s + s' J s / 2): fields h from the mean
+# baseline of each IFP and couplings J from the baseline correlations between IFPs. Chains
+# are random-scan Gibbs samplers, many at once as arrays; only iterations are looped.
+# %%
+
+from collections.abc import Sequence
+from functools import partial
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+from scipy.special import expit, logit
+
+from coco.gjp.models.baseline_matrix import BaselineMatrix
+from coco.gjp.models.ifp_correlations import corr_from_moments, pair_moments
+from coco.gjp.models.overlap import indicator
+from coco.gjp.models.process_pool import pool_size, run_tasks
+
+# Chains per work unit (one task on the process pool). Fixed (not derived from the core
+# count) so each chunk's random stream, and therefore every result, depends only on `seed`.
+CHAINS_PER_CHUNK = 16384
+# Largest k for which visited-state histograms (2**k bins) and exact probabilities are kept
+MAX_STATE_IFPS = 16
+# Baseline means are clipped away from 0/1 before taking log-odds
+_MEAN_EPS = 1e-3
+
+
+class IsingBeliefs(BaseModel):
+    """Target distribution over joint outcomes of `ifp_ids` (bit i of a state is IFP i)."""
+
+    ifp_ids: list[str] = Field(description="State bit -> ifp_id")
+    h: np.ndarray = Field(description="Fields (log-odds of 'yes' when uncoupled), (k,)")
+    J: np.ndarray = Field(description="Symmetric couplings with a zero diagonal, (k, k)")
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    @classmethod
+    def from_baselines(
+        cls,
+        matrix: BaselineMatrix,
+        ifp_ids: list[str],
+        *,
+        coupling: float = 1.0,
+        min_n: int = 2,
+    ) -> "IsingBeliefs":
+        """Fields from each IFP's mean baseline p(a), couplings `coupling * corr`.
+
+        Pairs with fewer than `min_n` shared users (or an undefined correlation) are
+        uncoupled.
+        """
+        moments = pair_moments(matrix.to_scipy()[:, matrix.ifp_positions(ifp_ids)])
+        n = moments["n"]
+        mean = np.diag(moments["sx"]) / np.maximum(np.diag(n), 1)
+        corr = corr_from_moments(moments)
+        corr[(n < min_n) | np.isnan(corr)] = 0.0
+        np.fill_diagonal(corr, 0.0)
+        return cls(
+            ifp_ids=ifp_ids,
+            h=logit(np.clip(mean, _MEAN_EPS, 1 - _MEAN_EPS)),
+            J=coupling * corr,
+        )
+
+    @property
+    def n_ifps(self) -> int:
+        """Number of IFPs k (state bits)."""
+        return len(self.ifp_ids)
+
+    def state_probs(self) -> np.ndarray:
+        """Exact target probability of every state code (2**k entries; k <= MAX_STATE_IFPS)."""
+        _check_small(self.n_ifps)
+        s = state_bits(np.arange(2**self.n_ifps), self.n_ifps)
+        energy = s @ self.h + 0.5 * np.einsum("ni,ij,nj->n", s, self.J, s)
+        p = np.exp(energy - energy.max())
+        return p / p.sum()
+
+    def marginals(self) -> np.ndarray:
+        """Exact P(s_i = 1) under the target (k <= MAX_STATE_IFPS)."""
+        return self.state_probs() @ state_bits(np.arange(2**self.n_ifps), self.n_ifps)
+
+
+def _check_small(n_ifps: int) -> None:
+    if n_ifps > MAX_STATE_IFPS:
+        msg = f"State histograms need at most {MAX_STATE_IFPS} IFPs, got {n_ifps}"
+        raise ValueError(msg)
+
+
+def state_bits(codes: np.ndarray, n_ifps: int) -> np.ndarray:
+    """0/1 outcomes (..., k) of integer state codes."""
+    return ((np.asarray(codes)[..., None] >> np.arange(n_ifps)) & 1).astype(np.float64)
+
+
+def start_states(
+    matrix: BaselineMatrix, ifp_ids: list[str], user_ids: list[str], *, seed: int = 0
+) -> np.ndarray:
+    """Start states from users' baselines: IFP i starts 'yes' with probability p(a).
+
+    Users without a baseline on an IFP draw it from the IFP's mean baseline instead.
+
+    Returns:
+        Boolean (n_users, k) states.
+    """
+    x = matrix.to_scipy()[:, matrix.ifp_positions(ifp_ids)]
+    mean = x.sum(axis=0) / np.maximum(indicator(x).sum(axis=0), 1)
+    rows = x[matrix.user_positions(user_ids)]
+    p = np.where(indicator(rows).toarray() > 0, rows.toarray(), mean)
+    return np.random.default_rng(seed).random(p.shape) < p
+
+
+class BurnInResult(BaseModel):
+    """Visited-state statistics of chains after each of `lengths` iterations."""
+
+    lengths: list[int] = Field(description="Chain lengths (iterations) recorded, ascending")
+    visit_freq: np.ndarray = Field(
+        description="Fraction of visited states with s_i = 1, (n_lengths, n_chains, k)"
+    )
+    state_counts: np.ndarray | None = Field(
+        description="Visits per state code over all chains, (n_lengths, 2**k); None if k is large"
+    )
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    def state_distribution(self) -> np.ndarray:
+        """`state_counts` normalized per length."""
+        if self.state_counts is None:
+            msg = "State histograms were not recorded (too many IFPs)"
+            raise ValueError(msg)
+        return self.state_counts / self.state_counts.sum(axis=1, keepdims=True)
+
+
+# Target distribution of the chains, set once per worker process by `_init_worker`
+_MODEL: IsingBeliefs | None = None
+
+
+def _init_worker(model: IsingBeliefs) -> None:
+    global _MODEL  # noqa: PLW0603
+    _MODEL = model
+
+
+def _run_chunk(
+    start: np.ndarray,
+    seed: np.random.SeedSequence,
+    *,
+    lengths: list[int],
+    histogram: bool,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Run chains from `start` (chunk, k) and record statistics at each of `lengths`.
+
+    Returns:
+        Visit frequencies (lengths, chunk, k) and state counts (lengths, 2**k), the latter
+        empty (no states) without `histogram`.
+    """
+    if _MODEL is None:
+        msg = "Burn-in worker used before `_init_worker`"
+        raise RuntimeError(msg)
+    model = _MODEL
+    rng = np.random.default_rng(seed)
+    n, k = start.shape
+    s = start.astype(np.float64)
+    chains = np.arange(n)
+    code = (start.astype(np.int64) << np.arange(k)).sum(axis=1)
+    visits = np.zeros((n, k))
+    freq = np.empty((len(lengths), n, k), dtype=np.float32)
+    n_states = 2**k if histogram else 0
+    counts = np.zeros((len(lengths), n_states), dtype=np.int64)
+    running = np.zeros(n_states, dtype=np.int64)
+
+    recorded = 0
+    for t in range(1, lengths[-1] + 1):
+        site = rng.integers(k, size=n)
+        field = model.h[site] + (model.J[site] * s).sum(axis=1)
+        new = (rng.random(n) < expit(field)).astype(np.float64)
+        flipped = new != s[chains, site]
+        s[chains, site] = new
+        visits += s
+        if histogram:
+            code ^= flipped.astype(np.int64) << site
+            running += np.bincount(code, minlength=2**k)
+        if t == lengths[recorded]:
+            freq[recorded] = visits / t
+            if histogram:
+                counts[recorded] = running
+            recorded += 1
+    return freq, counts
+
+
+def simulate_burn_in(  # noqa: PLR0913
+    model: IsingBeliefs,
+    start: np.ndarray,
+    lengths: Sequence[int],
+    *,
+    seed: int = 0,
+    histogram: bool | None = None,
+    n_jobs: int | None = None,
+) -> BurnInResult:
+    """Run one Gibbs chain per row of `start` and summarize the states visited by each length.
+
+    Chains are advanced together (one random site per chain and iteration) in chunks of
+    `CHAINS_PER_CHUNK`, run in parallel, each with its own child of `SeedSequence(seed)`,
+    so results only depend on `seed` and `start` (not on `n_jobs`).
+
+    Args:
+        model: Target distribution.
+        start: Boolean (n_chains, k) start states (see `start_states`).
+        lengths: Chain lengths to record; the states after iterations 1..L count for L.
+        seed: Random seed.
+        histogram: Also count visits per state code (default: when k <= MAX_STATE_IFPS).
+        n_jobs: Worker processes (default: all cores).
+
+    Returns:
+        Per-chain visit frequencies (compare with the chains' users' baselines) and,
+        with `histogram`, the visited-state distribution for each length.
+    """
+    start = np.asarray(start, dtype=bool)
+    k = model.n_ifps
+    if start.ndim != 2 or start.shape[1] != k:  # noqa: PLR2004
+        msg = f"Start states must have shape (n_chains, {k}), got {start.shape}"
+        raise ValueError(msg)
+    lengths = sorted(set(lengths))
+    if not lengths or lengths[0] < 1:
+        msg = f"Chain lengths must be positive, got {lengths}"
+        raise ValueError(msg)
+    histogram = k <= MAX_STATE_IFPS if histogram is None else histogram
+    if histogram:
+        _check_small(k)
+
+    starts = range(0, len(start), CHAINS_PER_CHUNK)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    chunks = [(start[i : i + CHAINS_PER_CHUNK], s) for i, s in zip(starts, seeds, strict=True)]
+    freq = np.empty((len(lengths), len(start), k), dtype=np.float32)
+    counts = np.zeros((len(lengths), 2**k if histogram else 0), dtype=np.int64)
+    run = partial(_run_chunk, lengths=lengths, histogram=histogram)
+    for c, (c_freq, c_counts) in run_tasks(
+        run,
+        chunks,
+        n_jobs=pool_size(n_jobs, len(chunks)),
+        initializer=_init_worker,
+        initargs=(model,),
+    ):
+        freq[:, starts[c] : starts[c] + CHAINS_PER_CHUNK] = c_freq
+        counts += c_counts
+    return BurnInResult(
+        lengths=lengths,
+        visit_freq=freq,
+        state_counts=counts if histogram else None,
+    )
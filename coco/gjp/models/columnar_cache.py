@@ -0,0 +1,109 @@
+# Columnar (Parquet) cache for parsed source CSVs
+# %%
+
+from collections.abc import Callable
+import hashlib
+import json
+import os
+from pathlib import Path
+import tempfile
+
+import polars as pl
+
+from coco.config import COLUMNAR_CACHE_DIR, logger
+
+_HASH_CHUNK_BYTES = 1 << 20
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(_HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_fingerprint(source: Path, *, cache_dir: Path = COLUMNAR_CACHE_DIR) -> str:
+    """Content hash of `source`, taken from the cache manifest when size/mtime still match."""
+    manifest = _read_manifest(_manifest_path(source, cache_dir))
+    stat = source.stat()
+    if manifest is not None and (manifest["size"], manifest["mtime_ns"]) == (
+        stat.st_size,
+        stat.st_mtime_ns,
+    ):
+        return manifest["sha256"]
+    return _sha256(source)
+
+
+def _cache_path(source: Path, cache_dir: Path) -> Path:
+    return cache_dir / f"{source.stem}.parquet"
+
+
+def _manifest_path(source: Path, cache_dir: Path) -> Path:
+    return cache_dir / f"{source.stem}.manifest.json"
+
+
+def _read_manifest(path: Path) -> dict | None:
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_atomic(path: Path, write: Callable[[Path], object]) -> None:
+    """`write` to a temp file unique to this call, then move it over `path`."""
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False
+    ) as f:
+        tmp = Path(f.name)
+    try:
+        write(tmp)
+        tmp.replace(path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def cached_scan(
+    source: Path,
+    parse: Callable[[Path], pl.LazyFrame],
+    *,
+    version: int = 1,
+    cache_dir: Path = COLUMNAR_CACHE_DIR,
+) -> pl.LazyFrame:
+    """Scan `source` through a Parquet copy of `parse(source)`.
+
+    The parsed (typed, cast, normalized) frame is written once to `cache_dir` and served
+    from there on later calls. The copy is rebuilt when the source content changes or when
+    `version` is bumped (i.e. when the parsing logic changes). Size and mtime are checked
+    first; the source is only hashed when they differ from the manifest, so a `touch`
+    without a content change does not trigger a rebuild.
+    """
+    cache_path = _cache_path(source, cache_dir)
+    manifest_path = _manifest_path(source, cache_dir)
+    manifest = _read_manifest(manifest_path)
+    stat = source.stat()
+
+    if manifest is not None and manifest.get("version") == version and cache_path.exists():
+        if (manifest["size"], manifest["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+            return pl.scan_parquet(cache_path)
+        if manifest["sha256"] == (sha256 := _sha256(source)):
+            manifest.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            _write_atomic(manifest_path, lambda p: p.write_text(json.dumps(manifest)))
+            return pl.scan_parquet(cache_path)
+    else:
+        sha256 = _sha256(source)
+
+    logger.info(f"Building columnar cache for {source.name} -> {cache_path}")
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    df = parse(source).collect()
+    _write_atomic(cache_path, lambda p: df.write_parquet(p, statistics=True))
+    manifest = {
+        "source": os.fspath(source),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": sha256,
+        "version": version,
+    }
+    _write_atomic(manifest_path, lambda p: p.write_text(json.dumps(manifest)))
+    return pl.scan_parquet(cache_path)
@@ -0,0 +1,190 @@
+# As-of crowd consensus per IFP
+#
+# Each user's standing forecast on an (IFP, answer option) is their latest one; a withdraw
+# removes it until they forecast again. The consensus is the mean and median of the standing
+# forecasts, a step function that changes at every forecast time. Steps are computed once
+# per (IFP, option) from value histograms of the standing forecasts (one row per event, so
+# the median is read off cumulative counts instead of re-sorting), and looked up with sorted
+# as-of joins.
+# %%
+
+from datetime import datetime
+from functools import cached_property
+
+import numpy as np
+import polars as pl
+from pydantic import BaseModel, ConfigDict, Field
+
+from coco.gjp.models.baselines import BASELINE_ORDER_BY
+from coco.gjp.models.encoding import decode
+from coco.gjp.models.survey_fcasts import ForecastType, SurveyForecasts
+
+CONSENSUS_BY = ["ifp_id", "answer_option"]
+
+
+def _time_column(cols: list[str]) -> str:
+    return "timestamp" if "timestamp" in cols else "fcast_date"
+
+
+def _group_steps(
+    times: np.ndarray, old: np.ndarray, new: np.ndarray, values: np.ndarray
+) -> tuple[np.ndarray, ...]:
+    """Consensus after the last event at each distinct time of one (IFP, option).
+
+    Args:
+        times: Event times, sorted.
+        old: Value code of the user's previously standing forecast, -1 if none.
+        new: Value code of the user's forecast after the event, -1 if withdrawn.
+        values: Distinct values, ascending (codes index into these).
+
+    Returns:
+        Step positions (last event per time), n_users, mean and median per step.
+    """
+    n_events = len(times)
+    delta = np.zeros((n_events, len(values)), dtype=np.int32)
+    events = np.arange(n_events)
+    np.add.at(delta, (events[new >= 0], new[new >= 0]), 1)
+    np.add.at(delta, (events[old >= 0], old[old >= 0]), -1)
+    steps = np.flatnonzero(np.r_[times[1:] != times[:-1], True])
+    counts = np.cumsum(delta, axis=0)[steps]
+
+    cdf = np.cumsum(counts, axis=1)
+    n = cdf[:, -1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (counts @ values) / n
+    # Average of the order statistics at ranks (n - 1) // 2 and n // 2
+    lower = values[np.argmax(cdf > ((n - 1) // 2)[:, None], axis=1)]
+    upper = values[np.argmax(cdf > (n // 2)[:, None], axis=1)]
+    median = np.where(n > 0, (lower + upper) / 2, np.nan)
+    return steps, n, mean, median
+
+
+class Consensus(BaseModel):
+    """Crowd consensus step functions per (IFP, answer option)."""
+
+    steps: pl.DataFrame = Field(
+        description="ifp_id, answer_option, time, n_users, mean, median; one row per change"
+    )
+    time_col: str = Field(description="Time column of `steps` (`timestamp` or `fcast_date`)")
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    @classmethod
+    def from_forecasts(cls, forecasts_df: pl.DataFrame) -> "Consensus":
+        """Build from forecast rows: `user_id`, `ifp_id`, `answer_option`, `value`,
+        `fcast_type` and `timestamp` or `fcast_date` (+ `forecast_id` for ordering).
+        """
+        df = decode(forecasts_df)
+        time_col = _time_column(df.columns)
+        order_by = [col for col in BASELINE_ORDER_BY if col in df.columns]
+        events = (
+            df.sort([*CONSENSUS_BY, *order_by])
+            .with_columns(
+                pl.when(pl.col("fcast_type") == ForecastType.WITHDRAW.value)
+                .then(None)
+                .otherwise(pl.col("value"))
+                .alias("new")
+            )
+            .with_columns(pl.col("new").shift(1).over([*CONSENSUS_BY, "user_id"]).alias("old"))
+            .select(*CONSENSUS_BY, time_col, "old", "new")
+        )
+
+        parts = []
+        for keys, group in events.group_by(CONSENSUS_BY, maintain_order=True):
+            old, new = group["old"].to_numpy(), group["new"].to_numpy()
+            values = np.unique(new[~np.isnan(new)])
+            old_code, new_code = (
+                np.where(np.isnan(x), -1, np.searchsorted(values, x)) for x in (old, new)
+            )
+            times = group[time_col].to_numpy()
+            steps, n, mean, median = _group_steps(times, old_code, new_code, values)
+            parts.append(
+                pl.DataFrame(
+                    {
+                        **dict(zip(CONSENSUS_BY, keys, strict=True)),
+                        time_col: group[time_col].gather(steps),
+                        "n_users": n.astype(np.uint32),
+                        "mean": mean,
+                        "median": median,
+                    }
+                )
+            )
+        schema = {
+            "ifp_id": pl.String,
+            "answer_option": pl.String,
+            time_col: df.schema[time_col],
+            "n_users": pl.UInt32,
+            "mean": pl.Float64,
+            "median": pl.Float64,
+        }
+        steps = pl.concat(parts) if parts else pl.DataFrame(schema=schema)
+        steps = steps.with_columns(pl.col("mean", "median").fill_nan(None))
+        return cls(steps=steps.sort([*CONSENSUS_BY, time_col]), time_col=time_col)
+
+    @classmethod
+    def from_survey_forecasts(cls, sf: SurveyForecasts) -> "Consensus":
+        """Consensus over the studied forecasts of `sf`."""
+        return cls.from_forecasts(sf.filter_studied().collect())
+
+    def at(self, queries: pl.DataFrame, *, inclusive: bool = True) -> pl.DataFrame:
+        """Consensus of each query's `ifp_id` (and `answer_option`, default "a") at its time.
+
+        One sorted as-of join over all queries. With `inclusive=False`, forecasts made at
+        exactly the query time do not count yet (the crowd a forecaster saw at that moment).
+
+        Returns:
+            `queries` (in their order) with `consensus_n`, `consensus_mean` and
+            `consensus_median`; no standing forecasts gives 0 and nulls.
+        """
+        if "answer_option" not in queries.columns:
+            queries = queries.with_columns(answer_option=pl.lit("a"))
+        return (
+            decode(queries)
+            .with_row_index("_query")
+            .sort(self.time_col)
+            .join_asof(
+                self._steps_by_time,
+                on=self.time_col,
+                by=CONSENSUS_BY,
+                strategy="backward",
+                allow_exact_matches=inclusive,
+                check_sortedness=False,  # Both sides are sorted by time above
+            )
+            .sort("_query")
+            .drop("_query")
+            .with_columns(pl.col("consensus_n").fill_null(0))
+        )
+
+    @cached_property
+    def _steps_by_time(self) -> pl.DataFrame:
+        """`steps` renamed for `at` and sorted by time across all IFPs."""
+        return self.steps.rename(
+            {"n_users": "consensus_n", "mean": "consensus_mean", "median": "consensus_median"}
+        ).sort(self.time_col, maintain_order=True)
+
+    @cached_property
+    def _index(self) -> tuple[dict[tuple[str, str], tuple[int, int]], np.ndarray]:
+        """Row range of each (IFP, option) in `steps` and the step times."""
+        bounds = (
+            self.steps.with_row_index("row")
+            .group_by(CONSENSUS_BY)
+            .agg(pl.col("row").min().alias("first"), (pl.col("row").max() + 1).alias("stop"))
+        )
+        ranges = {(ifp, option): (first, stop) for ifp, option, first, stop in bounds.iter_rows()}
+        return ranges, self.steps[self.time_col].to_numpy()
+
+    def lookup(
+        self, ifp_id: str, when: datetime, *, answer_option: str = "a"
+    ) -> dict[str, object] | None:
+        """Consensus step in force for one IFP at `when` (None before its first forecast)."""
+        ranges, times = self._index
+        first, stop = ranges.get((ifp_id, answer_option), (0, 0))
+        i = first + np.searchsorted(times[first:stop], np.datetime64(when), side="right") - 1
+        return self.steps.row(int(i), named=True) if i >= first else None
+
+
+# %%
+if __name__ == "__main__":
+    from IPython.display import display
+
+    consensus = Consensus.from_survey_forecasts(SurveyForecasts.load())
+    display(consensus.steps)
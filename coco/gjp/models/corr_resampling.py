@@ -0,0 +1,249 @@
+# Bootstrap CIs and permutation p-values for IFP pair correlations
+#
+# Only the overlap (shared users) of every pair is computed up front, to sort and chunk the
+# pairs. Workers receive the sparse baseline matrix once and build the padded baseline
+# arrays of one chunk at a time, so peak memory is one chunk per worker.
+# %%
+
+from collections.abc import Iterator
+from functools import partial
+import warnings
+
+import numpy as np
+import polars as pl
+from pydantic import BaseModel, ConfigDict
+from scipy import sparse
+
+from coco.gjp.models.baseline_matrix import BaselineMatrix
+from coco.gjp.models.process_pool import pool_size, run_tasks
+
+# Pairs per work unit. Fixed (not derived from the core count or the memory budget) so
+# each chunk's random stream, and therefore every result, depends only on `seed`.
+PAIRS_PER_CHUNK = 256
+DEFAULT_RESAMPLE_BUDGET_BYTES = 64 * 2**20
+# float64 (resamples x pairs x users) arrays alive at once in `_masked_corr`
+_ARRAYS_PER_BATCH = 8
+
+
+class _WorkerInputs(BaseModel):
+    """CSC arrays of the baseline matrix, shared by every chunk of a worker."""
+
+    indptr: np.ndarray
+    indices: np.ndarray
+    data: np.ndarray
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+
+# Set once per worker process by `_init_worker`
+_SHARED: _WorkerInputs | None = None
+
+
+def fdr_bh(p_values: np.ndarray) -> np.ndarray:
+    """Benjamini-Hochberg adjusted p-values (q-values); NaN p-values stay NaN."""
+    p = np.asarray(p_values, dtype=np.float64)
+    q = np.full_like(p, np.nan)
+    ok = np.flatnonzero(np.isfinite(p))
+    if ok.size == 0:
+        return q
+    order = ok[np.argsort(p[ok], kind="stable")]
+    ranked = p[order] * ok.size / np.arange(1, ok.size + 1)
+    q[order] = np.minimum(1.0, np.minimum.accumulate(ranked[::-1])[::-1])
+    return q
+
+
+def pair_overlaps(matrix: BaselineMatrix, ifp_a: list[str], ifp_b: list[str]) -> np.ndarray:
+    """Number of users with a baseline on both IFPs of each (a, b) pair."""
+    has_baseline = sparse.csc_array(
+        (np.ones(len(matrix.data)), matrix.indices, matrix.indptr), shape=matrix.shape
+    )
+    shared = (has_baseline.T @ has_baseline).toarray()  # (n_ifps, n_ifps)
+    return shared[matrix.ifp_positions(ifp_a), matrix.ifp_positions(ifp_b)].astype(np.int64)
+
+
+def pair_values(
+    matrix: BaselineMatrix, ifp_a: list[str], ifp_b: list[str]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Baselines of the users shared by each (a, b) pair, left-aligned and zero-padded.
+
+    Returns:
+        `x`, `y` of shape (n_pairs, max_n) and `n` (shared users per pair).
+    """
+    return _pair_arrays(
+        matrix.indptr,
+        matrix.indices,
+        matrix.data,
+        matrix.ifp_positions(ifp_a),
+        matrix.ifp_positions(ifp_b),
+    )
+
+
+def _pair_arrays(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    data: np.ndarray,
+    pos_a: np.ndarray,
+    pos_b: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """`pair_values` for the CSC columns `pos_a`, `pos_b`."""
+    xs, ys = [], []
+    for a, b in zip(pos_a, pos_b, strict=True):
+        sa, sb = slice(indptr[a], indptr[a + 1]), slice(indptr[b], indptr[b + 1])
+        _, ia, ib = np.intersect1d(
+            indices[sa], indices[sb], assume_unique=True, return_indices=True
+        )
+        xs.append(data[sa][ia])
+        ys.append(data[sb][ib])
+
+    n = np.array([len(v) for v in xs], dtype=np.int64)
+    width = int(n.max(initial=0))
+    x = np.zeros((len(xs), width))
+    y = np.zeros((len(ys), width))
+    for i, (vx, vy) in enumerate(zip(xs, ys, strict=True)):
+        x[i, : len(vx)] = vx
+        y[i, : len(vy)] = vy
+    return x, y, n
+
+
+def _masked_corr(x: np.ndarray, y: np.ndarray, mask: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """Pearson corr along the last axis over `mask`ed entries (NaN for zero variance)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dx = np.where(mask, x - (x * mask).sum(-1, keepdims=True) / n[:, None], 0.0)
+        dy = np.where(mask, y - (y * mask).sum(-1, keepdims=True) / n[:, None], 0.0)
+        var = (dx * dx).sum(-1) * (dy * dy).sum(-1)
+        corr = (dx * dy).sum(-1) / np.sqrt(var)
+    corr[~(var > 0)] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def _batches(total: int, batch: int) -> Iterator[int]:
+    while total > 0:
+        yield min(batch, total)
+        total -= batch
+
+
+def _init_worker(indptr: np.ndarray, indices: np.ndarray, data: np.ndarray) -> None:
+    global _SHARED  # noqa: PLW0603
+    _SHARED = _WorkerInputs(indptr=indptr, indices=indices, data=data)
+
+
+def _resample_chunk(  # noqa: PLR0913
+    pos_a: np.ndarray,
+    pos_b: np.ndarray,
+    seed: np.random.SeedSequence,
+    *,
+    n_boot: int,
+    n_perm: int,
+    ci: float,
+    memory_budget_bytes: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Bootstrap CI bounds and two-sided permutation p-values for one chunk of pairs.
+
+    The chunk's padded baselines are built here, from the worker's copy of the matrix.
+    Resamples are drawn in batches along a leading axis; `Generator.random` fills arrays
+    in order, so the batch size (set by the memory budget) does not change the draws.
+    """
+    if _SHARED is None:
+        msg = "Resampling worker used before `_init_worker`"
+        raise RuntimeError(msg)
+    x, y, n = _pair_arrays(_SHARED.indptr, _SHARED.indices, _SHARED.data, pos_a, pos_b)
+    if x.shape[1] == 0:  # no pair in the chunk shares a user
+        x, y = np.zeros((len(n), 1)), np.zeros((len(n), 1))
+    n_pairs, width = x.shape
+    mask = np.arange(width) < n[:, None]
+    batch = max(1, memory_budget_bytes // (_ARRAYS_PER_BATCH * 8 * max(1, n_pairs * width)))
+    boot_rng, perm_rng = (np.random.default_rng(s) for s in seed.spawn(2))
+    observed = _masked_corr(x, y, mask, n)
+
+    boot = np.empty((n_boot, n_pairs))
+    done = 0
+    for b in _batches(n_boot, batch):
+        # Draw users with replacement among each pair's first n (valid) slots
+        idx = (boot_rng.random((b, n_pairs, width)) * n[:, None]).astype(np.int64)
+        idx = np.where(mask, idx, 0)
+        bx = np.take_along_axis(x[None], idx, axis=-1)
+        by = np.take_along_axis(y[None], idx, axis=-1)
+        boot[done : done + b] = _masked_corr(bx, by, mask[None], n)
+        done += b
+
+    exceed = np.zeros(n_pairs, dtype=np.int64)
+    for b in _batches(n_perm, batch):
+        # Shuffle y within each pair's valid slots; padding sorts last and stays masked
+        keys = np.where(mask, perm_rng.random((b, n_pairs, width)), np.inf)
+        py = np.take_along_axis(y[None], np.argsort(keys, axis=-1), axis=-1)
+        perm = _masked_corr(x[None], py, mask[None], n)
+        exceed += (np.abs(perm) >= np.abs(observed) - 1e-12).sum(0)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN (degenerate) pairs
+        lo, hi = np.nanquantile(boot, [(1 - ci) / 2, (1 + ci) / 2], axis=0)
+    p_value = (1 + exceed) / (1 + n_perm)
+    p_value[~np.isfinite(observed)] = np.nan
+    return lo, hi, p_value
+
+
+def resample_corr(  # noqa: PLR0913
+    matrix: BaselineMatrix,
+    ifp_a: list[str],
+    ifp_b: list[str],
+    *,
+    n_boot: int = 1000,
+    n_perm: int = 1000,
+    ci: float = 0.95,
+    seed: int = 0,
+    n_jobs: int | None = None,
+    memory_budget_bytes: int = DEFAULT_RESAMPLE_BUDGET_BYTES,
+) -> pl.DataFrame:
+    """Percentile bootstrap CIs, permutation p-values and BH q-values for IFP pairs.
+
+    Each pair is resampled over the users who have a baseline on both IFPs. Pairs are
+    sorted by overlap and cut into fixed-size chunks (so padding stays small), and chunks
+    are spread over `n_jobs` processes (default: all cores). Every chunk gets its own
+    child of `SeedSequence(seed)`, so results do not depend on `n_jobs`.
+
+    Returns:
+        One row per input pair (same order): `ifp_id_a`, `ifp_id_b`, `corr_lo`,
+        `corr_hi`, `p_value`, `q_value`.
+    """
+    n = pair_overlaps(matrix, ifp_a, ifp_b)
+    pos_a, pos_b = matrix.ifp_positions(ifp_a), matrix.ifp_positions(ifp_b)
+    order = np.argsort(n, kind="stable")
+    starts = range(0, len(order), PAIRS_PER_CHUNK)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    chunks = [
+        (
+            pos_a[order[start : start + PAIRS_PER_CHUNK]],
+            pos_b[order[start : start + PAIRS_PER_CHUNK]],
+            s,
+        )
+        for start, s in zip(starts, seeds, strict=True)
+    ]
+
+    n_jobs = pool_size(n_jobs, len(chunks))
+    resample = partial(
+        _resample_chunk,
+        n_boot=n_boot,
+        n_perm=n_perm,
+        ci=ci,
+        memory_budget_bytes=memory_budget_bytes // n_jobs,
+    )
+    lo, hi, p_value = (np.full(len(n), np.nan) for _ in range(3))
+    for c, (c_lo, c_hi, c_p) in run_tasks(
+        resample,
+        chunks,
+        n_jobs=n_jobs,
+        initializer=_init_worker,
+        initargs=(matrix.indptr, matrix.indices, matrix.data),
+    ):
+        rows = order[starts[c] : starts[c] + PAIRS_PER_CHUNK]
+        lo[rows], hi[rows], p_value[rows] = c_lo, c_hi, c_p
+
+    return pl.DataFrame(
+        {
+            "ifp_id_a": pl.Series(ifp_a, dtype=pl.String),
+            "ifp_id_b": pl.Series(ifp_b, dtype=pl.String),
+            "corr_lo": lo,
+            "corr_hi": hi,
+            "p_value": p_value,
+            "q_value": fdr_bh(p_value),
+        }
+    )
@@ -0,0 +1,63 @@
+# Dictionary encoding for ids and low-cardinality columns
+# %%
+
+from collections.abc import Iterable
+from functools import lru_cache
+
+import polars as pl
+
+# Columns held as `pl.Enum` codes in compact mode (shared by IFPs and SurveyForecasts)
+ENCODED_COLUMNS = ("ifp_id", "user_id", "answer_option", "ctt", "training", "team", "q_status")
+
+
+def build_dictionaries(lfs: Iterable[pl.LazyFrame]) -> dict[str, pl.Enum]:
+    """One sorted `pl.Enum` per encoded column, over the union of values in `lfs`.
+
+    Categories are sorted so that ordering/comparisons on the codes match the strings.
+    """
+    values: dict[str, list[pl.Series]] = {col: [] for col in ENCODED_COLUMNS}
+    for lf in lfs:
+        present = [col for col in ENCODED_COLUMNS if col in lf.collect_schema().names()]
+        uniques = lf.select(pl.col(col).unique().implode() for col in present).collect()
+        for col in present:
+            values[col].append(uniques[col].explode().drop_nulls())
+    return {
+        col: pl.Enum(pl.concat(series).unique().sort()) for col, series in values.items() if series
+    }
+
+
+def encode[FrameT: (pl.DataFrame, pl.LazyFrame)](
+    lf: FrameT, dictionaries: dict[str, pl.Enum]
+) -> FrameT:
+    """Cast encoded columns present in `lf` to their global `pl.Enum`."""
+    names = lf.collect_schema().names()
+    return lf.with_columns(
+        pl.col(col).cast(dtype) for col, dtype in dictionaries.items() if col in names
+    )
+
+
+def decode[FrameT: (pl.DataFrame, pl.LazyFrame)](lf: FrameT) -> FrameT:
+    """Cast every `pl.Enum`/`pl.Categorical` column back to `pl.String` (e.g. for display)."""
+    return lf.with_columns(pl.col(pl.Enum, pl.Categorical).cast(pl.String))
+
+
+def is_compact(lf: pl.DataFrame | pl.LazyFrame) -> bool:
+    """Whether `lf` holds `ifp_id` as dictionary codes."""
+    return isinstance(lf.collect_schema().get("ifp_id"), pl.Enum)
+
+
+def global_dictionaries() -> dict[str, pl.Enum]:
+    """Dictionaries over the IFPs and all survey forecast years (cached per data version)."""
+    from coco.gjp.models.survey_fcasts import ALL_YEARS, SurveyForecasts  # noqa: PLC0415
+
+    return _global_dictionaries(SurveyForecasts.dataset_version(ALL_YEARS))
+
+
+@lru_cache(maxsize=1)
+def _global_dictionaries(version: str) -> dict[str, pl.Enum]:  # noqa: ARG001
+    from coco.gjp.models.ifp import IFPs  # noqa: PLC0415
+    from coco.gjp.models.survey_fcasts import ALL_YEARS, SurveyForecasts  # noqa: PLC0415
+
+    return build_dictionaries(
+        [IFPs._load_raw(), *(SurveyForecasts._load_single_year(y) for y in ALL_YEARS)]  # noqa: SLF001
+    )
@@ -0,0 +1,109 @@
+# Physical layouts of survey forecasts for per-user / per-IFP reads
+# %%
+
+from collections.abc import Collection
+import json
+from pathlib import Path
+import zlib
+
+import polars as pl
+
+from coco.config import logger
+
+DEFAULT_N_BUCKETS = 64
+DEFAULT_ROW_GROUP_SIZE = 16_384
+
+
+def user_bucket(user_id: str, n_buckets: int) -> int:
+    """Stable (cross-process, cross-version) hash bucket of a user id."""
+    return zlib.crc32(user_id.encode()) % n_buckets
+
+
+class ForecastLayout:
+    """Two copies of a forecast table under `root`, each pruned differently on read.
+
+    Layout:
+        - `by_user/bucket={b}.parquet`: rows hash-partitioned by `user_id` (sorted by
+          user within a bucket), so a per-user query reads one file
+        - `by_ifp.parquet`: rows sorted by `ifp_id`, written in small row groups with
+          min/max statistics, so a per-IFP query only reads the matching row groups
+        - `manifest.json`: bucket count and row counts
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        *,
+        n_buckets: int = DEFAULT_N_BUCKETS,
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    ) -> None:
+        self.root = Path(root)
+        self.n_buckets = n_buckets
+        self.row_group_size = row_group_size
+        if manifest := self._read_manifest():
+            self.n_buckets = manifest["n_buckets"]
+
+    def _read_manifest(self) -> dict | None:
+        try:
+            return json.loads((self.root / "manifest.json").read_text())
+        except FileNotFoundError:
+            return None
+
+    def exists(self) -> bool:
+        """Whether both layouts have been fully written."""
+        return self._read_manifest() is not None
+
+    def bucket_path(self, bucket: int) -> Path:
+        """File holding user partition `bucket`."""
+        return self.root / "by_user" / f"bucket={bucket}.parquet"
+
+    @property
+    def ifp_path(self) -> Path:
+        """File holding the IFP-sorted copy."""
+        return self.root / "by_ifp.parquet"
+
+    def write(self, df: pl.DataFrame) -> None:
+        """Write both layouts of `df` (string `user_id`/`ifp_id` columns)."""
+        logger.info(f"Writing forecast layouts ({len(df)} rows) to {self.root}")
+        (self.root / "by_user").mkdir(parents=True, exist_ok=True)
+
+        users = df.select(pl.col("user_id").unique())
+        buckets = users.with_columns(
+            pl.Series(
+                "_bucket",
+                [user_bucket(u, self.n_buckets) for u in users["user_id"]],
+                dtype=pl.Int64,
+            )
+        )
+        partitions = df.join(buckets, on="user_id", how="left").partition_by(
+            "_bucket", as_dict=True, include_key=False
+        )
+        for bucket in range(self.n_buckets):
+            part = partitions.get((bucket,), df.clear())
+            part.sort(["user_id", "timestamp"]).write_parquet(
+                self.bucket_path(bucket),
+                row_group_size=self.row_group_size,
+                statistics=True,
+            )
+
+        df.sort(["ifp_id", "timestamp"]).write_parquet(
+            self.ifp_path, row_group_size=self.row_group_size, statistics=True
+        )
+        manifest = {"n_buckets": self.n_buckets, "n_rows": len(df)}
+        (self.root / "manifest.json").write_text(json.dumps(manifest))
+
+    def bucket_paths(self, user_ids: Collection[str]) -> list[Path]:
+        """Partition files that can contain `user_ids`."""
+        buckets = sorted({user_bucket(u, self.n_buckets) for u in user_ids})
+        return [self.bucket_path(b) for b in buckets]
+
+    def scan_users(self, user_ids: Collection[str]) -> pl.LazyFrame:
+        """Forecasts of `user_ids`, reading only their hash partitions."""
+        paths = self.bucket_paths(user_ids)
+        if not paths:
+            return pl.scan_parquet(self.bucket_path(0)).clear()
+        return pl.scan_parquet(paths).filter(pl.col("user_id").is_in(list(user_ids)))
+
+    def scan_ifps(self, ifp_ids: Collection[str]) -> pl.LazyFrame:
+        """Forecasts on `ifp_ids`; row-group statistics skip non-matching groups."""
+        return pl.scan_parquet(self.ifp_path).filter(pl.col("ifp_id").is_in(list(ifp_ids)))
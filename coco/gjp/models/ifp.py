@@ -4,6 +4,7 @@
 
 from enum import Enum
 from functools import lru_cache
+from pathlib import Path
 
 import pandera.polars as pa
 import pandera.typing.polars as pat
@@ -11,6 +12,8 @@ import polars as pl
 from pydantic import BaseModel, ConfigDict, Field
 
 from coco.config import DATA_DIR, logger
+from coco.gjp.models.columnar_cache import cached_scan
+from coco.gjp.models.encoding import encode, global_dictionaries
 
 IFP_CSV_PATH = DATA_DIR / "dataverse_files" / "ifps.csv"
 
@@ -59,16 +62,16 @@ class IFPs(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
 
     @staticmethod
-    @pa.check_types
-    def _load_raw() -> pat.LazyFrame[IFPSchema]:
+    def _parse_raw_csv(path: Path) -> pl.LazyFrame:
+        r"""Parse the `\r`-terminated `ifps.csv` into typed columns (lazy)."""
         lf = pl.scan_csv(
-            IFP_CSV_PATH,
+            path,
             eol_char="\r",
             null_values=["NA", ""],
             encoding="utf8-lossy",
         )
 
-        lf = lf.with_columns(
+        return lf.with_columns(
             pl.col("date_start").str.to_date("%m/%d/%y"),
             pl.col("date_to_close").str.to_date("%m/%d/%y"),
             pl.col("date_closed").str.to_date("%m/%d/%y"),
@@ -76,13 +79,24 @@ class IFPs(BaseModel):
             pl.col("q_status").str.to_lowercase(),
         )
 
+    @staticmethod
+    @pa.check_types
+    def _load_raw() -> pat.LazyFrame[IFPSchema]:
+        lf = cached_scan(IFP_CSV_PATH, IFPs._parse_raw_csv)
         return IFPSchema.validate(lf)
 
     @classmethod
-    @lru_cache(maxsize=1)
-    def load(cls) -> "IFPs":
-        """Load and parse the IFPs dataset (cached)."""
-        return cls(lf=cls._load_raw())  # pyright: ignore[reportArgumentType]
+    @lru_cache(maxsize=2)
+    def load(cls, *, compact: bool = False) -> "IFPs":
+        """Load and parse the IFPs dataset (cached).
+
+        Args:
+            compact: Hold id/low-cardinality columns as `pl.Enum` codes (see `encoding`).
+        """
+        if not compact:
+            return cls(lf=cls._load_raw())  # pyright: ignore[reportArgumentType]
+        lf = encode(cls._load_raw().collect(), global_dictionaries()).lazy()
+        return cls(lf=lf)
 
     def filter_studied(self, lf: pl.LazyFrame | None = None) -> pl.LazyFrame:
         """Filters forecasts based on whether we are considering them in this study.
@@ -0,0 +1,218 @@
+# Pairwise-complete correlations between IFPs over users' baselines
+# %%
+
+import numpy as np
+import polars as pl
+from scipy import sparse
+
+from coco.gjp.models.baseline_matrix import BaselineMatrix
+from coco.gjp.models.overlap import indicator, overlap_pairs, shared_counts
+
+# Variances below this fraction of the sum of squares are treated as zero (constant column)
+_REL_VAR_EPS = 1e-12
+
+
+def pair_moments(x: sparse.csc_array, y: sparse.csc_array | None = None) -> dict[str, np.ndarray]:
+    """Pairwise-complete sufficient statistics between the columns of `x` and `y`.
+
+    For column i of `x` and column j of `y`, over users observed in both:
+    `n` (count), `sx`/`sy` (sums), `sxx`/`syy` (sums of squares) and `sxy` (cross sums).
+    Each is one sparse product of (value or indicator) matrices.
+    """
+    y = x if y is None else y
+    mx, my = indicator(x), indicator(y)
+    x2, y2 = x.multiply(x), y.multiply(y)
+    return {
+        "n": (mx.T @ my).toarray(),
+        "sx": (x.T @ my).toarray(),
+        "sy": (mx.T @ y).toarray(),
+        "sxx": (x2.T @ my).toarray(),
+        "syy": (mx.T @ y2).toarray(),
+        "sxy": (x.T @ y).toarray(),
+    }
+
+
+def corr_from_moments(moments: dict[str, np.ndarray]) -> np.ndarray:
+    """Pearson correlation from `pair_moments` (NaN for n < 2 or zero variance)."""
+    n, sx, sy = moments["n"], moments["sx"], moments["sy"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = moments["sxy"] - sx * sy / n
+        var_x = moments["sxx"] - sx * sx / n
+        var_y = moments["syy"] - sy * sy / n
+        var_x[var_x <= _REL_VAR_EPS * moments["sxx"]] = 0.0
+        var_y[var_y <= _REL_VAR_EPS * moments["syy"]] = 0.0
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[(n < 2) | (var_x <= 0) | (var_y <= 0)] = np.nan  # noqa: PLR2004
+    return np.clip(corr, -1.0, 1.0)
+
+
+def pairwise_corr(matrix: BaselineMatrix, ifp_ids: list[str]) -> pl.DataFrame:
+    """Long-form correlations between all ordered pairs of `ifp_ids` (incl. the diagonal).
+
+    Columns: `ifp_id_x`, `ifp_id_y`, `corr`, `n` (users with a baseline on both), ordered
+    x-major as in `ifp_ids`. Matches `pl.corr` on the pivoted (users x IFPs) table; the
+    formula is only evaluated on the upper triangle and mirrored.
+    """
+    x = matrix.to_scipy()[:, matrix.ifp_positions(ifp_ids)]
+    moments = pair_moments(x)
+
+    k = len(ifp_ids)
+    iu, ju = np.triu_indices(k)
+    upper = corr_from_moments({name: m[iu, ju] for name, m in moments.items()})
+    corr = np.empty((k, k))
+    corr[iu, ju] = upper
+    corr[ju, iu] = upper
+    # An IFP is perfectly correlated with itself once it has 2 users (as `pl.corr(x, x)`)
+    diag = np.diag(moments["n"]) >= 2  # noqa: PLR2004
+    corr[np.diag_indices(k)] = np.where(diag, 1.0, np.nan)
+
+    ids = pl.Series(ifp_ids, dtype=pl.String)
+    return pl.DataFrame(
+        {
+            "ifp_id_x": ids.gather(np.repeat(np.arange(k), k)),
+            "ifp_id_y": ids.gather(np.tile(np.arange(k), k)),
+            "corr": corr.ravel(),
+            "n": moments["n"].ravel().astype(np.int64),
+        }
+    )
+
+
+def overlap_corr(matrix: BaselineMatrix, ifp_ids: list[str], *, min_n: int = 2) -> pl.DataFrame:
+    """Correlations for the unordered pairs of `ifp_ids` sharing at least `min_n` users.
+
+    Candidate pairs come from the sparse shared-user counts (see `shared_counts`), so pairs
+    below the overlap threshold never get a correlation. The moment products are kept
+    sparse and only read at the surviving pairs.
+
+    Returns:
+        Long frame (`ifp_id_x`, `ifp_id_y`, `corr`, `n`), x before y in `ifp_ids` order.
+    """
+    x = matrix.to_scipy()[:, matrix.ifp_positions(ifp_ids)]
+    i, j, n = overlap_pairs(shared_counts(x), min_shared=max(min_n, 1))
+    mx, x2 = indicator(x), x.multiply(x)
+
+    def at(product: sparse.sparray) -> np.ndarray:
+        return np.asarray(sparse.csr_array(product)[i, j]).ravel()
+
+    moments = {
+        "n": n,
+        "sx": at(x.T @ mx),
+        "sy": at(mx.T @ x),
+        "sxx": at(x2.T @ mx),
+        "syy": at(mx.T @ x2),
+        "sxy": at(x.T @ x),
+    }
+    ids = pl.Series(ifp_ids, dtype=pl.String)
+    return pl.DataFrame(
+        {
+            "ifp_id_x": ids.gather(i),
+            "ifp_id_y": ids.gather(j),
+            "corr": corr_from_moments(moments),
+            "n": n,
+        }
+    )
+
+
+DEFAULT_CORR_BUDGET_BYTES = 256 * 2**20
+# float64 (tile x tile) arrays alive at once while scoring a tile (moments, corr, merge)
+_ARRAYS_PER_TILE = 16
+
+
+def _tile_size(memory_budget_bytes: int, n_ifps: int) -> int:
+    tile = int(np.sqrt(memory_budget_bytes / (_ARRAYS_PER_TILE * 8)))
+    return max(1, min(n_ifps, tile))
+
+
+class _RunningTopK:
+    """Per-row top-k (by corr^2) over candidate columns seen so far."""
+
+    def __init__(self, n_rows: int, k: int) -> None:
+        self.k = k
+        self.r2 = np.full((n_rows, k), -np.inf)
+        self.col = np.full((n_rows, k), -1, dtype=np.int64)
+        self.corr = np.full((n_rows, k), np.nan)
+        self.n = np.zeros((n_rows, k), dtype=np.int64)
+
+    def update(
+        self,
+        rows: slice,
+        cols: np.ndarray,
+        corr: np.ndarray,
+        n: np.ndarray,
+        valid: np.ndarray,
+    ) -> None:
+        """Merge a (rows x cols) block of candidates into the running top-k."""
+        r2 = np.where(valid, corr**2, -np.inf)
+        all_r2 = np.concatenate([self.r2[rows], r2], axis=1)
+        all_col = np.concatenate([self.col[rows], np.broadcast_to(cols, r2.shape)], axis=1)
+        all_corr = np.concatenate([self.corr[rows], corr], axis=1)
+        all_n = np.concatenate([self.n[rows], n], axis=1)
+
+        keep = np.argpartition(-all_r2, self.k - 1, axis=1)[:, : self.k]
+        self.r2[rows] = np.take_along_axis(all_r2, keep, axis=1)
+        self.col[rows] = np.take_along_axis(all_col, keep, axis=1)
+        self.corr[rows] = np.take_along_axis(all_corr, keep, axis=1)
+        self.n[rows] = np.take_along_axis(all_n, keep, axis=1)
+
+
+def topk_corr(
+    matrix: BaselineMatrix,
+    ifp_ids: list[str],
+    *,
+    k: int,
+    min_n: int = 2,
+    memory_budget_bytes: int = DEFAULT_CORR_BUDGET_BYTES,
+) -> pl.DataFrame:
+    """For each IFP in `ifp_ids`, its `k` partners in `ifp_ids` with the largest corr^2.
+
+    Correlations are computed tile by tile (tiles sized to `memory_budget_bytes`, upper
+    triangle of tiles only) and folded into a running per-row top-k, so the full
+    N x N table is never held. Pairs with fewer than `min_n` shared users are skipped.
+
+    Returns:
+        Long frame (`ifp_id_x`, `ifp_id_y`, `corr`, `n`, `r2`, `rank`) with `rank` 1..k
+        by descending `r2` within each `ifp_id_x`.
+    """
+    x = matrix.to_scipy()[:, matrix.ifp_positions(ifp_ids)]
+    n_ifps = len(ifp_ids)
+    k = max(1, min(k, n_ifps - 1))
+    tile = _tile_size(memory_budget_bytes, n_ifps)
+    top = _RunningTopK(n_ifps, k)
+
+    for i0 in range(0, n_ifps, tile):
+        rows_i = slice(i0, min(i0 + tile, n_ifps))
+        cols_i = np.arange(rows_i.start, rows_i.stop)
+        xi = x[:, rows_i]
+        for j0 in range(i0, n_ifps, tile):
+            rows_j = slice(j0, min(j0 + tile, n_ifps))
+            cols_j = np.arange(rows_j.start, rows_j.stop)
+            xj = x[:, rows_j]
+            # Prune on overlap before the moment products
+            n = (indicator(xi).T @ indicator(xj)).toarray().astype(np.int64)
+            valid = n >= min_n
+            if i0 == j0:
+                np.fill_diagonal(valid, val=False)
+            if not valid.any():
+                continue
+            corr = corr_from_moments(pair_moments(xi, xj))
+            valid &= np.isfinite(corr)
+            top.update(rows_i, cols_j, corr, n, valid)
+            if i0 != j0:
+                top.update(rows_j, cols_i, corr.T, n.T, valid.T)
+
+    order = np.argsort(-top.r2, axis=1, kind="stable")
+    r2 = np.take_along_axis(top.r2, order, axis=1)
+    found = np.isfinite(r2)
+    row_idx = np.broadcast_to(np.arange(n_ifps)[:, None], r2.shape)[found]
+    col_idx = np.take_along_axis(top.col, order, axis=1)[found]
+    ids = pl.Series(ifp_ids, dtype=pl.String)
+    return pl.DataFrame(
+        {
+            "ifp_id_x": ids.gather(row_idx),
+            "ifp_id_y": ids.gather(col_idx),
+            "corr": np.take_along_axis(top.corr, order, axis=1)[found],
+            "n": np.take_along_axis(top.n, order, axis=1)[found],
+            "r2": r2[found],
+            "rank": np.broadcast_to(np.arange(1, k + 1), r2.shape)[found],
+        }
+    )
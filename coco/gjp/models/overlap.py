@@ -0,0 +1,70 @@
+# Shared-user (IFP x IFP) and shared-IFP (user x user) counts from the baseline matrix
+# %%
+
+import numpy as np
+import polars as pl
+from scipy import sparse
+
+from coco.gjp.models.baseline_matrix import BaselineMatrix
+
+
+def indicator(x: sparse.csc_array | sparse.csr_array) -> sparse.csc_array | sparse.csr_array:
+    """0/1 indicator of the stored entries of `x` (explicit zeros count as observed)."""
+    return type(x)((np.ones_like(x.data), x.indices, x.indptr), shape=x.shape)
+
+
+def shared_counts(x: sparse.csc_array) -> sparse.csr_array:
+    """Column x column co-occurrence counts of `x` (one indicator product, kept sparse).
+
+    Entry (i, j) is the number of rows observed in both columns i and j; the diagonal holds
+    per-column counts. Only pairs that share at least one row are stored.
+    """
+    m = indicator(x)
+    return sparse.csr_array(m.T @ m)
+
+
+def overlap_pairs(
+    counts: sparse.csr_array, *, min_shared: int = 1
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Unordered off-diagonal pairs (i < j) of `counts` with at least `min_shared` in common.
+
+    Returns:
+        Row positions `i`, column positions `j` and counts `n`, ordered by (i, j).
+    """
+    upper = sparse.triu(counts, k=1, format="coo")
+    keep = upper.data >= min_shared
+    i, j, n = upper.row[keep], upper.col[keep], upper.data[keep]
+    order = np.lexsort((j, i))
+    return i[order].astype(np.int64), j[order].astype(np.int64), n[order].astype(np.int64)
+
+
+def _overlap_frame(
+    counts: sparse.csr_array, ids: list[str], *, prefix: str, min_shared: int
+) -> pl.DataFrame:
+    i, j, n = overlap_pairs(counts, min_shared=min_shared)
+    s = pl.Series(ids, dtype=pl.String)
+    return pl.DataFrame({f"{prefix}_x": s.gather(i), f"{prefix}_y": s.gather(j), "n": n})
+
+
+def ifp_overlap(
+    matrix: BaselineMatrix, ifp_ids: list[str] | None = None, *, min_shared: int = 1
+) -> pl.DataFrame:
+    """Users with a baseline on both IFPs, for each unordered IFP pair sharing `min_shared`.
+
+    Columns: `ifp_id_x`, `ifp_id_y` (x before y in `ifp_ids` order), `n`.
+    """
+    ifp_ids = matrix.ifp_ids if ifp_ids is None else ifp_ids
+    x = matrix.to_scipy()[:, matrix.ifp_positions(ifp_ids)]
+    return _overlap_frame(shared_counts(x), ifp_ids, prefix="ifp_id", min_shared=min_shared)
+
+
+def user_overlap(
+    matrix: BaselineMatrix, user_ids: list[str] | None = None, *, min_shared: int = 1
+) -> pl.DataFrame:
+    """IFPs with a baseline from both users, for each unordered user pair sharing `min_shared`.
+
+    Columns: `user_id_x`, `user_id_y` (x before y in `user_ids` order), `n`.
+    """
+    user_ids = matrix.user_ids if user_ids is None else user_ids
+    x = sparse.csc_array(matrix.to_scipy()[matrix.user_positions(user_ids)].T)
+    return _overlap_frame(shared_counts(x), user_ids, prefix="user_id", min_shared=min_shared)
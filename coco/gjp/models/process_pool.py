@@ -0,0 +1,52 @@
+# Process pools for chunked work
+#
+# Workers are started with `spawn`: Polars' (and BLAS') thread pools do not survive `fork`,
+# so a forked child can deadlock on a lock held by a thread that no longer exists. Large
+# read-only inputs are handed to each worker once, through the pool initializer (ideally as
+# paths of arrays to memory-map), rather than pickled with every task.
+# %%
+
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import os
+
+
+def pool_size(n_jobs: int | None, n_tasks: int) -> int:
+    """Worker processes for `n_tasks` tasks: `n_jobs` (default: all cores), at most one each."""
+    return min(n_jobs or os.cpu_count() or 1, max(1, n_tasks))
+
+
+def run_tasks[T, *Ts](
+    fn: Callable[..., T],
+    tasks: Sequence[tuple[object, ...]],
+    *,
+    n_jobs: int,
+    initializer: Callable[[*Ts], None] | None = None,
+    initargs: tuple[*Ts] = (),
+) -> Iterator[tuple[int, T]]:
+    """Yield `(i, fn(*tasks[i]))` for every task, in completion order.
+
+    With `n_jobs > 1` the tasks run on a spawned process pool whose workers each call
+    `initializer(*initargs)` first; otherwise `initializer` and the tasks run in this process.
+    `fn` and `initializer` must be module-level functions (picklable by reference).
+    """
+    if n_jobs <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for i, task in enumerate(tasks):
+            yield i, fn(*task)
+        return
+
+    spawn = multiprocessing.get_context("spawn")
+    pool = (
+        ProcessPoolExecutor(max_workers=n_jobs, mp_context=spawn)
+        if initializer is None
+        else ProcessPoolExecutor(
+            max_workers=n_jobs, mp_context=spawn, initializer=initializer, initargs=initargs
+        )
+    )
+    with pool:
+        futures = {pool.submit(fn, *task): i for i, task in enumerate(tasks)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
@@ -0,0 +1,85 @@
+# Memory-budgeted registry of materialized dataset frames
+# %%
+
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+import os
+
+import polars as pl
+
+from coco.config import logger
+
+DEFAULT_BUDGET_BYTES = int(os.environ.get("COCO_DATASET_CACHE_MB", "2048")) * 2**20
+
+
+class DatasetRegistry:
+    """LRU cache of materialized frames, bounded by their estimated in-memory size.
+
+    Frames are keyed by any hashable key (e.g. `("survey_fcasts", 1)` for a single year).
+    When the total size exceeds `budget_bytes`, least recently used entries are evicted.
+    A frame that alone exceeds the budget is returned but not cached.
+    """
+
+    def __init__(self, budget_bytes: int = DEFAULT_BUDGET_BYTES) -> None:
+        self.budget_bytes = budget_bytes
+        self._frames: OrderedDict[Hashable, pl.DataFrame] = OrderedDict()
+        self._sizes: dict[Hashable, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def nbytes(self) -> int:
+        """Estimated size of all cached frames."""
+        return sum(self._sizes.values())
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._frames
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def get(self, key: Hashable, build: Callable[[], pl.DataFrame]) -> pl.DataFrame:
+        """Return the frame cached under `key`, building (and caching) it on a miss."""
+        if key in self._frames:
+            self.hits += 1
+            self._frames.move_to_end(key)
+            return self._frames[key]
+
+        self.misses += 1
+        df = build()
+        size = int(df.estimated_size())
+        if size > self.budget_bytes:
+            logger.debug(f"Not caching {key!r}: {size} bytes exceeds budget")
+            return df
+
+        self._frames[key] = df
+        self._sizes[key] = size
+        self._evict()
+        return df
+
+    def _evict(self) -> None:
+        while self.nbytes > self.budget_bytes and len(self._frames) > 1:
+            key, _ = self._frames.popitem(last=False)
+            del self._sizes[key]
+            self.evictions += 1
+            logger.debug(f"Evicted {key!r} from dataset registry")
+
+    def clear(self) -> None:
+        """Drop all cached frames (counters are kept)."""
+        self._frames.clear()
+        self._sizes.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Hit/miss/eviction counters and current memory usage."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._frames),
+            "nbytes": self.nbytes,
+            "budget_bytes": self.budget_bytes,
+        }
+
+
+REGISTRY = DatasetRegistry()
@@ -0,0 +1,127 @@
+# GJP-style time-weighted daily Brier scores
+#
+# A forecast's Brier score is sum_o (p_o - [o = outcome])^2 over the answer options (an
+# unreported option counts as p = 0). Each forecast stands from its day until the user's
+# next forecast, their withdrawal (the withdraw day is still scored) or the question's close
+# date (inclusive); the last forecast of a day is the one scored for that day. Instead of
+# expanding forecasts to one row per open day, every forecast becomes one interval of days
+# [start, end), and daily means are interval sums weighted by their length.
+# %%
+
+import polars as pl
+from pydantic import BaseModel, ConfigDict, Field
+
+from coco.gjp.models.baselines import BASELINE_ORDER_BY
+from coco.gjp.models.encoding import decode
+from coco.gjp.models.survey_fcasts import ForecastType, SurveyForecasts
+
+CONDITION_COLUMNS = ["ctt", "cond", "training", "team"]
+
+_PAIR = ["user_id", "ifp_id"]
+
+
+class BrierScores(BaseModel):
+    """Scored intervals of standing forecasts, with per-user/IFP/condition daily means."""
+
+    intervals: pl.DataFrame = Field(
+        description="user_id, ifp_id, conditions, start, end (exclusive), days, brier"
+    )
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    @classmethod
+    def from_forecasts(cls, forecasts_df: pl.DataFrame) -> "BrierScores":
+        """Build from forecast rows (`user_id`, `ifp_id`, `answer_option`, `value`,
+        `fcast_type`, `fcast_date`) joined with `date_start`, `date_closed` and `outcome`.
+
+        Questions without an outcome or close date (e.g. voided) are not scored.
+        """
+        df = decode(forecasts_df).filter(
+            pl.col("outcome").is_not_null() & pl.col("date_closed").is_not_null()
+        )
+        order_by = [col for col in BASELINE_ORDER_BY if col in df.columns]
+        conditions = [col for col in CONDITION_COLUMNS if col in df.columns]
+        one_day = pl.duration(days=1)
+        intervals = (
+            df.lazy()
+            .group_by(*_PAIR, *order_by)
+            .agg(
+                (pl.col("value") - (pl.col("answer_option") == pl.col("outcome"))).pow(2).sum()
+                + (pl.col("answer_option") == pl.col("outcome")).any().not_().cast(pl.Float64),
+                (pl.col("fcast_type") == ForecastType.WITHDRAW.value).any().alias("withdraw"),
+                pl.col("date_start", "date_closed", *conditions).first(),
+            )
+            .rename({"value": "brier"})
+            .sort(*_PAIR, *order_by)
+            # A withdrawal ends the standing forecast after its day
+            .with_columns(
+                (pl.col("fcast_date") + pl.when("withdraw").then(one_day).otherwise(None))
+                .fill_null(pl.col("fcast_date"))
+                .alias("start")
+            )
+            .with_columns(
+                pl.col("start").shift(-1).cum_min(reverse=True).over(_PAIR).alias("next")
+            )
+            .with_columns(
+                pl.max_horizontal("start", "date_start").alias("start"),
+                pl.min_horizontal("next", pl.col("date_closed") + one_day).alias("end"),
+            )
+            .with_columns((pl.col("end") - pl.col("start")).dt.total_days().alias("days"))
+            .filter(pl.col("withdraw").not_() & (pl.col("days") > 0))
+            .select(*_PAIR, *conditions, "start", "end", "days", "brier")
+            .collect()
+        )
+        return cls(intervals=intervals)
+
+    @classmethod
+    def from_survey_forecasts(cls, sf: SurveyForecasts) -> "BrierScores":
+        """Scores of every studied forecast of `sf`."""
+        return cls.from_forecasts(sf.filter_studied().collect())
+
+    def user_ifp(self) -> pl.DataFrame:
+        """Mean daily Brier score of each (user, IFP) over the days they had a forecast."""
+        conditions = [col for col in CONDITION_COLUMNS if col in self.intervals.columns]
+        return (
+            self.intervals.group_by(_PAIR)
+            .agg(
+                pl.col(conditions).first(),
+                pl.col("days").sum(),
+                ((pl.col("brier") * pl.col("days")).sum() / pl.col("days").sum()).alias(
+                    "mean_daily_brier"
+                ),
+            )
+            .sort(_PAIR)
+        )
+
+    def per_user(self) -> pl.DataFrame:
+        """Each user's mean over IFPs of their mean daily Brier (every IFP weighs the same)."""
+        return self._mean_over(self.user_ifp(), ["user_id"], count="ifp_id")
+
+    def per_ifp(self) -> pl.DataFrame:
+        """Each IFP's mean over users of their mean daily Brier."""
+        return self._mean_over(self.user_ifp(), ["ifp_id"], count="user_id")
+
+    def per_condition(self, by: str | list[str] = "ctt") -> pl.DataFrame:
+        """Mean over users of their score within each condition (any of `CONDITION_COLUMNS`)."""
+        by = [by] if isinstance(by, str) else by
+        users = self._mean_over(self.user_ifp(), [*by, "user_id"], count="ifp_id")
+        return self._mean_over(users, by, count="user_id")
+
+    @staticmethod
+    def _mean_over(scores: pl.DataFrame, by: list[str], *, count: str) -> pl.DataFrame:
+        return (
+            scores.group_by(by)
+            .agg(
+                pl.col(count).n_unique().alias(f"n_{count.removesuffix('_id')}s"),
+                pl.col("mean_daily_brier").mean(),
+            )
+            .sort(by, nulls_last=True)
+        )
+
+
+# %%
+if __name__ == "__main__":
+    from IPython.display import display
+
+    scores = BrierScores.from_survey_forecasts(SurveyForecasts.load())
+    display(scores.per_user())
+    display(scores.per_condition(["ctt", "cond"]))
@@ -2,18 +2,65 @@
 # Defined in data/dataverse_files/readme.txt
 # %%
 
+from collections.abc import Collection
 from enum import Enum
-from functools import lru_cache
+import hashlib
+from pathlib import Path
 
 import pandera.polars as pa
 import pandera.typing.polars as pat
 import polars as pl
 from pydantic import BaseModel, ConfigDict, Field
 
-from coco.config import DATA_DIR, logger
-from coco.gjp.models.ifp import IFPs
+from coco.config import BASELINE_MATRIX_DIR, DATA_DIR, FORECAST_LAYOUT_DIR, logger
+from coco.gjp.models.baseline_matrix import BaselineMatrix
+from coco.gjp.models.baseline_store import BaselineStore
+from coco.gjp.models.baselines import BASELINE_ORDER_BY, earliest_rows
+from coco.gjp.models.columnar_cache import cached_scan, source_fingerprint
+from coco.gjp.models.encoding import decode, encode, global_dictionaries, is_compact
+from coco.gjp.models.forecast_layout import ForecastLayout
+from coco.gjp.models.ifp import IFP_CSV_PATH, IFPs
+from coco.gjp.models.registry import REGISTRY
 
 SURVEY_FCASTS_DIR = DATA_DIR / "dataverse_files"
+ALL_YEARS = (1, 2, 3, 4)
+
+# IFP metadata carried on every studied forecast row
+STUDIED_IFP_COLUMNS = ["ifp_id", "short_title", "date_start", "date_closed", "outcome"]
+
+
+def normalize_years(years: tuple[int, ...] | None) -> tuple[int, ...]:
+    """Canonical (sorted, de-duplicated) years tuple; `None` means all years."""
+    if years is None:
+        return ALL_YEARS
+    normalized = tuple(sorted(set(years)))
+    if invalid := set(normalized) - set(ALL_YEARS):
+        msg = f"Unknown GJP years: {sorted(invalid)}"
+        raise ValueError(msg)
+    return normalized
+
+
+def _entity_predicate(
+    *,
+    user_ids: Collection[str] | None = None,
+    ifp_ids: Collection[str] | None = None,
+) -> pl.Expr:
+    """Row filter for the given users/IFPs (`None` means no restriction)."""
+    predicate = pl.lit(value=True)
+    for col, ids in [("user_id", user_ids), ("ifp_id", ifp_ids)]:
+        if isinstance(ids, str):
+            msg = f"Expected a collection of {col}s, got the single string {ids!r}"
+            raise TypeError(msg)
+        if ids is not None:
+            predicate &= pl.col(col).is_in(list(ids))
+    return predicate
+
+
+def _check_required(cols: list[str]) -> None:
+    required = {"ifp_id", "user_id", "answer_option", "value"}
+    if missing := required - set(cols):
+        msg = f"Missing required columns: {sorted(missing)}"
+        raise ValueError(msg)
 
 
 class ForecastType(Enum):
@@ -53,13 +100,15 @@ class SurveyForecasts(BaseModel):
     """Survey forecasts dataset wrapper (lazy)."""
 
     lf: pl.LazyFrame = Field(description="A pure, static lf")
+    years: tuple[int, ...] = Field(default=ALL_YEARS, description="GJP years contained in lf")
+    version: str | None = Field(
+        default=None, description="Hash of the source files behind lf (None if unknown)"
+    )
     model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
 
     @staticmethod
-    @pa.check_types
-    def _load_single_year(year: int) -> pat.LazyFrame[SurveyForecastSchema]:
-        """Load survey forecasts for a single year (lazy)."""
-        path = SURVEY_FCASTS_DIR / f"survey_fcasts.yr{year}.csv"
+    def _parse_single_year_csv(path: Path) -> pl.LazyFrame:
+        """Parse one `survey_fcasts.yr{N}.csv` file into typed columns (lazy)."""
         return pl.scan_csv(
             path,
             null_values=["NA", ""],
@@ -75,30 +124,104 @@ class SurveyForecasts(BaseModel):
             pl.col("fcast_date").str.to_date("%Y-%m-%d"),
             pl.col("timestamp").str.to_datetime("%Y-%m-%d %H:%M:%S"),
             pl.col("q_status").str.to_lowercase(),
-        )  # pyright: ignore[reportReturnType]
+        )
+
+    @staticmethod
+    @pa.check_types
+    def _load_single_year(year: int) -> pat.LazyFrame[SurveyForecastSchema]:
+        """Load survey forecasts for a single year (lazy, served from the columnar cache)."""
+        path = SURVEY_FCASTS_DIR / f"survey_fcasts.yr{year}.csv"
+        return cached_scan(path, SurveyForecasts._parse_single_year_csv)  # pyright: ignore[reportReturnType]
 
     @classmethod
-    @lru_cache(maxsize=1)
-    def load(cls, years: tuple[int, ...] | None = None) -> "SurveyForecasts":
-        """Load survey forecasts (cached).
+    def load(
+        cls, years: tuple[int, ...] | None = None, *, compact: bool = False
+    ) -> "SurveyForecasts":
+        """Load survey forecasts (per-year frames cached in `REGISTRY`).
 
         Args:
-            years: Tuple of years to load (1-4). Defaults to all years.
+            years: Tuple of years to load (1-4). Defaults to all years. Order and
+                duplicates are ignored, i.e. `(2, 1)` and `(1, 2, 2)` load the same data.
+            compact: Hold `ENCODED_COLUMNS` as `pl.Enum` codes from the dictionaries shared
+                with `IFPs.load(compact=True)`. Use `encoding.decode` for display.
+        """
+        years = normalize_years(years)
+        frames = [
+            REGISTRY.get(("survey_fcasts", y, compact), lambda y=y: cls._collect_year(y, compact))
+            for y in years
+        ]
+        lf = pl.concat([df.lazy() for df in frames])
+        if not compact:  # Compact years were validated before encoding
+            lf = SurveyForecastSchema.validate(lf)
+        return cls(lf=lf, years=years, version=cls.dataset_version(years))  # pyright: ignore[reportArgumentType]
+
+    @classmethod
+    def _collect_year(cls, year: int, compact: bool) -> pl.DataFrame:
+        df = cls._load_single_year(year).collect()
+        return encode(df, global_dictionaries()) if compact else df
+
+    @staticmethod
+    def dataset_version(years: tuple[int, ...]) -> str:
+        """Version of the data for `years`: a hash over the IFP and forecast source files."""
+        paths = [IFP_CSV_PATH, *(SURVEY_FCASTS_DIR / f"survey_fcasts.yr{y}.csv" for y in years)]
+        digest = hashlib.sha256(repr(years).encode())
+        for path in paths:
+            digest.update(source_fingerprint(path).encode())
+        return digest.hexdigest()[:16]
+
+    def studied(self) -> pl.LazyFrame:
+        """Studied forecasts joined with `STUDIED_IFP_COLUMNS`.
+
+        Materialized once per dataset `version` (held in `REGISTRY`); every derived view
+        (`simple`, `baselines`, ...) starts from this frame.
         """
-        if years is None:
-            years = (1, 2, 3, 4)
+        if self.version is None:
+            return self._join_studied_ifps(self.lf)
+        df = REGISTRY.get(
+            ("studied", self.version, is_compact(self.lf)),
+            lambda: self._join_studied_ifps(self.lf).collect(),
+        )
+        return df.lazy()
 
-        lfs = [cls._load_single_year(y) for y in years]
-        lf = pl.concat(lfs)
-        lf = SurveyForecastSchema.validate(lf)
-        return cls(lf=lf)  # pyright: ignore[reportArgumentType]
+    @staticmethod
+    def _join_studied_ifps(lf: pl.LazyFrame) -> pl.LazyFrame:
+        ifps = IFPs.load(compact=is_compact(lf))
+        ifp_meta = ifps.filter_studied().select(STUDIED_IFP_COLUMNS)
+        return lf.join(ifp_meta, on="ifp_id", how="inner")
 
     def filter_studied(self, lf: pl.LazyFrame | None = None) -> pl.LazyFrame:
         """Filters forecasts based on whether they are valid/being studied.
         Specifically: Do they come from a valid IFP? Baselines are done later.
+
+        Without `lf` (or with `self.lf`) this is the materialized `studied()` frame.
+
+        Only `STUDIED_IFP_COLUMNS` of the IFP metadata are joined (not every IFPs column,
+        e.g. `q_text` or the IFP's own `q_status`); join `IFPs.load().lf` on `ifp_id` for
+        the rest.
+        """
+        if lf is None or self._is_own(lf):
+            return self.studied()
+        return self._join_studied_ifps(lf)
+
+    def _is_own(self, lf: pl.LazyFrame) -> bool:
+        """Whether `lf` is this dataset's own (versioned) data."""
+        return lf is self.lf
+
+    def baseline_store(self) -> BaselineStore:
+        """Persisted baselines, synced with the source files of this dataset's years.
+
+        Only years whose IFP/forecast sources changed since the last sync are recomputed.
         """
-        lf = self.lf if lf is None else lf
-        return lf.join(IFPs.load().filter_studied(), on="ifp_id", how="inner")
+        store = BaselineStore()
+        store.sync(
+            {y: self.dataset_version((y,)) for y in self.years},
+            lambda y: self._join_studied_ifps(self._load_single_year(y)),
+        )
+        return store
+
+    def _match_encoding(self, lf: pl.LazyFrame) -> pl.LazyFrame:
+        """Match stored (string-keyed) data to this dataset's encoding."""
+        return encode(lf, global_dictionaries()) if is_compact(self.lf) else lf
 
     def simple(self, lf: pl.LazyFrame | None = None) -> pl.LazyFrame:
         """Create a simple view of the survey forecasts."""
@@ -130,6 +253,36 @@ class SurveyForecasts(BaseModel):
         """Returns the id of the most active user"""
         return self.user_forecast_counts(lf).select("user_id").limit(1).collect().item()
 
+    def layout(self) -> ForecastLayout:
+        """Per-user/per-IFP physical layouts of this dataset (written on first use)."""
+        if self.version is None:
+            msg = "Forecast layouts need a versioned dataset (use SurveyForecasts.load)"
+            raise ValueError(msg)
+        layout = ForecastLayout(FORECAST_LAYOUT_DIR / self.version)
+        if not layout.exists():
+            layout.write(decode(self.lf.collect()))
+        return layout
+
+    def forecasts_for(
+        self,
+        *,
+        user_ids: Collection[str] | None = None,
+        ifp_ids: Collection[str] | None = None,
+    ) -> pl.LazyFrame:
+        """Raw forecasts of the given users and/or IFPs.
+
+        Reads the user-partitioned layout when `user_ids` is given, otherwise the
+        IFP-sorted layout, so only the relevant partition/row groups are scanned.
+        """
+        predicate = _entity_predicate(user_ids=user_ids, ifp_ids=ifp_ids)
+        if self.version is None or (user_ids is None and ifp_ids is None):
+            return self.lf.filter(predicate)
+        layout = self.layout()
+        lf = (
+            layout.scan_users(user_ids) if user_ids is not None else layout.scan_ifps(ifp_ids)  # pyright: ignore[reportArgumentType]
+        )
+        return self._match_encoding(lf.filter(predicate))
+
     def baselines(self, lf: pl.LazyFrame | None = None) -> pl.LazyFrame:
         """Calculate baseline forecasts (users' earliest observed forecasts).
 
@@ -138,61 +291,113 @@ class SurveyForecasts(BaseModel):
             user's first forecast on a question. In practice, some users appear to have only
             UPDATE/AFFIRM/WITHDRAW rows (no `NEW` rows). To avoid silently dropping those
             users, we define a user's baseline as their earliest observed forecast per
-            (`ifp_id`, `user_id`, `answer_option`) after sorting by available time fields.
+            (`ifp_id`, `user_id`, `answer_option`), ordered by the available time fields.
+            The earliest row is found per group (`earliest_rows`) rather than by sorting.
+
+            For this dataset's own data, baselines are served from the persisted
+            `baseline_store()`, which is only updated for new/changed source data.
         """
-        lf = self.filter_studied(lf)
+        return self.baselines_for(lf=lf)
+
+    def baselines_for(
+        self,
+        *,
+        user_ids: Collection[str] | None = None,
+        ifp_ids: Collection[str] | None = None,
+        lf: pl.LazyFrame | None = None,
+    ) -> pl.LazyFrame:
+        """`baselines()` restricted to the given users and/or IFPs.
+
+        The entity filter is applied to the stored baselines (or to the studied forecasts,
+        before aggregation), so per-user/per-IFP queries never touch other entities.
+        """
+        predicate = _entity_predicate(user_ids=user_ids, ifp_ids=ifp_ids)
+        if (lf is None or self._is_own(lf)) and self.version is not None:
+            store = self.baseline_store()
+            return self._match_encoding(store.baselines(self.years).filter(predicate))
+        return self._earliest_baselines(self.filter_studied(lf).filter(predicate))
 
-        cols = lf.collect_schema().names()
-        required = {"ifp_id", "user_id", "answer_option", "value"}
-        if missing := required - set(cols):
-            msg = f"Missing required columns: {sorted(missing)}"
-            raise ValueError(msg)
+    @staticmethod
+    def _earliest_baselines(studied: pl.LazyFrame) -> pl.LazyFrame:
+        cols = studied.collect_schema().names()
+        _check_required(cols)
 
         # Prefer high-resolution ordering if available
-        order_by = [col for col in ["timestamp", "fcast_date", "forecast_id"] if col in cols]
-        base = lf.select(["ifp_id", "user_id", "answer_option", "value", *order_by])
-
-        if order_by:
-            base = base.sort(order_by)
+        order_by = [col for col in BASELINE_ORDER_BY if col in cols]
+        values = [col for col in ["value", "timestamp", "fcast_date"] if col in cols]
 
-        aggs = [
-            pl.col(col).first().alias(f"baseline_{col}")
-            for col in ["value", "timestamp", "fcast_date"]
-            if col in cols
-        ]
-
-        return base.group_by(["ifp_id", "user_id", "answer_option"]).agg(aggs)
+        return earliest_rows(
+            studied,
+            by=["ifp_id", "user_id", "answer_option"],
+            columns=values,
+            order_by=order_by,
+        ).rename({col: f"baseline_{col}" for col in values})
 
     def baseline_p_a(self, lf: pl.LazyFrame | None = None) -> pl.LazyFrame:
         """Baseline per (ifp_id, user_id) as p(answer_option="a") for binary questions.
 
         Since both "a" and "b" are always recorded for binary questions, we can simply
         filter to `answer_option == "a"` and take the earliest observed row per
-        (`ifp_id`, `user_id`) (after sorting by available time fields).
+        (`ifp_id`, `user_id`) (ordered by available time fields).
         """
-        lf = self.filter_studied(lf)
-
-        cols = lf.collect_schema().names()
-        required = {"ifp_id", "user_id", "answer_option", "value"}
-        if missing := required - set(cols):
-            msg = f"Missing required columns: {sorted(missing)}"
-            raise ValueError(msg)
-
-        order_by = [col for col in ["timestamp", "fcast_date", "forecast_id"] if col in cols]
-        base = lf.filter(pl.col("answer_option") == "a").select(
-            ["ifp_id", "user_id", "value", *order_by]
-        )
-        if order_by:
-            base = base.sort(order_by)
-
+        return self.baseline_p_a_for(lf=lf)
+
+    def baseline_p_a_for(
+        self,
+        *,
+        user_ids: Collection[str] | None = None,
+        ifp_ids: Collection[str] | None = None,
+        lf: pl.LazyFrame | None = None,
+    ) -> pl.LazyFrame:
+        """`baseline_p_a()` restricted to the given users and/or IFPs (filtered first)."""
+        predicate = _entity_predicate(user_ids=user_ids, ifp_ids=ifp_ids)
+        if (lf is None or self._is_own(lf)) and self.version is not None:
+            store = self.baseline_store()
+            return self._match_encoding(store.baseline_p_a(self.years).filter(predicate))
+
+        studied = self.filter_studied(lf).filter(predicate)
+        cols = studied.collect_schema().names()
+        _check_required(cols)
+
+        order_by = [col for col in BASELINE_ORDER_BY if col in cols]
         return (
-            base.group_by(["ifp_id", "user_id"])
-            .agg(pl.col("value").first().alias("baseline_p_a"))
+            earliest_rows(
+                studied.filter(pl.col("answer_option") == "a"),
+                by=["ifp_id", "user_id"],
+                columns=["value"],
+                order_by=order_by,
+            )
+            .rename({"value": "baseline_p_a"})
             .select(["user_id", "ifp_id", "baseline_p_a"])
         )
 
+    def baseline_matrix(self) -> BaselineMatrix:
+        """Sparse users x IFPs matrix of `baseline_p_a()`, persisted and opened memory-mapped.
+
+        Saved once per dataset version and baseline store state (so batches appended with
+        `BaselineStore.ingest` give a new matrix); other processes can `BaselineMatrix.open`
+        the same directory (`baseline_matrix_path()`) without copying the arrays.
+        """
+        if self.version is None:
+            return BaselineMatrix.from_baseline_p_a(self.baseline_p_a().collect())
+        path = self.baseline_matrix_path()
+        if not BaselineMatrix.exists(path):
+            BaselineMatrix.from_baseline_p_a(self.baseline_p_a().collect()).save(path)
+        return BaselineMatrix.open(path)
+
+    def baseline_matrix_path(self) -> Path:
+        """Directory of the persisted `baseline_matrix()` of the current stored baselines."""
+        state = self.baseline_store().state(self.years)
+        return BASELINE_MATRIX_DIR / f"{self.version}-{state[:16]}"
+
+    def user_baseline_counts(self) -> pl.LazyFrame:
+        """Number of baseline rows per user, ascending."""
+        return self.baselines().group_by("user_id").len().sort("len")
+
     def agg_baselines(self, lf: pl.LazyFrame | None = None) -> pl.LazyFrame:
         """Aggregate baseline forecasts per IFP/option across users."""
+        if (lf is None or self._is_own(lf)) and self.version is not None:
+            return self._match_encoding(self.baseline_store().agg_baselines(self.years))
         return (
             self.baselines(lf)
             .group_by(["ifp_id", "answer_option"])
@@ -0,0 +1,280 @@
+# Batch rendering of per-user timelines and per-IFP baseline histograms
+#
+# Shared inputs (all baselines, IFP metadata) are built once in the parent and split per
+# entity; workers only build and save charts. Finished entities are appended to a ledger
+# next to the figures, so an interrupted batch resumes where it stopped.
+# %%
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+import time
+from typing import TYPE_CHECKING, Any
+
+import polars as pl
+
+from coco.config import FIGURES_DIR, logger
+from coco.gjp.models.encoding import decode
+from coco.gjp.models.ifp import IFPs
+from coco.gjp.models.process_pool import pool_size, run_tasks
+from coco.gjp.models.survey_fcasts import SurveyForecasts
+from coco.gjp.viz.plot_forecasts_hist import (
+    forecast_priors_hist_chart,
+    forecast_priors_hist_title,
+    save_forecast_priors_hist_chart,
+)
+from coco.gjp.viz.plot_user_timeline import (
+    save_user_timeline_chart,
+    user_timeline_chart,
+    user_timeline_frame,
+    user_timeline_title,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from coco.gjp.viz.export import DataFormat
+
+USER_TIMELINE_DIR = FIGURES_DIR / "gjp" / "user_timeline"
+FORECAST_PRIORS_HIST_DIR = FIGURES_DIR / "gjp" / "forecast_priors_hist"
+
+# IFP metadata, set once per worker process by `_init_worker`
+_IFPS_DF: pl.DataFrame | None = None
+
+
+def _init_worker(ifps_df: pl.DataFrame) -> None:
+    global _IFPS_DF  # noqa: PLW0603
+    _IFPS_DF = ifps_df
+
+
+def _worker_ifps() -> pl.DataFrame:
+    if _IFPS_DF is None:
+        msg = "Batch worker used before `_init_worker`"
+        raise RuntimeError(msg)
+    return _IFPS_DF
+
+
+def _render_user_timeline(
+    user_id: str, baselines_df: pl.DataFrame, *, out_root: Path, data_format: DataFormat | None
+) -> str:
+    timeline_df = user_timeline_frame(baselines_df, _worker_ifps().lazy())
+    if timeline_df.is_empty():
+        return "empty"
+    chart = user_timeline_chart(timeline_df, title=user_timeline_title(user_id))
+    rendered = save_user_timeline_chart(
+        chart, timeline_dir=out_root / user_id, data_format=data_format
+    )
+    return "rendered" if rendered else "current"
+
+
+def _render_forecast_priors_hist(
+    ifp_id: str,
+    baselines_df: pl.DataFrame,
+    *,
+    out_root: Path,
+    maxbins: int,
+    data_format: DataFormat | None,
+) -> str:
+    meta = _worker_ifps().filter(pl.col("ifp_id") == ifp_id)
+    short_title = None if meta.is_empty() else meta.item(0, "short_title")
+    chart = forecast_priors_hist_chart(
+        baselines_df, title=forecast_priors_hist_title(ifp_id, short_title), maxbins=maxbins
+    )
+    rendered = save_forecast_priors_hist_chart(
+        chart, hist_dir=out_root / ifp_id, data_format=data_format
+    )
+    return "rendered" if rendered else "current"
+
+
+class _Ledger:
+    """Append-only JSONL of finished entities for one batch configuration."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def done(self) -> set[str]:
+        if not self.path.exists():
+            return set()
+        lines = self.path.read_text().splitlines()
+        # A torn last line (interrupted write) is simply redone
+        return {json.loads(line)["entity"] for line in lines if line.endswith("}")}
+
+    def record(self, row: dict[str, Any]) -> None:
+        with self.path.open("a") as f:
+            f.write(json.dumps(row) + "\n")
+
+
+def _ledger(out_root: Path, kind: str, config: dict[str, object]) -> _Ledger:
+    key = hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode())
+    return _Ledger(out_root / f".batch-{kind}-{key.hexdigest()[:16]}.jsonl")
+
+
+def _shared_inputs(years: tuple[int, ...] | None) -> tuple[SurveyForecasts, pl.DataFrame]:
+    sf = SurveyForecasts.load(years=years)
+    return sf, decode(sf.baselines()).collect()
+
+
+def _timed(
+    render: Callable[..., str],
+    entity: str,
+    df: pl.DataFrame,
+    render_kwargs: dict[str, object],
+) -> tuple[str, float]:
+    t0 = time.perf_counter()
+    status = render(entity, df, **render_kwargs)
+    return status, time.perf_counter() - t0
+
+
+def _run_batch(  # noqa: PLR0913
+    kind: str,
+    render: Callable[..., str],
+    groups: dict[str, pl.DataFrame],
+    *,
+    ifps_df: pl.DataFrame,
+    ledger: _Ledger | None,
+    n_jobs: int | None,
+    render_kwargs: dict[str, object],
+) -> pl.DataFrame:
+    """Render every group (skipping those already in `ledger`) and summarize."""
+    done = ledger.done() if ledger is not None else set()
+    todo = {entity: df for entity, df in groups.items() if entity not in done}
+    logger.info(
+        "Batch {}: {} entities ({} already done)",
+        kind,
+        len(todo),
+        len(groups) - len(todo),
+    )
+
+    rows = []
+    t_start = time.perf_counter()
+
+    def finish(entity: str, status: str, seconds: float) -> None:
+        row = {"entity": entity, "status": status, "seconds": seconds}
+        rows.append(row)
+        if ledger is not None:
+            ledger.record(row)
+
+    entities = list(todo)
+    for i, result in run_tasks(
+        _timed,
+        [(render, entity, todo[entity], render_kwargs) for entity in entities],
+        n_jobs=pool_size(n_jobs, len(entities)),
+        initializer=_init_worker,
+        initargs=(ifps_df,),
+    ):
+        finish(entities[i], *result)
+
+    elapsed = time.perf_counter() - t_start
+    logger.info(
+        "Batch {}: {} entities in {:.1f}s ({:.1f}/s)",
+        kind,
+        len(rows),
+        elapsed,
+        len(rows) / max(elapsed, 1e-9),
+    )
+    schema = {"entity": pl.String, "status": pl.String, "seconds": pl.Float64}
+    return pl.DataFrame(rows, schema=schema)
+
+
+def render_user_timelines(  # noqa: PLR0913
+    user_ids: list[str] | None = None,
+    *,
+    years: tuple[int, ...] | None = None,
+    out_root: str | Path = USER_TIMELINE_DIR,
+    n_jobs: int | None = None,
+    resume: bool = True,
+    data_format: DataFormat | None = None,
+) -> pl.DataFrame:
+    """Render `user_timeline` figures for `user_ids` (default: every user with a baseline).
+
+    Baselines and IFP metadata are loaded once; charts are built and saved across `n_jobs`
+    processes into `out_root / user_id`. With `resume`, users recorded as finished for the
+    same dataset version and options are skipped (and unchanged charts are never
+    re-rendered, see `save_chart`).
+
+    Returns:
+        One row per processed user: `entity`, `status` (`rendered`, `current` or `empty`:
+        no closed IFPs), `seconds`.
+    """
+    out_root = Path(out_root)
+    out_root.mkdir(parents=True, exist_ok=True)
+    sf, baselines_df = _shared_inputs(years)
+    if user_ids is not None:
+        baselines_df = baselines_df.filter(pl.col("user_id").is_in(user_ids))
+    groups = {
+        key[0]: df
+        for key, df in baselines_df.sort("user_id").partition_by("user_id", as_dict=True).items()
+    }
+    ledger = (
+        _ledger(out_root, "user_timeline", {"version": sf.version, "data_format": data_format})
+        if resume
+        else None
+    )
+    return _run_batch(
+        "user_timeline",
+        _render_user_timeline,
+        groups,
+        ifps_df=IFPs.load().lf.collect(),
+        ledger=ledger,
+        n_jobs=n_jobs,
+        render_kwargs={"out_root": out_root, "data_format": data_format},
+    )
+
+
+def render_forecast_priors_hists(  # noqa: PLR0913
+    ifp_ids: list[str] | None = None,
+    *,
+    years: tuple[int, ...] | None = None,
+    maxbins: int = 20,
+    out_root: str | Path = FORECAST_PRIORS_HIST_DIR,
+    n_jobs: int | None = None,
+    resume: bool = True,
+    data_format: DataFormat | None = None,
+) -> pl.DataFrame:
+    """Render `forecast_priors_hist` figures for `ifp_ids` (default: every studied IFP).
+
+    Same batching and resume behaviour as `render_user_timelines`, one figure per IFP in
+    `out_root / ifp_id`.
+
+    Returns:
+        One row per processed IFP: `entity`, `status` (`rendered` or `current`), `seconds`.
+    """
+    out_root = Path(out_root)
+    out_root.mkdir(parents=True, exist_ok=True)
+    sf, baselines_df = _shared_inputs(years)
+    if ifp_ids is not None:
+        baselines_df = baselines_df.filter(pl.col("ifp_id").is_in(ifp_ids))
+    groups = {
+        key[0]: df
+        for key, df in baselines_df.sort("ifp_id").partition_by("ifp_id", as_dict=True).items()
+    }
+    ledger = (
+        _ledger(
+            out_root,
+            "forecast_priors_hist",
+            {"version": sf.version, "maxbins": maxbins, "data_format": data_format},
+        )
+        if resume
+        else None
+    )
+    return _run_batch(
+        "forecast_priors_hist",
+        _render_forecast_priors_hist,
+        groups,
+        ifps_df=IFPs.load().lf.select("ifp_id", "short_title").collect(),
+        ledger=ledger,
+        n_jobs=n_jobs,
+        render_kwargs={"out_root": out_root, "maxbins": maxbins, "data_format": data_format},
+    )
+
+
+# %%
+if __name__ == "__main__":
+    logger.info("== Batch: per-IFP baseline histograms")
+    render_forecast_priors_hists()
+
+    logger.info("== Batch: per-user timelines")
+    render_user_timelines()
+
+# %%
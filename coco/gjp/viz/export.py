@@ -0,0 +1,288 @@
+# Chart export helpers: Polars-side binning and Vega-Lite specs with external data
+#
+# Altair inlines every row of a chart's data into the spec (`datasets`). `save_chart` can
+# instead move large datasets to CSV / Arrow sidecar files next to the `.vl.json` and
+# reference them by relative URL, which keeps the spec small for browsers and tooling.
+#
+# Renders are content-addressed: `{stem}.render.json` records the hash of the normalized
+# spec (data included) and the render timings, and an unchanged chart is not re-rendered.
+# %%
+
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import json
+import math
+from pathlib import Path
+import re
+import time
+from typing import Any, Literal
+
+import altair as alt
+import polars as pl
+
+DataFormat = Literal["csv", "arrow"]
+
+# Datasets with fewer rows stay inline (a sidecar file is not worth a request)
+DEFAULT_SIDECAR_MIN_ROWS = 500
+_ISO_DATETIME = r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}"
+# Bump to invalidate every render manifest (e.g. after changing how outputs are written)
+RENDER_CACHE_VERSION = 2
+# Session-counter names Altair/Vega-Lite may assign (`view_3`, `param_12`)
+_COUNTER_NAMES = re.compile(r"\b(view|param)_\d+\b")
+
+
+def nice_bins(lo: float, hi: float, maxbins: int) -> tuple[float, float, float]:
+    """Bins of Vega's `bin` transform over the extent [lo, hi] (with `nice`).
+
+    The step is 1, 2 or 5 x 10^n, the smallest giving at most `maxbins` bins, and the
+    extent is widened to multiples of it.
+
+    Returns:
+        `start`, `stop`, `step`.
+    """
+    span = (hi - lo) or abs(lo) or 1.0
+    # Math.round in JS rounds halves up
+    level = math.floor(math.log10(span) + 0.5) - math.ceil(math.log10(maxbins))
+    step = 10.0**level
+    while math.ceil(span / step) > maxbins:
+        step *= 10
+    for div in (5, 2):
+        if span / (step / div) <= maxbins:
+            step /= div
+    precision = 0 if step >= 1 else int(-math.log10(step)) + 1
+    start = math.floor(lo / step + 10.0 ** (-precision - 1)) * step
+    if lo < start:
+        start -= step
+    return start, math.ceil(hi / step) * step, step
+
+
+def bin_counts(df: pl.DataFrame, *, value: str, by: list[str], maxbins: int = 20) -> pl.DataFrame:
+    """Histogram of column `value` per `by` group, computed in Polars.
+
+    Bins are those of Vega-Lite's `bin=alt.Bin(maxbins=maxbins)` (see `nice_bins`): a nice
+    step over the extent of `value` in the whole frame, shared by every group, so a
+    narrow-range column gets finer bins. They are `[bin_start, bin_end)`, the maximum
+    falling in the last bin; only non-empty bins are returned.
+
+    Returns:
+        `by` columns + `bin_start`, `bin_end`, `n`.
+    """
+    df = df.drop_nulls(value)
+    lo, hi = df.select(pl.col(value).min(), pl.col(value).max().alias("max")).row(0)
+    start, stop, step = (0.0, 1.0, 1.0) if lo is None else nice_bins(lo, hi, maxbins)
+    n_bins = max(1, round((stop - start) / step))
+    # Rounded before the floor so values on a bin edge (0.29 / 0.01 = 28.999...) are not
+    # put one bin low
+    bin_idx = ((pl.col(value) - start) / step).round(9).floor().cast(pl.Int64).clip(0, n_bins - 1)
+    # Edges are multiples of `step`, exact at its number of decimals
+    decimals = max(0, -math.floor(math.log10(step)))
+    return (
+        df.group_by([*by, bin_idx.alias("bin_idx")])
+        .agg(pl.len().alias("n"))
+        .with_columns(
+            (start + pl.col("bin_idx") * step).round(decimals).alias("bin_start"),
+            (start + (pl.col("bin_idx") + 1) * step).round(decimals).alias("bin_end"),
+        )
+        .drop("bin_idx")
+        .sort([*by, "bin_start"])
+    )
+
+
+def _csv_parse(df: pl.DataFrame) -> dict[str, str]:
+    """Vega `format.parse` hints so CSV columns are not read back as strings."""
+    parse = {}
+    for name, dtype in df.schema.items():
+        if dtype.is_numeric():
+            parse[name] = "number"
+        elif dtype == pl.Boolean:
+            parse[name] = "boolean"
+        elif dtype == pl.String and df[name].drop_nulls().str.contains(_ISO_DATETIME).all():
+            parse[name] = "date"
+    return parse
+
+
+def _write_sidecar(
+    values: list[dict[str, Any]], path: Path, data_format: DataFormat
+) -> dict[str, Any]:
+    """Write dataset rows to `path` and return the Vega-Lite `format` for reading it."""
+    df = pl.DataFrame(values, infer_schema_length=None)
+    if data_format == "arrow":
+        df.write_ipc(path, compression="uncompressed")
+        return {"type": "arrow"}
+    df.write_csv(path)
+    return {"type": "csv", "parse": _csv_parse(df)}
+
+
+def _replace_named_data(node: Any, urls: dict[str, dict[str, Any]]) -> Any:  # noqa: ANN401
+    """Swap `{"name": <dataset>}` data references for their URL references."""
+    if isinstance(node, dict):
+        if set(node) == {"name"} and node["name"] in urls:
+            return urls[node["name"]]
+        return {k: _replace_named_data(v, urls) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_replace_named_data(v, urls) for v in node]
+    return node
+
+
+def externalize_datasets(
+    spec: dict[str, Any],
+    *,
+    out_dir: Path,
+    stem: str,
+    data_format: DataFormat = "csv",
+    min_rows: int = DEFAULT_SIDECAR_MIN_ROWS,
+) -> dict[str, Any]:
+    """Move inline datasets with at least `min_rows` rows to `{stem}.data/` sidecar files.
+
+    Returns:
+        A copy of `spec` whose references to the moved datasets are relative URLs.
+    """
+    datasets = dict(spec.get("datasets", {}))
+    urls = {}
+    for name, values in list(datasets.items()):
+        if len(values) < min_rows:
+            continue
+        data_dir = out_dir / f"{stem}.data"
+        data_dir.mkdir(parents=True, exist_ok=True)
+        filename = f"{name}.{data_format}"
+        fmt = _write_sidecar(values, data_dir / filename, data_format)
+        urls[name] = {"url": f"{stem}.data/{filename}", "format": fmt}
+        del datasets[name]
+
+    spec = _replace_named_data({k: v for k, v in spec.items() if k != "datasets"}, urls)
+    if datasets:
+        spec["datasets"] = datasets
+    return spec
+
+
+def spec_key(spec: dict[str, Any], **options: Any) -> str:  # noqa: ANN401
+    """Content hash of a chart spec (inline data included) and export `options`.
+
+    Keys are serialized sorted and auto-numbered view/param names are renumbered by first
+    appearance, so the same chart built in another session hashes the same.
+    """
+    text = json.dumps({"spec": spec, "options": options}, sort_keys=True, default=str)
+    seen: dict[str, str] = {}
+    text = _COUNTER_NAMES.sub(
+        lambda m: seen.setdefault(m.group(0), f"{m.group(1)}_{len(seen)}"), text
+    )
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _render_manifest_path(out_dir: Path, stem: str) -> Path:
+    return out_dir / f"{stem}.render.json"
+
+
+def _data_urls(node: Any) -> list[str]:  # noqa: ANN401
+    """Relative URLs of the external datasets referenced anywhere in a spec."""
+    if isinstance(node, dict):
+        urls = [node["url"]] if isinstance(node.get("url"), str) else []
+        return urls + [url for v in node.values() for url in _data_urls(v)]
+    if isinstance(node, list):
+        return [url for v in node for url in _data_urls(v)]
+    return []
+
+
+def _is_current(out_dir: Path, stem: str, key: str, outputs: list[str]) -> bool:
+    """Whether the manifest holds `key` and every output and sidecar file it lists exists."""
+    path = _render_manifest_path(out_dir, stem)
+    if not path.exists():
+        return False
+    manifest = json.loads(path.read_text())
+    return (
+        manifest.get("version") == RENDER_CACHE_VERSION
+        and manifest.get("key") == key
+        and all((out_dir / name).exists() for name in outputs)
+        and all((out_dir / name).exists() for name in manifest.get("sidecars", []))
+    )
+
+
+def save_chart(  # noqa: PLR0913
+    chart: alt.TopLevelMixin,
+    *,
+    out_dir: str | Path,
+    stem: str,
+    data_format: DataFormat | None = None,
+    sidecar_min_rows: int = DEFAULT_SIDECAR_MIN_ROWS,
+    pdf: bool = True,
+    force: bool = False,
+) -> bool:
+    """Save `{stem}.vl.json` (+ `{stem}.pdf`) to `out_dir` unless they are already current.
+
+    With `data_format`, large datasets are written as sidecar files (see
+    `externalize_datasets`) instead of being inlined in the JSON spec. The PDF is always
+    rendered from the in-memory chart. Outputs are skipped when `{stem}.render.json` holds
+    the same `spec_key` (and the files and the data sidecars it lists exist), unless `force`.
+
+    Returns:
+        Whether anything was (re-)rendered.
+    """
+    out_dir = Path(out_dir)
+    # `chart.to_dict()` enforces Altair's max row limit by default; lift it for exports.
+    t0 = time.perf_counter()
+    with alt.data_transformers.enable("default", max_rows=None):
+        spec = chart.to_dict()
+    outputs = [f"{stem}.vl.json", *([f"{stem}.pdf"] if pdf else [])]
+    key = spec_key(
+        spec, data_format=data_format, sidecar_min_rows=sidecar_min_rows, outputs=outputs
+    )
+    if not force and _is_current(out_dir, stem, key, outputs):
+        return False
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if data_format is not None:
+        spec = externalize_datasets(
+            spec, out_dir=out_dir, stem=stem, data_format=data_format, min_rows=sidecar_min_rows
+        )
+    (out_dir / f"{stem}.vl.json").write_text(json.dumps(spec, indent=2))
+    timings = {"spec_s": time.perf_counter() - t0}
+    if pdf:
+        t0 = time.perf_counter()
+        chart.save(out_dir / f"{stem}.pdf")
+        timings["pdf_s"] = time.perf_counter() - t0
+
+    # Written last: a crash mid-render leaves a stale key and forces a re-render
+    _render_manifest_path(out_dir, stem).write_text(
+        json.dumps(
+            {
+                "version": RENDER_CACHE_VERSION,
+                "key": key,
+                "outputs": outputs,
+                "sidecars": sorted({u for u in _data_urls(spec) if u.startswith(f"{stem}.data/")}),
+                "timings": timings,
+                "rendered_at": dt.datetime.now(dt.UTC).isoformat(),
+            },
+            indent=2,
+        )
+    )
+    return True
+
+
+def render_timings(root: str | Path) -> pl.DataFrame:
+    """Recorded render timings of every figure under `root`, slowest PDF first.
+
+    Returns:
+        `out_dir`, `stem`, `spec_s`, `pdf_s`, `rendered_at`.
+    """
+    rows = []
+    for path in Path(root).rglob("*.render.json"):
+        manifest = json.loads(path.read_text())
+        rows.append(
+            {
+                "out_dir": str(path.parent),
+                "stem": path.name.removesuffix(".render.json"),
+                "spec_s": manifest["timings"].get("spec_s"),
+                "pdf_s": manifest["timings"].get("pdf_s"),
+                "rendered_at": manifest["rendered_at"],
+            }
+        )
+    schema = {
+        "out_dir": pl.String,
+        "stem": pl.String,
+        "spec_s": pl.Float64,
+        "pdf_s": pl.Float64,
+        "rendered_at": pl.String,
+    }
+    return pl.DataFrame(rows, schema=schema).sort("pdf_s", descending=True, nulls_last=True)
@@ -1,15 +1,78 @@
 # %%
 from __future__ import annotations
 
-import json
-from pathlib import Path
+from typing import TYPE_CHECKING
 
 import altair as alt
 import polars as pl
 
 from coco.config import FIGURES_DIR, logger
+from coco.gjp.models.encoding import decode
 from coco.gjp.models.ifp import IFPs
 from coco.gjp.models.survey_fcasts import SurveyForecasts
+from coco.gjp.viz.export import DataFormat, bin_counts, save_chart
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def forecast_priors_hist_title(ifp_id: str, short_title: str | None) -> str:
+    """Default histogram title."""
+    if short_title is None:
+        return f"{ifp_id} — Survey baselines"
+    return f"{ifp_id} — {short_title} (survey baselines)"
+
+
+def forecast_priors_hist_chart(
+    baselines_df: pl.DataFrame,
+    *,
+    title: str,
+    maxbins: int = 20,
+    width: int = 220,
+    height: int = 180,
+) -> alt.FacetChart:
+    """Per-option histograms of one IFP's (decoded) `SurveyForecasts.baselines()` rows."""
+    zoom = alt.selection_interval(bind="scales")
+
+    # Binned in Polars so the chart only carries one row per (option, bin)
+    hist_df = bin_counts(
+        baselines_df, value="baseline_value", by=["answer_option"], maxbins=maxbins
+    )
+    hist = (
+        alt.Chart(hist_df)
+        .mark_bar()
+        .encode(
+            x=alt.X(
+                "bin_start:Q",
+                title="Baseline probability",
+                scale=alt.Scale(domain=[0, 1]),
+            ),
+            x2="bin_end:Q",
+            y=alt.Y("n:Q", title="Users"),
+            color=alt.Color("answer_option:N", legend=None),
+            tooltip=[
+                alt.Tooltip("answer_option:N", title="Option"),
+                alt.Tooltip("n:Q", title="Users"),
+                alt.Tooltip("bin_start:Q", title="Bin start", format=".2f"),
+                alt.Tooltip("bin_end:Q", title="Bin end", format=".2f"),
+            ],
+        )
+        .properties(width=width, height=height)
+        .add_params(zoom)
+    )
+
+    return (
+        hist.facet(
+            column=alt.Column(
+                "answer_option:N",
+                title=None,
+                header=alt.Header(labelAngle=0, labelOrient="bottom"),
+            )
+        )
+        .resolve_scale(x="shared", y="shared")
+        .properties(title=title)
+        .configure_view(strokeWidth=0)
+    )
 
 
 def plot_forecast_priors_hist(  # noqa: PLR0913
@@ -23,8 +86,10 @@ def plot_forecast_priors_hist(  # noqa: PLR0913
 ) -> alt.FacetChart:
     """Histogram of user baselines (earliest observed forecasts), faceted by answer option.
 
-    Uses `SurveyForecasts.baselines()` to extract each user's baseline forecast on a question,
-    then displays side-by-side histograms (one per `answer_option`).
+    Uses `SurveyForecasts.baselines_for()` to extract each user's baseline forecast on a question,
+    then displays side-by-side histograms (one per `answer_option`). Counts are binned
+    in Polars (`bin_counts`, the bins Vega-Lite would pick over the data extent with
+    `maxbins`), so the spec holds bins rather than one row per user.
 
     Example (an IFP with three options):
 
@@ -63,7 +128,7 @@ def plot_forecast_priors_hist(  # noqa: PLR0913
 
     """
     sf = SurveyForecasts.load(years=years)
-    baselines_df = sf.baselines().filter(pl.col("ifp_id") == ifp_id).collect()
+    baselines_df = decode(sf.baselines_for(ifp_ids=[ifp_id]).collect())
     if baselines_df.is_empty():
         msg = f"No baselines found for ifp_id={ifp_id!r}"
         raise ValueError(msg)
@@ -72,57 +137,11 @@ def plot_forecast_priors_hist(  # noqa: PLR0913
         ifp_meta = (
             IFPs.load().lf.filter(pl.col("ifp_id") == ifp_id).select(["short_title"]).collect()
         )
-        if ifp_meta.is_empty():
-            title = f"{ifp_id} — Survey baselines"
-        else:
-            short_title = ifp_meta.item(0, "short_title")
-            title = f"{ifp_id} — {short_title} (survey baselines)"
+        short_title = None if ifp_meta.is_empty() else ifp_meta.item(0, "short_title")
+        title = forecast_priors_hist_title(ifp_id, short_title)
 
-    zoom = alt.selection_interval(bind="scales")
-
-    hist = (
-        alt.Chart(baselines_df)
-        .transform_bin(
-            as_=["bin_start", "bin_end"],
-            field="baseline_value",
-            bin=alt.Bin(maxbins=maxbins),
-        )
-        .transform_aggregate(
-            n="count()",
-            groupby=["answer_option", "bin_start", "bin_end"],
-        )
-        .mark_bar()
-        .encode(
-            x=alt.X(
-                "bin_start:Q",
-                title="Baseline probability",
-                scale=alt.Scale(domain=[0, 1]),
-            ),
-            x2="bin_end:Q",
-            y=alt.Y("n:Q", title="Users"),
-            color=alt.Color("answer_option:N", legend=None),
-            tooltip=[
-                alt.Tooltip("answer_option:N", title="Option"),
-                alt.Tooltip("n:Q", title="Users"),
-                alt.Tooltip("bin_start:Q", title="Bin start", format=".2f"),
-                alt.Tooltip("bin_end:Q", title="Bin end", format=".2f"),
-            ],
-        )
-        .properties(width=width, height=height)
-        .add_params(zoom)
-    )
-
-    chart = (
-        hist.facet(
-            column=alt.Column(
-                "answer_option:N",
-                title=None,
-                header=alt.Header(labelAngle=0, labelOrient="bottom"),
-            )
-        )
-        .resolve_scale(x="shared", y="shared")
-        .properties(title=title)
-        .configure_view(strokeWidth=0)
+    chart = forecast_priors_hist_chart(
+        baselines_df, title=title, maxbins=maxbins, width=width, height=height
     )
 
     logger.info(
@@ -139,12 +158,11 @@ def save_forecast_priors_hist_chart(
     *,
     hist_dir: str | Path,
     stem: str = "forecast_priors_hist",
-) -> None:
-    """Save chart JSON spec + PDF to `hist_dir`."""
-    hist_dir = Path(hist_dir)
-    hist_dir.mkdir(parents=True, exist_ok=True)
-    (hist_dir / f"{stem}.vl.json").write_text(json.dumps(chart.to_dict(), indent=2))
-    chart.save(hist_dir / f"{stem}.pdf")
+    data_format: DataFormat | None = None,
+    force: bool = False,
+) -> bool:
+    """Save chart JSON spec + PDF to `hist_dir` (skipped if current; see `save_chart`)."""
+    return save_chart(chart, out_dir=hist_dir, stem=stem, data_format=data_format, force=force)
 
 
 def main(
@@ -5,8 +5,13 @@ import altair as alt
 import polars as pl
 
 from coco.config import FIGURES_DIR, logger
+from coco.gjp.models.baseline_matrix import BaselineMatrix
+from coco.gjp.models.corr_resampling import resample_corr
+from coco.gjp.models.encoding import decode
 from coco.gjp.models.ifp import IFPs
+from coco.gjp.models.ifp_correlations import overlap_corr, pairwise_corr, topk_corr
 from coco.gjp.models.survey_fcasts import SurveyForecasts
+from coco.gjp.viz.export import DataFormat, save_chart
 
 # %%
 
@@ -40,46 +45,9 @@ def _select_ifps(
     return s.head(first_k).to_list()
 
 
-def _pivot_baseline_p_a(
-    baseline_p_a_df: pl.DataFrame,
-    *,
-    first_k: int | None,
-    sort_by: str,
-    min_n: int = 2,
-    min_unique: int = 2,
-) -> tuple[list[str], pl.DataFrame]:
-    """Select IFPs then pivot baseline probabilities into wide format."""
-    ifp_cols = _select_ifps(
-        baseline_p_a_df,
-        first_k=first_k,
-        sort_by=sort_by,
-        min_n=min_n,
-        min_unique=min_unique,
-    )
-    if len(ifp_cols) < 2:  # noqa: PLR2004
-        msg = f"Need at least 2 IFPs with usable baselines; got {len(ifp_cols)}."
-        raise ValueError(msg)
-
-    pivot_df = (
-        baseline_p_a_df.filter(pl.col("ifp_id").is_in(ifp_cols))
-        .pivot(
-            values="baseline_p_a",
-            index="user_id",
-            on="ifp_id",
-            aggregate_function="first",
-        )
-        .sort("user_id")
-    )
-    if pivot_df.is_empty():
-        msg = "No baseline forecasts available to compute correlations."
-        raise ValueError(msg)
-
-    return ifp_cols, pivot_df
-
-
-def _corr_long_with_r2(pivot_df: pl.DataFrame, ifp_cols: list[str]) -> pl.DataFrame:
-    """Compute long-form correlations with corr^2 attached as r2."""
-    return _corr_long(pivot_df, ifp_cols).with_columns((pl.col("corr") ** 2).alias("r2"))
+def _corr_long_with_r2(matrix: BaselineMatrix, ifp_cols: list[str]) -> pl.DataFrame:
+    """Compute long-form correlations (+ overlap counts `n`) with corr^2 attached as r2."""
+    return pairwise_corr(matrix, ifp_cols).with_columns((pl.col("corr") ** 2).alias("r2"))
 
 
 def _axis_order_by_r2(corr_long: pl.DataFrame) -> list[str]:
@@ -95,28 +63,9 @@ def _axis_order_by_r2(corr_long: pl.DataFrame) -> list[str]:
     )
 
 
-def _corr_long(pivot_df: pl.DataFrame, ifp_cols: list[str]) -> pl.DataFrame:
-    """Compute pairwise correlations into long-form (ifp_id_x, ifp_id_y, corr)."""
-    corr_exprs: list[pl.Expr] = [
-        pl.corr(x, y).alias(f"{x}::{y}") for x in ifp_cols for y in ifp_cols
-    ]
-    corr_flat = pivot_df.select(corr_exprs)
-    row0 = corr_flat.row(0)
-    return pl.DataFrame(
-        [
-            {
-                "ifp_id_x": name.split("::", 1)[0],
-                "ifp_id_y": name.split("::", 1)[1],
-                "corr": val,
-            }
-            for name, val in zip(corr_flat.columns, row0, strict=True)
-        ]
-    )
-
-
 def _attach_ifp_meta(corr_long: pl.DataFrame, ifps: IFPs) -> pl.DataFrame:
     """Attach IFP short titles for x/y ids."""
-    meta = ifps.filter_studied().select(["ifp_id", "short_title"]).collect()
+    meta = decode(ifps.filter_studied().select(["ifp_id", "short_title"]).collect())
     return corr_long.join(
         meta.rename({"ifp_id": "ifp_id_x", "short_title": "short_title_x"}),
         on="ifp_id_x",
@@ -128,6 +77,28 @@ def _attach_ifp_meta(corr_long: pl.DataFrame, ifps: IFPs) -> pl.DataFrame:
     )
 
 
+def _usable_ifps(
+    baseline_p_a_df: pl.DataFrame,
+    *,
+    first_k: int | None,
+    sort_by: str,
+    min_n: int = 2,
+    min_unique: int = 2,
+) -> tuple[list[str], BaselineMatrix]:
+    """Select IFPs (see `_select_ifps`) and build the sparse baseline matrix."""
+    ifp_cols = _select_ifps(
+        baseline_p_a_df,
+        first_k=first_k,
+        sort_by=sort_by,
+        min_n=min_n,
+        min_unique=min_unique,
+    )
+    if len(ifp_cols) < 2:  # noqa: PLR2004
+        msg = f"Need at least 2 IFPs with usable baselines; got {len(ifp_cols)}."
+        raise ValueError(msg)
+    return ifp_cols, BaselineMatrix.from_baseline_p_a(baseline_p_a_df)
+
+
 def _corr_long_table(  # noqa: PLR0913
     baseline_p_a_df: pl.DataFrame,
     *,
@@ -141,20 +112,45 @@ def _corr_long_table(  # noqa: PLR0913
 
     Notes:
         If `first_k is None`, correlations are computed over *all* usable IFPs
-        (after `min_n`/`min_unique` filtering). This can be expensive for large numbers
-        of IFPs.
+        (after `min_n`/`min_unique` filtering). All pairs are computed at once from
+        sparse matrix products (see `pairwise_corr`), so this stays cheap, but the result
+        has N^2 rows; use `_corr_topk_table` when only the strongest pairs are needed.
     """
-    ifp_cols, pivot_df = _pivot_baseline_p_a(
+    ifp_cols, matrix = _usable_ifps(
         baseline_p_a_df,
         first_k=first_k,
         sort_by=sort_by,
         min_n=min_n,
         min_unique=min_unique,
     )
-    corr_long = _corr_long_with_r2(pivot_df, ifp_cols)
+    corr_long = _corr_long_with_r2(matrix, ifp_cols)
     return ifp_cols, _attach_ifp_meta(corr_long, ifps)
 
 
+def _corr_topk_table(  # noqa: PLR0913
+    baseline_p_a_df: pl.DataFrame,
+    *,
+    ifps: IFPs,
+    first_k: int | None,
+    top_k: int,
+    sort_by: str,
+    min_n: int = 2,
+    min_unique: int = 2,
+) -> pl.DataFrame:
+    """Per-IFP top-`top_k` partners by corr^2 (blocked, memory-bounded) with IFP titles.
+
+    Pairs need at least `min_n` shared users. Off-diagonal only; `rank` is 1..top_k.
+    """
+    ifp_cols, matrix = _usable_ifps(
+        baseline_p_a_df,
+        first_k=first_k,
+        sort_by=sort_by,
+        min_n=min_n,
+        min_unique=min_unique,
+    )
+    return _attach_ifp_meta(topk_corr(matrix, ifp_cols, k=top_k, min_n=min_n), ifps)
+
+
 def make_ifp_corr_matrix(
     sf_lf: pl.LazyFrame,
     *,
@@ -214,6 +210,7 @@ def make_ifp_corr_matrix(
             alt.Tooltip("short_title_y:N", title="Title (col)"),
             alt.Tooltip("corr:Q", title="corr", format=".3f"),
             alt.Tooltip("r2:Q", title="corr^2", format=".3f"),
+            alt.Tooltip("n:Q", title="Shared users"),
         ],
     )
 
@@ -241,7 +238,7 @@ def make_ifp_corr_topk_rows(  # noqa: PLR0913
     sf_lf: pl.LazyFrame,
     *,
     title: str = "Top correlations per IFP (ranked within each row)",
-    n_rows: int = 10,
+    n_rows: int | None = 10,
     top_k: int = 10,
     width: int = 900,
     height: int = 700,
@@ -250,18 +247,16 @@ def make_ifp_corr_topk_rows(  # noqa: PLR0913
 
     The x-axis is rank within each row (1..top_k). Each cell shows the correlation
     squared (rounded) and the matching IFP ID underneath. Rows are sorted by max corr^2.
+    With `n_rows=None`, every usable IFP gets a row (partners are searched among the same
+    IFPs); the correlations are computed in memory-bounded tiles (see `topk_corr`).
     """
     sf = SurveyForecasts.load()
     ifps = IFPs.load()
 
     baseline_p_a_df = sf.baseline_p_a(sf_lf).collect()
 
-    base_corr = (
-        _corr_long_table(baseline_p_a_df, ifps=ifps, first_k=n_rows, sort_by="n")[1]
-        .filter(pl.col("ifp_id_x") != pl.col("ifp_id_y"))
-        .filter(pl.col("corr").is_finite())
-        .with_columns(pl.col("r2").rank("dense", descending=True).over("ifp_id_x").alias("rank"))
-        .filter(pl.col("rank") <= top_k)
+    base_corr = _corr_topk_table(
+        baseline_p_a_df, ifps=ifps, first_k=n_rows, top_k=top_k, sort_by="n"
     )
 
     row_score = (
@@ -317,13 +312,17 @@ def make_ifp_corr_topk_rows(  # noqa: PLR0913
     )
 
 
-def save_ifp_corr_matrix(chart: alt.TopLevelMixin, *, corr_matrix_dir: str | Path) -> None:
-    """Save chart JSON spec + PDF to `timeline_dir`."""
-    corr_matrix_dir = Path(corr_matrix_dir)
-    corr_matrix_dir.mkdir(parents=True, exist_ok=True)
-    # `chart.to_dict()` enforces Altair's max row limit; `chart.save()` disables it by default.
-    chart.save(corr_matrix_dir / "corr_matrix.vl.json", format="json", json_kwds={"indent": 2})
-    chart.save(corr_matrix_dir / "corr_matrix.pdf")
+def save_ifp_corr_matrix(
+    chart: alt.TopLevelMixin,
+    *,
+    corr_matrix_dir: str | Path,
+    data_format: DataFormat | None = None,
+    force: bool = False,
+) -> bool:
+    """Save chart JSON spec + PDF (skipped if current; see `save_chart`)."""
+    return save_chart(
+        chart, out_dir=corr_matrix_dir, stem="corr_matrix", data_format=data_format, force=force
+    )
 
 
 def corr_pairs_table(  # noqa: PLR0913
@@ -334,20 +333,49 @@ def corr_pairs_table(  # noqa: PLR0913
     sort_by: str = "n",
     min_n: int = 2,
     min_unique: int = 2,
+    n_resamples: int = 0,
+    ci: float = 0.95,
+    seed: int = 0,
+    n_jobs: int | None = None,
 ) -> pl.LazyFrame:
-    """Return correlation pairs table (unique unordered pairs)."""
+    """Return correlation pairs table (unique unordered pairs).
+
+    `min_n` is both the minimum number of users per IFP and of shared users per pair.
+    With `top_k`, only each IFP's strongest partners are computed (see `topk_corr`).
+    With `n_resamples > 0`, every reported pair also gets a `ci` bootstrap interval
+    (`corr_lo`, `corr_hi`), a permutation `p_value` and a BH `q_value` across the
+    reported pairs (see `resample_corr`; reproducible for a given `seed`).
+    """
     sf = SurveyForecasts.load()
     ifps = IFPs.load()
 
     baseline_p_a_df = sf.baseline_p_a(sf_lf).collect()
-    corr_long = _corr_long_table(
-        baseline_p_a_df,
-        ifps=ifps,
-        first_k=first_k,
-        sort_by=sort_by,
-        min_n=min_n,
-        min_unique=min_unique,
-    )[1]
+    if top_k is None:
+        ifp_cols, matrix = _usable_ifps(
+            baseline_p_a_df,
+            first_k=first_k,
+            sort_by=sort_by,
+            min_n=min_n,
+            min_unique=min_unique,
+        )
+        # Only pairs with >= min_n shared users are correlated at all
+        corr_long = _attach_ifp_meta(
+            overlap_corr(matrix, ifp_cols, min_n=min_n).with_columns(
+                (pl.col("corr") ** 2).alias("r2")
+            ),
+            ifps,
+        )
+    else:
+        # The global top-k pairs are all within their rows' top-k
+        corr_long = _corr_topk_table(
+            baseline_p_a_df,
+            ifps=ifps,
+            first_k=first_k,
+            top_k=top_k,
+            sort_by=sort_by,
+            min_n=min_n,
+            min_unique=min_unique,
+        )
 
     pair_a = (
         pl.when(pl.col("ifp_id_x") <= pl.col("ifp_id_y"))
@@ -381,10 +409,22 @@ def corr_pairs_table(  # noqa: PLR0913
         )
         .unique(subset=["ifp_id_a", "ifp_id_b"], keep="first")
         .sort("r2", descending=True)
-        .select(["ifp_id_a", "short_title_a", "ifp_id_b", "short_title_b", "corr", "r2"])
+        .select(["ifp_id_a", "short_title_a", "ifp_id_b", "short_title_b", "corr", "r2", "n"])
     )
     if top_k is not None:
         df = df.head(top_k)
+    if n_resamples > 0:
+        significance = resample_corr(
+            BaselineMatrix.from_baseline_p_a(baseline_p_a_df),
+            df["ifp_id_a"].to_list(),
+            df["ifp_id_b"].to_list(),
+            n_boot=n_resamples,
+            n_perm=n_resamples,
+            ci=ci,
+            seed=seed,
+            n_jobs=n_jobs,
+        )
+        df = pl.concat([df, significance.drop("ifp_id_a", "ifp_id_b")], how="horizontal")
     return df.lazy()
 
 
@@ -1,11 +1,11 @@
 # %%
-import json
 from pathlib import Path
 
 import altair as alt
 import polars as pl
 
 from coco.config import FIGURES_DIR, logger
+from coco.gjp.viz.export import DataFormat, save_chart
 
 
 def make_ifp_timeline_chart(
@@ -83,12 +83,17 @@ def make_ifp_timeline_chart(
     )
 
 
-def save_ifp_timeline_chart(chart: alt.TopLevelMixin, *, timeline_dir: str | Path) -> None:
-    """Save chart JSON spec + PDF to `timeline_dir`."""
-    timeline_dir = Path(timeline_dir)
-    timeline_dir.mkdir(parents=True, exist_ok=True)
-    (timeline_dir / "ifp_timeline.vl.json").write_text(json.dumps(chart.to_dict(), indent=2))
-    chart.save(timeline_dir / "ifp_timeline.pdf")
+def save_ifp_timeline_chart(
+    chart: alt.TopLevelMixin,
+    *,
+    timeline_dir: str | Path,
+    data_format: DataFormat | None = None,
+    force: bool = False,
+) -> bool:
+    """Save chart JSON spec + PDF to `timeline_dir` (skipped if current; see `save_chart`)."""
+    return save_chart(
+        chart, out_dir=timeline_dir, stem="ifp_timeline", data_format=data_format, force=force
+    )
 
 
 # %%
@@ -1,79 +1,50 @@
 # %%
 from __future__ import annotations
 
-import json
-from pathlib import Path
+from typing import TYPE_CHECKING
 
 import altair as alt
 import polars as pl
 
 from coco.config import FIGURES_DIR, logger
+from coco.gjp.models.encoding import decode
 from coco.gjp.models.ifp import IFPs
 from coco.gjp.models.survey_fcasts import SurveyForecasts
+from coco.gjp.viz.export import DataFormat, save_chart
+
+if TYPE_CHECKING:
+    from pathlib import Path
 
 # Stage 3: Color bars by correctness (green/red) and set saturation by
 # confidence (higher saturation = higher confidence).
 
 
-def plot_user_timeline(  # noqa: PLR0913
+BASELINE_COLUMNS = [
+    "ifp_id",
+    "answer_option",
+    "baseline_value",
+    "baseline_timestamp",
+    "baseline_fcast_date",
+]
+
+
+def user_timeline_frame(
+    baselines_df: pl.DataFrame,
     ifps_lf: pl.LazyFrame,
     *,
-    user_id: str | None = None,
-    years: tuple[int, ...] | None = None,
-    title: str | None = None,
-    width: int = 800,
-    height: int = 800,
     short_title_regex: str | None = None,
-) -> tuple[alt.LayerChart, str]:
-    """Timeline of IFP open/close periods for questions a user forecasted on.
-
-    Stage 1: filter the timeline down to only the set of `ifp_id`s for which the
-    given user made a *baseline* forecast (their earliest observed forecast) as returned by
-    `SurveyForecasts.baselines()`.
+) -> pl.DataFrame:
+    """One row per closed IFP the user has a baseline on (`y_idx` = display order).
 
-    Stage 2: sort questions by the time the user first forecasted on them, and
-    overlay a dot at that timestamp with the user's baseline forecast shown in the
-    tooltip.
-
-    Returns:
-        (chart, resolved_user_id)
+    `baselines_df` holds one user's (decoded) `SurveyForecasts.baselines()` rows.
     """
-    sf = SurveyForecasts.load(years=years)
-    if user_id is None:
-        counts_df = (
-            sf.baselines()
-            .group_by("user_id")
-            .len()
-            .sort("len")  # ascending
-            .select(["user_id", "len"])
-            .collect()
-        )
-        # Pick someone near the top
-        n_users = len(counts_df)
-        mid_idx = max(0, min(n_users - 1, int(0.8 * n_users)))
-        resolved_user_id = counts_df.select(pl.col("user_id").slice(mid_idx, 1)).item()
-    else:
-        resolved_user_id = user_id
-
-    baselines_lf = sf.baselines().filter(pl.col("user_id") == resolved_user_id)
-    ifp_ids_lf = baselines_lf.select("ifp_id").unique()
-
     # NOTE: Building the display string inside a lazy expression has caused
     # version-specific Polars issues (list/struct conversion errors). We keep the
     # heavy lifting lazy, but compute the per-IFP "baseline forecast" tooltip string
     # eagerly for this one user (small table), then join it back in.
-    baselines_df = baselines_lf.select(
-        [
-            "ifp_id",
-            "answer_option",
-            "baseline_value",
-            "baseline_timestamp",
-            "baseline_fcast_date",
-        ]
-    ).collect()
-
     baselines_summary_df = (
-        baselines_df.group_by("ifp_id")
+        baselines_df.select(BASELINE_COLUMNS)
+        .group_by("ifp_id")
         .agg(
             pl.col("baseline_timestamp").min().alias("baseline_timestamp"),
             pl.col("baseline_fcast_date").min().alias("baseline_fcast_date"),
@@ -118,7 +89,6 @@ def plot_user_timeline(  # noqa: PLR0913
 
     lf = (
         ifps_lf.filter(pl.col("q_status") == "closed")
-        .join(ifp_ids_lf, on="ifp_id", how="inner")
         .join(baselines_summary_lf, on="ifp_id", how="inner")
         .select(
             [
@@ -142,14 +112,18 @@ def plot_user_timeline(  # noqa: PLR0913
     if short_title_regex is not None:
         lf = lf.filter(pl.col("short_title").str.contains(short_title_regex))
 
-    timeline_df = lf.with_row_index("y_idx").collect()
-    if timeline_df.is_empty():
-        msg = f"No baseline forecasts found for user_id={resolved_user_id!r}"
-        raise ValueError(msg)
+    return lf.with_row_index("y_idx").collect()
+
+
+def user_timeline_title(user_id: str) -> str:
+    """Default timeline title."""
+    return f"User {user_id} — IFP timeline (Open → Closed)"
 
-    if title is None:
-        title = f"User {resolved_user_id} — IFP timeline (Open → Closed)"
 
+def user_timeline_chart(
+    timeline_df: pl.DataFrame, *, title: str, width: int = 800, height: int = 800
+) -> alt.LayerChart:
+    """Bars (open -> closed), titles and baseline dots for a `user_timeline_frame`."""
     base = alt.Chart(timeline_df)
 
     # If we keep a fixed pixel height while `n_ifps` grows, the band/linear spacing
@@ -234,7 +208,7 @@ def plot_user_timeline(  # noqa: PLR0913
     zoom_x = alt.selection_interval(bind="scales", encodings=["x"])
     zoom_y = alt.selection_interval(bind="scales", encodings=["y"])
 
-    chart = (
+    return (
         (bars + labels + dots)
         .properties(
             title=title,
@@ -250,6 +224,50 @@ def plot_user_timeline(  # noqa: PLR0913
         .configure_title(fontSize=18)
     )
 
+
+def plot_user_timeline(  # noqa: PLR0913
+    ifps_lf: pl.LazyFrame,
+    *,
+    user_id: str | None = None,
+    years: tuple[int, ...] | None = None,
+    title: str | None = None,
+    width: int = 800,
+    height: int = 800,
+    short_title_regex: str | None = None,
+) -> tuple[alt.LayerChart, str]:
+    """Timeline of IFP open/close periods for questions a user forecasted on.
+
+    Stage 1: filter the timeline down to only the set of `ifp_id`s for which the
+    given user made a *baseline* forecast (their earliest observed forecast) as returned by
+    `SurveyForecasts.baselines()`.
+
+    Stage 2: sort questions by the time the user first forecasted on them, and
+    overlay a dot at that timestamp with the user's baseline forecast shown in the
+    tooltip.
+
+    Returns:
+        (chart, resolved_user_id)
+    """
+    sf = SurveyForecasts.load(years=years)
+    if user_id is None:
+        counts_df = sf.user_baseline_counts().collect()  # ascending
+        # Pick someone near the top
+        n_users = len(counts_df)
+        mid_idx = max(0, min(n_users - 1, int(0.8 * n_users)))
+        resolved_user_id = counts_df.select(pl.col("user_id").slice(mid_idx, 1)).item()
+    else:
+        resolved_user_id = user_id
+
+    baselines_df = decode(sf.baselines_for(user_ids=[resolved_user_id])).collect()
+    timeline_df = user_timeline_frame(baselines_df, ifps_lf, short_title_regex=short_title_regex)
+    if timeline_df.is_empty():
+        msg = f"No baseline forecasts found for user_id={resolved_user_id!r}"
+        raise ValueError(msg)
+
+    if title is None:
+        title = user_timeline_title(resolved_user_id)
+    chart = user_timeline_chart(timeline_df, title=title, width=width, height=height)
+
     logger.info(
         "Built user timeline for user_id={} (n_ifps={})",
         resolved_user_id,
@@ -263,12 +281,11 @@ def save_user_timeline_chart(
     *,
     timeline_dir: str | Path,
     stem: str = "user_timeline",
-) -> None:
-    """Save chart JSON spec + PDF to `timeline_dir`."""
-    timeline_dir = Path(timeline_dir)
-    timeline_dir.mkdir(parents=True, exist_ok=True)
-    (timeline_dir / f"{stem}.vl.json").write_text(json.dumps(chart.to_dict(), indent=2))
-    chart.save(timeline_dir / f"{stem}.pdf")
+    data_format: DataFormat | None = None,
+    force: bool = False,
+) -> bool:
+    """Save chart JSON spec + PDF to `timeline_dir` (skipped if current; see `save_chart`)."""
+    return save_chart(chart, out_dir=timeline_dir, stem=stem, data_format=data_format, force=force)
 
 
 def main(*, user_id: str | None = None, years: tuple[int, ...] | None = None) -> alt.LayerChart:
@@ -0,0 +1,41 @@
+# Shared test fixtures
+# %%
+
+from collections.abc import Callable
+
+import numpy as np
+import pytest
+
+from coco.gjp.models.belief_hmm import MISSING, Trajectories
+
+
+def _trajectories(n_users: int = 5, seed: int = 0) -> Trajectories:
+    """2-3 random-walk trajectories per user on different IFPs and start dates."""
+    rng = np.random.default_rng(seed)
+    user_ids, ifp_ids, starts, rows = [], [], [], []
+    for u in range(n_users):
+        for i in rng.choice(4, size=rng.integers(2, 4), replace=False):
+            length = int(rng.integers(5, 30))
+            walk = np.clip(rng.random() + np.cumsum(rng.normal(0, 0.05, length)), 0, 1)
+            walk[1:][rng.random(length - 1) > 0.4] = MISSING
+            walk[length - 1] = rng.random()
+            user_ids.append(f"{u:05d}")
+            ifp_ids.append(f"100{i}-0")
+            starts.append(np.datetime64("2012-01-01") + int(rng.integers(0, 20)))
+            rows.append(walk)
+    reports = np.full((len(rows), max(map(len, rows))), MISSING)
+    for i, row in enumerate(rows):
+        reports[i, : len(row)] = row
+    return Trajectories(
+        user_ids=user_ids,
+        ifp_ids=ifp_ids,
+        start=np.array(starts, dtype="datetime64[D]"),
+        lengths=np.array(list(map(len, rows))),
+        reports=reports,
+    )
+
+
+@pytest.fixture
+def make_trajectories() -> Callable[..., Trajectories]:
+    """Factory of random belief trajectories: `make_trajectories(n_users=5, seed=0)`."""
+    return _trajectories
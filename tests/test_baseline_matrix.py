@@ -0,0 +1,39 @@
+# Sparse user x IFP matrix of baseline p(answer_option="a")
+# %%
+
+from pathlib import Path
+import random
+
+import numpy as np
+import polars as pl
+
+from coco.gjp.models.baseline_matrix import BaselineMatrix
+
+
+def _baseline_p_a(seed: int = 0) -> pl.DataFrame:
+    rng = random.Random(seed)
+    pairs = {(f"{rng.randint(0, 60):05d}", f"{rng.randint(1000, 1030)}-0") for _ in range(400)}
+    return pl.DataFrame(
+        [{"user_id": u, "ifp_id": i, "baseline_p_a": rng.random()} for u, i in sorted(pairs)]
+    )
+
+
+def test_baseline_matrix_matches_pivot_and_memory_maps(tmp_path: Path) -> None:
+    """Dense column slices equal the Polars pivot; saved arrays re-open memory-mapped."""
+    df = _baseline_p_a()
+    matrix = BaselineMatrix.from_baseline_p_a(df)
+    assert matrix.nnz == len(df)
+
+    ifp_ids = matrix.ifp_ids[3:9]
+    expected = (
+        df.filter(pl.col("ifp_id").is_in(ifp_ids))
+        .pivot(values="baseline_p_a", index="user_id", on="ifp_id")
+        .sort("user_id")
+        .select(["user_id", *ifp_ids])
+    )
+    assert matrix.to_dense_frame(ifp_ids).equals(expected)
+
+    matrix.save(tmp_path / "m")
+    opened = BaselineMatrix.open(tmp_path / "m")
+    assert isinstance(opened.data, np.memmap)
+    assert (opened.to_scipy() != matrix.to_scipy()).nnz == 0
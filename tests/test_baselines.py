@@ -0,0 +1,135 @@
+# Baseline (earliest observed forecast) extraction
+# %%
+
+import datetime as dt
+from pathlib import Path
+import random
+
+import polars as pl
+from polars.testing import assert_frame_equal
+import pytest
+
+from coco.gjp.models.baseline_store import BaselineStore
+from coco.gjp.models.baselines import BASELINE_ORDER_BY, earliest_rows
+
+
+def _forecasts(n: int = 2_000, seed: int = 0) -> pl.DataFrame:
+    """Random forecasts with many timestamp ties so lower-priority keys matter."""
+    rng = random.Random(seed)
+    t0 = dt.datetime(2012, 1, 1)
+    rows = []
+    for forecast_id in rng.sample(range(10 * n), n):
+        ts = t0 + dt.timedelta(hours=rng.randint(0, 30))
+        rows.append(
+            {
+                "ifp_id": f"{rng.randint(1000, 1010)}-0",
+                "user_id": f"{rng.randint(0, 40):05d}",
+                "answer_option": rng.choice("ab"),
+                "value": rng.random(),
+                "timestamp": ts,
+                "fcast_date": ts.date() - dt.timedelta(days=rng.randint(0, 1)),
+                "forecast_id": forecast_id,
+            }
+        )
+    return pl.DataFrame(rows)
+
+
+def test_earliest_rows_matches_sort_then_first() -> None:
+    """The sort-free arg-min picks the same rows as a global sort + first()."""
+    df = _forecasts()
+    keys = ["ifp_id", "user_id", "answer_option"]
+    cols = ["value", "timestamp", "fcast_date"]
+
+    expected = df.sort(BASELINE_ORDER_BY).group_by(keys).agg(pl.col(cols).first()).sort(keys)
+    got = (
+        earliest_rows(df.lazy(), by=keys, columns=cols, order_by=BASELINE_ORDER_BY)
+        .collect()
+        .sort(keys)
+    )
+    assert got.equals(expected)
+
+
+def test_baseline_store_incremental_matches_full_recompute(tmp_path: Path) -> None:
+    """Syncing years and appending batches gives the same tables as a full recompute."""
+    keys = ["ifp_id", "user_id", "answer_option"]
+    years = {1: _forecasts(seed=1), 2: _forecasts(seed=2)}
+    appended = _forecasts(n=300, seed=3)
+
+    store = BaselineStore(tmp_path)
+    store.sync({1: "v1", 2: "v1"}, lambda y: years[y].lazy())
+    assert store.ingest(appended.lazy(), year=2) > 0
+
+    everything = pl.concat([years[1], years[2], appended])
+    expected = (
+        everything.sort(BASELINE_ORDER_BY)
+        .group_by(keys)
+        .agg(
+            pl.col("value").first().alias("baseline_value"),
+            pl.col("timestamp").first().alias("baseline_timestamp"),
+            pl.col("fcast_date").first().alias("baseline_fcast_date"),
+        )
+    )
+    assert_frame_equal(store.baselines().collect().sort(keys), expected.sort(keys))
+
+    expected_agg = (
+        expected.group_by(["ifp_id", "answer_option"])
+        .agg(
+            pl.col("baseline_value").mean().alias("avg_baseline"),
+            pl.col("baseline_value").median().alias("median_baseline"),
+            pl.col("user_id").n_unique().alias("n_users"),
+        )
+        .sort(["ifp_id", "answer_option"])
+    )
+    assert_frame_equal(store.agg_baselines().collect(), expected_agg)
+
+    # Year subsets are served from the per-year partials
+    only_1 = store.baselines(years=(1,)).collect().sort(keys)
+    assert len(only_1) == years[1].select(keys).n_unique()
+
+    # Unchanged fingerprints are skipped: nothing is reloaded or rewritten
+    def reload(year: int) -> pl.LazyFrame:
+        msg = f"year {year} was reloaded"
+        raise AssertionError(msg)
+
+    files = sorted(tmp_path.rglob("*.parquet"))
+    mtimes = [path.stat().st_mtime_ns for path in files]
+    store.sync({1: "v1", 2: "v1"}, reload)
+    assert [path.stat().st_mtime_ns for path in files] == mtimes
+    assert_frame_equal(store.baselines().collect().sort(keys), expected.sort(keys))
+    assert store.manifest() == {1: "v1", 2: "v1"}
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_baseline_store_redoes_an_interrupted_sync(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A sync that fails before the merged table is written is completed by the next one."""
+    keys = ["ifp_id", "user_id", "answer_option"]
+    old, new = _forecasts(seed=1), _forecasts(seed=2)
+    store = BaselineStore(tmp_path)
+    store.sync({1: "v1"}, lambda y: old.lazy())
+
+    write = BaselineStore._write
+
+    def fail_on_merged(self: BaselineStore, path: Path, df: pl.DataFrame) -> None:
+        if path == self._merged_path:
+            msg = "interrupted"
+            raise OSError(msg)
+        write(self, path, df)
+
+    monkeypatch.setattr(BaselineStore, "_write", fail_on_merged)
+    with pytest.raises(OSError, match="interrupted"):
+        store.sync({1: "v2"}, lambda y: new.lazy())
+    monkeypatch.undo()
+    assert store.manifest() == {1: "v1"}
+
+    store.sync({1: "v2"}, lambda y: new.lazy())
+    fresh = BaselineStore(tmp_path / "fresh")
+    fresh.sync({1: "v2"}, lambda y: new.lazy())
+    assert_frame_equal(
+        store.baselines().collect().sort(keys), fresh.baselines().collect().sort(keys)
+    )
+    assert_frame_equal(
+        store.agg_baselines().collect().sort(["ifp_id", "answer_option"]),
+        fresh.agg_baselines().collect().sort(["ifp_id", "answer_option"]),
+    )
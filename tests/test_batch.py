@@ -0,0 +1,66 @@
+# Batch rendering of per-user timelines and per-IFP histograms, with resumable ledgers
+# %%
+
+import datetime as dt
+from pathlib import Path
+
+import polars as pl
+import pytest
+
+from coco.gjp.models.ifp import IFPs
+from coco.gjp.models.survey_fcasts import SurveyForecasts
+from coco.gjp.viz import batch
+
+
+def _baselines() -> pl.DataFrame:
+    """Decoded baselines of 2 users on the first 2 closed IFPs (timelines show closed IFPs)."""
+    closed = IFPs.load().lf.filter(pl.col("q_status") == "closed").head(2)
+    ifp_ids = closed.collect()["ifp_id"].to_list()
+    t0 = dt.datetime(2011, 9, 1, 9)  # noqa: DTZ001
+    rows = [
+        {
+            "ifp_id": ifp_id,
+            "user_id": user_id,
+            "answer_option": option,
+            "baseline_value": value if option == "a" else 1 - value,
+            "baseline_timestamp": t0 + dt.timedelta(days=i),
+            "baseline_fcast_date": (t0 + dt.timedelta(days=i)).date(),
+        }
+        for i, (user_id, ifp_id, value) in enumerate(
+            [("00001", ifp_ids[0], 0.2), ("00001", ifp_ids[1], 0.7), ("00002", ifp_ids[0], 0.9)]
+        )
+        for option in "ab"
+    ]
+    return pl.DataFrame(rows)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_batches_render_each_entity_once(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, n_jobs: int
+) -> None:
+    """Both entities are rendered (in workers too); a rerun skips them via the ledger."""
+    baselines_df = _baselines()
+    sf = SurveyForecasts(lf=pl.LazyFrame(), version="test-batch")
+    monkeypatch.setattr(batch, "_shared_inputs", lambda _: (sf, baselines_df))
+
+    for render, entities in [
+        (batch.render_user_timelines, ["00001", "00002"]),
+        (batch.render_forecast_priors_hists, baselines_df["ifp_id"].unique().sort().to_list()),
+    ]:
+        out_root = tmp_path / render.__name__
+        first = render(out_root=out_root, n_jobs=n_jobs).sort("entity")
+        assert first["entity"].to_list() == entities
+        assert first["status"].to_list() == ["rendered", "rendered"]
+        for entity in entities:
+            assert len(list((out_root / entity).glob("*.pdf"))) == 1
+        (ledger,) = out_root.glob(".batch-*.jsonl")
+        assert len(ledger.read_text().splitlines()) == len(entities)
+
+        assert render(out_root=out_root, n_jobs=n_jobs).is_empty()
+        again = render(out_root=out_root, n_jobs=n_jobs, resume=False)
+        assert again["status"].to_list() == ["current", "current"]
+
+        # Other options are a different batch configuration, with a ledger of their own
+        other = render(out_root=out_root, n_jobs=n_jobs, data_format="csv")
+        assert other["status"].to_list() == ["rendered", "rendered"]
+        assert len(list(out_root.glob(".batch-*.jsonl"))) == 2
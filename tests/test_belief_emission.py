@@ -0,0 +1,49 @@
+# Precomputed truncated-normal report emission tables
+# %%
+
+import numpy as np
+import pytest
+from scipy.stats import truncnorm
+
+from coco.gjp.models.belief_emission import (
+    MISSING,
+    bin_centers,
+    emission_table,
+    report_bins,
+    scaled_emission_table,
+)
+
+
+def test_emission_table_matches_truncnorm_bin_masses() -> None:
+    """Rows are truncated-normal bin masses (even far in the tails); -1 gathers log 1."""
+    sigma, n_bins = 0.05, 20
+    table = emission_table(sigma, n_bins)
+    assert table.shape == (n_bins + 1, n_bins)
+    assert emission_table(sigma, n_bins) is table
+    assert not table.flags.writeable
+
+    mu = bin_centers(n_bins)
+    dist = truncnorm(-mu / sigma, (1 - mu) / sigma, loc=mu, scale=sigma)
+    edges = np.linspace(0, 1, n_bins + 1)
+    mass = np.diff(dist.cdf(edges[:, None]), axis=0)
+    near = mass > 1e-6  # CDF differences lose relative precision further out
+    np.testing.assert_allclose(table[:-1][near], np.log(mass[near]), rtol=1e-9)
+    assert np.isfinite(table).all()
+    np.testing.assert_allclose(np.exp(table[:-1]).sum(axis=0), 1.0)
+    np.testing.assert_array_equal(table[-1], 0.0)
+
+    reports = np.array([0.0, 0.049, 0.05, 0.5, 1.0, MISSING])
+    obs = report_bins(reports, n_bins)
+    np.testing.assert_array_equal(obs, [0, 0, 1, 10, 19, -1])
+    np.testing.assert_array_equal(table[obs][-1], 0.0)
+
+    lik, shift = scaled_emission_table(sigma, n_bins)
+    np.testing.assert_allclose(np.log(lik) + shift[:, None], table)
+
+
+@pytest.mark.parametrize("n_bins", [50, 100])
+def test_report_bins_puts_edge_reports_in_their_own_bin(n_bins: int) -> None:
+    """Reports on the 0.01 grid fall in the bin starting at (or just below) them."""
+    reports = np.arange(101) / 100
+    expected = np.minimum(np.arange(101) * n_bins // 100, n_bins - 1)
+    np.testing.assert_array_equal(report_bins(reports, n_bins), expected)
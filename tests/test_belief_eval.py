@@ -0,0 +1,85 @@
+# Train/test splits, predictors and scores of the belief HMM evaluation
+# %%
+
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from coco.gjp.models import belief_eval
+from coco.gjp.models.belief_eval import (
+    SplitSpec,
+    evaluate,
+    load_split,
+    split_cells,
+    training_trajectories,
+)
+from coco.gjp.models.belief_hmm import Trajectories
+
+
+def test_splits_hold_out_each_users_reports(
+    tmp_path: Path, make_trajectories: Callable[..., Trajectories]
+) -> None:
+    """Random splits hold out a fixed fraction per user; time splits follow each user's span."""
+    traj = make_trajectories()
+    users = np.array(traj.user_ids)
+    rows, days = np.nonzero(traj.reports >= 0)
+
+    spec = SplitSpec(kind="random", test_frac=0.3, seed=1)
+    cells = load_split(traj, spec, out_dir=tmp_path)
+    np.testing.assert_array_equal(load_split(traj, spec, out_dir=tmp_path), cells)
+    assert len(list((tmp_path / "splits").glob("*.npy"))) == 1
+    assert (traj.reports.flat[cells] >= 0).all()
+    held_rows = np.unravel_index(cells, traj.reports.shape)[0]
+    for user in set(traj.user_ids):
+        n_user = (users[rows] == user).sum()
+        assert (users[held_rows] == user).sum() == round(0.3 * n_user)
+    other = split_cells(traj, spec.model_copy(update={"seed": 2}))
+    assert not np.array_equal(other, cells)
+
+    dates = traj.start[rows] + days
+    for spec in [SplitSpec(kind="cutoff", tau=0.5), SplitSpec(kind="interval")]:
+        cells = split_cells(traj, spec)
+        held = np.isin(np.ravel_multi_index((rows, days), traj.reports.shape), cells)
+        lo, hi = (0.5, 1.0) if spec.kind == "cutoff" else (0.4, 0.6)
+        for user in set(traj.user_ids):
+            mine = users[rows] == user
+            first, last = dates[mine].min(), dates[mine].max()
+            offset = (dates[mine] - first).astype(int)
+            span = (last - first).astype(int)
+            expected = (offset > lo * span) & (offset <= hi * span)
+            np.testing.assert_array_equal(held[mine], expected)
+
+
+def test_evaluate_scores_every_split_and_predictor(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, make_trajectories: Callable[..., Trajectories]
+) -> None:
+    """One per-user table per split x predictor; chunked parallel predictions match."""
+    monkeypatch.setattr(belief_eval, "USERS_PER_CHUNK", 2)
+    traj = make_trajectories()
+    specs = [SplitSpec(kind="random"), SplitSpec(kind="cutoff", tau=0.5)]
+    kwargs = {"n_bins": 5, "out_dir": tmp_path / "eval", "fit_dir": tmp_path / "fits"}
+    results = evaluate(traj, specs, n_jobs=1, **kwargs)
+    assert set(results) == {(s.name, p) for s in specs for p in belief_eval.PREDICTORS}
+    assert len(list((tmp_path / "eval" / "results").glob("*.parquet"))) == len(results)
+    # Workers memory-map each split's training reports, saved once
+    assert len(list((tmp_path / "eval" / "trajectories").glob("*/reports.npy"))) == len(specs)
+
+    # The collective average predicts each IFP's mean training report
+    spec = specs[1]
+    cells = load_split(traj, spec, out_dir=tmp_path / "eval")
+    train = training_trajectories(traj, cells)
+    rows, days = np.unravel_index(cells, traj.reports.shape)
+    ifps = np.array(traj.ifp_ids)
+    ifp_reports = {ifp: train.reports[ifps == ifp] for ifp in set(ifps)}
+    predictions = np.array([ifp_reports[ifp][ifp_reports[ifp] >= 0].mean() for ifp in ifps[rows]])
+    expected = belief_eval.score_predictions(traj, cells, predictions)
+    table = results[spec.name, "collective_average"]
+    np.testing.assert_allclose(table["mean_error"], expected["mean_error"])
+    assert table["n_test"].sum() == len(cells)
+    assert (table["mean_error"] >= 0).all()
+
+    parallel = evaluate(traj, specs, n_jobs=2, **kwargs)
+    for key, table in results.items():
+        np.testing.assert_allclose(parallel[key]["mse"], table["mse"])
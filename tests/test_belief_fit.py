@@ -0,0 +1,73 @@
+# Collective + per-user belief HMM fits (parallel, checkpointed)
+# %%
+
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+import pytest
+
+from coco.gjp.models import belief_fit
+from coco.gjp.models.belief_fit import (
+    fit_belief_models,
+    fit_collective,
+    fit_users,
+    warm_start,
+)
+from coco.gjp.models.belief_hmm import Trajectories
+from coco.gjp.models.belief_smc import ThetaPosterior, fit_smc
+from coco.gjp.models.survey_fcasts import SurveyForecasts
+
+
+def test_fit_users_matches_separate_fits_and_resumes(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, make_trajectories: Callable[..., Trajectories]
+) -> None:
+    """Chunked parallel fits equal one `fit_smc` per user; missing chunks are refitted."""
+    monkeypatch.setattr(belief_fit, "USERS_PER_CHUNK", 2)
+    traj = make_trajectories()
+    collective = fit_collective(traj, prior=ThetaPosterior.prior(5), out_dir=tmp_path)
+    reloaded = fit_collective(traj, prior=ThetaPosterior.prior(5), out_dir=tmp_path)
+    np.testing.assert_array_equal(reloaded.trans_counts, collective.trans_counts)
+    prior = warm_start(collective, strength=10.0)
+    np.testing.assert_allclose(prior.trans_counts.sum(axis=1), 10.0)
+
+    fits = fit_users(traj, prior, out_dir=tmp_path, n_jobs=1)
+    assert fits.user_ids == sorted(set(traj.user_ids))
+    for user_id in fits.user_ids:
+        rows = np.flatnonzero(np.array(traj.user_ids) == user_id)
+        expected, loglik = fit_smc(traj.take(rows).reports, prior=prior)
+        got = fits.posterior(user_id)
+        np.testing.assert_allclose(got.trans_counts, expected.trans_counts)
+        np.testing.assert_allclose(got.initial_counts, expected.initial_counts)
+        np.testing.assert_allclose(fits.loglik[fits.user_ids.index(user_id)], loglik.sum())
+
+    chunks = sorted(tmp_path.glob("users-*/chunks/chunk-*.npz"))
+    assert len(chunks) == 3
+    for chunk in chunks[1:]:
+        chunk.unlink()
+    kept = chunks[0].stat().st_mtime_ns
+    resumed = fit_users(traj, prior, out_dir=tmp_path, n_jobs=2)
+    assert all(chunk.exists() for chunk in chunks)
+    assert chunks[0].stat().st_mtime_ns == kept
+    np.testing.assert_allclose(resumed.trans_counts, fits.trans_counts)
+
+
+def test_fit_belief_models_without_forecasts(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """No studied forecasts give the prior as the collective fit and no user fits."""
+    monkeypatch.setattr(SurveyForecasts, "_join_studied_ifps", staticmethod(lambda lf: lf))
+    schema = {
+        "user_id": pl.String,
+        "ifp_id": pl.String,
+        "answer_option": pl.String,
+        "value": pl.Float64,
+        "fcast_type": pl.Int64,
+        "fcast_date": pl.Date,
+    }
+    sf = SurveyForecasts(lf=pl.LazyFrame(schema=schema))
+    collective, user_fits = fit_belief_models(sf, n_bins=5, out_dir=tmp_path, n_jobs=2)
+    np.testing.assert_array_equal(collective.trans_counts, ThetaPosterior.prior(5).trans_counts)
+    assert user_fits.user_ids == []
+    assert user_fits.trans_counts.shape == (0, 5, 5)
@@ -0,0 +1,92 @@
+# Belief HMM inference against brute-force path enumeration
+# %%
+
+import datetime as dt
+import itertools
+
+import numpy as np
+import polars as pl
+
+from coco.gjp.models.belief_hmm import MISSING, BeliefHMM, Trajectories
+
+
+def _random_hmm(n_bins: int, seed: int = 0) -> BeliefHMM:
+    rng = np.random.default_rng(seed)
+    return BeliefHMM(
+        initial=rng.dirichlet(np.ones(n_bins)),
+        trans=rng.dirichlet(np.ones(n_bins), size=n_bins),
+        sigma=0.2,
+    )
+
+
+def _enumerate(hmm: BeliefHMM, reports: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Joint log-probability of every bin path (rows) with one trajectory's reports."""
+    emit = hmm.log_emissions(reports)
+    paths = np.array(list(itertools.product(range(hmm.n_bins), repeat=len(reports))))
+    logp = np.log(hmm.initial[paths[:, 0]]) + emit[0, paths[:, 0]]
+    for t in range(1, len(reports)):
+        logp += np.log(hmm.trans[paths[:, t - 1], paths[:, t]]) + emit[t, paths[:, t]]
+    return paths, logp
+
+
+def test_forward_backward_and_viterbi_match_enumeration() -> None:
+    """Likelihoods, posteriors and best paths equal exhaustive sums over paths."""
+    hmm = _random_hmm(n_bins=3)
+    reports = np.array(
+        [
+            [0.9, MISSING, 0.7, 0.2, MISSING],
+            [0.1, 0.15, MISSING, MISSING, MISSING],  # padded after day 1
+            [0.5, MISSING, MISSING, MISSING, 0.95],
+        ]
+    )
+    post, loglik = hmm.forward_backward(reports)
+    paths, best = hmm.viterbi(reports)
+    np.testing.assert_allclose(hmm.loglik(reports), loglik)
+
+    for i, (row, length) in enumerate(zip(reports, [4, 2, 5], strict=True)):
+        all_paths, logp = _enumerate(hmm, row[:length])
+        np.testing.assert_allclose(loglik[i], np.logaddexp.reduce(logp))
+        weights = np.exp(logp - logp.max())
+        weights /= weights.sum()
+        for t in range(length):
+            marginal = np.bincount(all_paths[:, t], weights=weights, minlength=hmm.n_bins)
+            np.testing.assert_allclose(post[i, t], marginal, atol=1e-12)
+        np.testing.assert_array_equal(paths[i, :length], all_paths[logp.argmax()])
+        np.testing.assert_allclose(best[i], logp.max())
+
+
+def test_trajectories_from_forecasts() -> None:
+    """Latest p(a) per day, left-aligned from the first forecast; withdrawals are gaps."""
+    d = dt.date(2012, 1, 1)
+    rows = [
+        # user, ifp, option, value, type, date offset, forecast_id
+        ("00002", "1001-0", "a", 0.3, 0, 0, 1),
+        ("00002", "1001-0", "b", 0.7, 0, 0, 1),
+        ("00002", "1001-0", "a", 0.4, 1, 0, 2),  # same day, later
+        ("00002", "1001-0", "a", 0.6, 1, 3, 3),
+        ("00002", "1001-0", "a", 0.6, 4, 5, 4),  # withdraw
+        ("00001", "1002-0", "a", 0.8, 0, 2, 5),
+    ]
+    df = pl.DataFrame(
+        [
+            {
+                "user_id": u,
+                "ifp_id": i,
+                "answer_option": o,
+                "value": v,
+                "fcast_type": k,
+                "fcast_date": d + dt.timedelta(days=t),
+                "forecast_id": f,
+            }
+            for u, i, o, v, k, t, f in rows
+        ]
+    )
+    traj = Trajectories.from_forecasts(df)
+    assert traj.user_ids == ["00001", "00002"]
+    assert traj.ifp_ids == ["1002-0", "1001-0"]
+    assert traj.start.tolist() == [dt.date(2012, 1, 3), d]
+    np.testing.assert_array_equal(traj.lengths, [1, 4])
+    np.testing.assert_array_equal(
+        traj.reports, [[0.8, MISSING, MISSING, MISSING], [0.4, MISSING, MISSING, 0.6]]
+    )
+    assert traj.take(np.array([0])).reports.shape == (1, 1)
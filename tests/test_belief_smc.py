@@ -0,0 +1,58 @@
+# Deterministic SMC estimation of belief HMM parameters
+# %%
+
+import numpy as np
+from scipy.stats import truncnorm
+
+from coco.gjp.models.belief_hmm import MISSING, BeliefHMM
+from coco.gjp.models.belief_smc import ThetaPosterior, fit_smc
+
+
+def _sample_reports(
+    hmm: BeliefHMM, n: int, n_days: int, *, p_report: float, seed: int = 0
+) -> np.ndarray:
+    """Simulate trajectories; each reports on day 0 and then with probability `p_report`."""
+    rng = np.random.default_rng(seed)
+    bins = np.empty((n, n_days), dtype=np.int64)
+    bins[:, 0] = rng.choice(hmm.n_bins, size=n, p=hmm.initial)
+    cum = np.cumsum(hmm.trans, axis=1)
+    for t in range(1, n_days):
+        bins[:, t] = (rng.random((n, 1)) > cum[bins[:, t - 1]]).sum(axis=1)
+    mu, sigma = hmm.centers[bins], hmm.sigma
+    reports = truncnorm.rvs(-mu / sigma, (1 - mu) / sigma, loc=mu, scale=sigma, random_state=rng)
+    silent = rng.random((n, n_days)) > p_report
+    silent[:, 0] = False
+    return np.where(silent, MISSING, reports)
+
+
+def _sticky_hmm() -> BeliefHMM:
+    n_bins = 4
+    trans = 0.8 * np.eye(n_bins) + 0.2 * np.roll(np.eye(n_bins), 1, axis=1)
+    return BeliefHMM(initial=np.array([0.4, 0.3, 0.2, 0.1]), trans=trans)
+
+
+def test_fit_smc_recovers_parameters_from_sparse_reports() -> None:
+    """Transitions are recovered with most days silent; chunking does not change the fit."""
+    hmm = _sticky_hmm()
+    reports = _sample_reports(hmm, 1000, 100, p_report=0.3)
+    prior = ThetaPosterior.prior(hmm.n_bins)
+
+    posterior, loglik = fit_smc(reports, prior=prior)
+    fit = posterior.mean()
+    np.testing.assert_allclose(fit.trans, hmm.trans, atol=0.05)
+    np.testing.assert_allclose(fit.initial, hmm.initial, atol=0.05)
+
+    chunked, chunked_loglik = fit_smc(reports, prior=prior, memory_budget_bytes=1)
+    np.testing.assert_array_equal(chunked.trans_counts, posterior.trans_counts)
+    np.testing.assert_array_equal(chunked_loglik, loglik)
+
+
+def test_fit_smc_with_a_fixed_theta_is_the_forward_pass() -> None:
+    """Under a prior too concentrated to move, predictive likelihoods are the HMM's."""
+    hmm = _sticky_hmm()
+    reports = _sample_reports(hmm, 50, 30, p_report=0.5)
+    reports[:10, 20:] = MISSING  # ragged lengths
+    prior = ThetaPosterior(initial_counts=hmm.initial * 1e12, trans_counts=hmm.trans * 1e12)
+
+    _, loglik = fit_smc(reports, prior=prior)
+    np.testing.assert_allclose(loglik, hmm.loglik(reports), rtol=1e-6)
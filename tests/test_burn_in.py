@@ -0,0 +1,86 @@
+# Limited-iteration Gibbs chains over joint IFP outcomes
+# %%
+
+import numpy as np
+import polars as pl
+import pytest
+
+from coco.gjp.models.baseline_matrix import BaselineMatrix
+from coco.gjp.models.burn_in import CHAINS_PER_CHUNK, IsingBeliefs, simulate_burn_in, start_states
+
+
+def _model() -> IsingBeliefs:
+    return IsingBeliefs(
+        ifp_ids=["1000-0", "1001-0", "1002-0"],
+        h=np.array([0.5, -1.0, 0.2]),
+        J=np.array([[0.0, 1.5, -1.0], [1.5, 0.0, 0.5], [-1.0, 0.5, 0.0]]),
+    )
+
+
+def test_short_chains_stay_near_the_start_and_long_chains_converge() -> None:
+    """Visited states are biased to the start for few iterations, exact in the limit."""
+    model = _model()
+    result = simulate_burn_in(model, np.zeros((3000, 3), dtype=bool), [2000, 1, 5], seed=3)
+    assert result.lengths == [1, 5, 2000]
+    assert result.visit_freq.shape == (3, 3000, 3)
+
+    marginals = model.marginals()
+    freq = result.visit_freq.mean(axis=1)
+    assert (freq[0] < marginals - 0.2).all()
+    assert (freq[0] < freq[1]).all()
+    np.testing.assert_allclose(freq[-1], marginals, atol=0.01)
+    np.testing.assert_allclose(result.state_distribution()[-1], model.state_probs(), atol=0.005)
+
+    again = simulate_burn_in(model, np.zeros((3000, 3), dtype=bool), [1, 5, 2000], seed=3)
+    np.testing.assert_array_equal(again.visit_freq, result.visit_freq)
+
+
+def test_burn_in_is_independent_of_n_jobs() -> None:
+    """Chunks run on a process pool give the same chains as a serial run."""
+    model = _model()
+    start = np.random.default_rng(0).random((CHAINS_PER_CHUNK + 100, 3)) < 0.5
+    serial = simulate_burn_in(model, start, [1, 10], seed=5, n_jobs=1)
+    parallel = simulate_burn_in(model, start, [1, 10], seed=5, n_jobs=2)
+    np.testing.assert_array_equal(serial.visit_freq, parallel.visit_freq)
+    np.testing.assert_array_equal(serial.state_counts, parallel.state_counts)
+    assert serial.state_counts is not None
+    assert serial.state_counts.sum(axis=1).tolist() == [len(start), 10 * len(start)]
+
+
+def test_burn_in_start_states_are_checked() -> None:
+    """Start states must be (n_chains, k); zero chains give empty statistics."""
+    model = _model()
+    with pytest.raises(ValueError, match=r"shape \(n_chains, 3\)"):
+        simulate_burn_in(model, np.zeros((5, 2), dtype=bool), [1])
+    with pytest.raises(ValueError, match=r"shape \(n_chains, 3\)"):
+        simulate_burn_in(model, np.zeros(3, dtype=bool), [1])
+
+    empty = simulate_burn_in(model, np.zeros((0, 3), dtype=bool), [1, 5])
+    assert empty.visit_freq.shape == (2, 0, 3)
+    assert empty.state_counts is not None
+    assert empty.state_counts.shape == (2, 8)
+    assert not empty.state_counts.any()
+
+
+def test_model_and_start_states_from_baselines() -> None:
+    """Fields are the log-odds of mean baselines; couplings are the baseline correlations."""
+    rng = np.random.default_rng(0)
+    a = rng.random(30)
+    df = pl.DataFrame(
+        {
+            "user_id": [f"{u:05d}" for u in range(30)] * 2,
+            "ifp_id": ["1000-0"] * 30 + ["1001-0"] * 30,
+            "baseline_p_a": np.r_[a, np.clip(a + rng.normal(0, 0.1, 30), 0, 1)],
+        }
+    )[:-5]  # the last users have no baseline on 1001-0
+    matrix = BaselineMatrix.from_baseline_p_a(df)
+    model = IsingBeliefs.from_baselines(matrix, ["1000-0", "1001-0"], coupling=2.0)
+
+    means = df.group_by("ifp_id").agg(pl.col("baseline_p_a").mean()).sort("ifp_id")
+    np.testing.assert_allclose(1 / (1 + np.exp(-model.h)), means["baseline_p_a"].to_numpy())
+    corr = np.corrcoef(a[:25], df["baseline_p_a"][30:].to_numpy())[0, 1]
+    np.testing.assert_allclose(model.J, [[0, 2 * corr], [2 * corr, 0]])
+
+    start = start_states(matrix, model.ifp_ids, ["00000", "00029"])
+    assert start.shape == (2, 2)
+    assert start.dtype == bool
@@ -0,0 +1,102 @@
+# Polars-side binning and external (sidecar) data for Vega-Lite exports
+# %%
+
+import json
+from pathlib import Path
+
+import altair as alt
+import numpy as np
+import polars as pl
+import pytest
+
+from coco.gjp.viz.export import bin_counts, render_timings, save_chart
+
+
+def test_bin_counts_matches_numpy_histogram() -> None:
+    """Values spanning [0, 1] give np.histogram's counts over 0.05 steps (1.0 in the last bin)."""
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.random(300), [0.0, 1.0, 0.05]])
+    df = pl.DataFrame({"g": ["a", "b"] * (len(values) // 2) + ["a"], "v": values})
+
+    got = bin_counts(df, value="v", by=["g"], maxbins=20)
+    edges = np.linspace(0, 1, 21)
+    for g in ["a", "b"]:
+        want, _ = np.histogram(df.filter(pl.col("g") == g)["v"].to_numpy(), bins=edges)
+        sub = got.filter(pl.col("g") == g)
+        dense = np.zeros(20, dtype=np.int64)
+        dense[np.rint(sub["bin_start"].to_numpy() * 20).astype(int)] = sub["n"].to_numpy()
+        np.testing.assert_array_equal(dense, want)
+
+
+@pytest.mark.parametrize("maxbins", [50, 100])
+def test_bin_counts_puts_edge_values_in_their_own_bin(maxbins: int) -> None:
+    """Probabilities on the 0.01 grid fall in the bin starting at (or just below) them."""
+    df = pl.DataFrame({"g": "a", "v": np.arange(101) / 100})
+    got = bin_counts(df, value="v", by=["g"], maxbins=maxbins)
+
+    per_bin = 100 // maxbins
+    assert got.height == maxbins
+    assert got["n"].to_list() == [per_bin] * (maxbins - 1) + [per_bin + 1]
+    np.testing.assert_allclose(got["bin_start"], np.arange(maxbins) / maxbins)
+
+
+def test_bin_counts_bins_over_the_data_extent() -> None:
+    """Like Vega-Lite's `bin`, a narrow range gets a finer nice step, shared by all groups."""
+    df = pl.DataFrame({"g": ["a", "a", "b", "b"], "v": [0.3, 0.31, 0.35, None]})
+    got = bin_counts(df, value="v", by=["g"], maxbins=20)
+
+    assert got["bin_start"].to_list() == [0.3, 0.31, 0.345]
+    assert got["bin_end"].to_list() == [0.305, 0.315, 0.35]
+    assert got["n"].to_list() == [1, 1, 1]
+
+
+def test_save_chart_moves_large_datasets_to_sidecars(tmp_path: Path) -> None:
+    """Large datasets are written as CSV and referenced by URL; small ones stay inline."""
+    big = pl.DataFrame({"x": np.arange(1000), "ok": [True, False] * 500})
+    small = pl.DataFrame({"x": [1, 2]})
+    chart = alt.Chart(big).mark_point().encode(x="x:Q") + alt.Chart(small).mark_rule().encode(
+        x="x:Q"
+    )
+    save_chart(
+        chart, out_dir=tmp_path, stem="c", data_format="csv", sidecar_min_rows=10, pdf=False
+    )
+
+    spec = json.loads((tmp_path / "c.vl.json").read_text())
+    assert len(spec["datasets"]) == 1
+    (ref,) = [layer["data"] for layer in spec["layer"] if "url" in layer["data"]]
+    assert ref["format"] == {"type": "csv", "parse": {"x": "number", "ok": "boolean"}}
+    assert pl.read_csv(tmp_path / ref["url"]).equals(big)
+
+
+def test_save_chart_skips_current_outputs(tmp_path: Path) -> None:
+    """Unchanged spec + data is not re-rendered; changed data or missing outputs are."""
+
+    def chart(values: list[int]) -> alt.Chart:
+        return alt.Chart(pl.DataFrame({"x": values})).mark_point().encode(x="x:Q")
+
+    assert save_chart(chart([1, 2]), out_dir=tmp_path, stem="c", pdf=False)
+    assert not save_chart(chart([1, 2]), out_dir=tmp_path, stem="c", pdf=False)
+    assert save_chart(chart([1, 3]), out_dir=tmp_path, stem="c", pdf=False)
+    (tmp_path / "c.vl.json").unlink()
+    assert save_chart(chart([1, 3]), out_dir=tmp_path, stem="c", pdf=False)
+    assert save_chart(chart([1, 3]), out_dir=tmp_path, stem="c", pdf=False, force=True)
+
+    timings = render_timings(tmp_path)
+    assert timings["stem"].to_list() == ["c"]
+    assert timings["spec_s"].item() >= 0
+
+
+def test_save_chart_rerenders_missing_sidecars(tmp_path: Path) -> None:
+    """A deleted sidecar data file makes an otherwise current chart re-render."""
+    chart = alt.Chart(pl.DataFrame({"x": np.arange(100)})).mark_point().encode(x="x:Q")
+    kwargs = {"out_dir": tmp_path, "stem": "c", "data_format": "arrow", "pdf": False}
+    assert save_chart(chart, sidecar_min_rows=10, **kwargs)
+    (sidecar,) = (tmp_path / "c.data").iterdir()
+    assert json.loads((tmp_path / "c.render.json").read_text())["sidecars"] == [
+        f"c.data/{sidecar.name}"
+    ]
+    assert not save_chart(chart, sidecar_min_rows=10, **kwargs)
+
+    sidecar.unlink()
+    assert save_chart(chart, sidecar_min_rows=10, **kwargs)
+    assert sidecar.exists()
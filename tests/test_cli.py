@@ -0,0 +1,85 @@
+# `coco` CLI: startup cost and command wiring
+# %%
+
+from collections.abc import Callable
+import json
+import subprocess
+import sys
+
+import polars as pl
+import pytest
+from typer.testing import CliRunner
+
+from coco.cli.main import app
+from coco.gjp.models.survey_fcasts import SurveyForecasts
+from coco.gjp.viz import batch, plot_ifp_correlations
+
+HEAVY_MODULES = ["polars", "pandera", "pydantic", "altair", "numpy", "scipy", "loguru", "tqdm"]
+# Generous: `import coco.cli.main` takes well under 0.1s; the heavy stack is several times that
+IMPORT_BUDGET_S = 0.5
+
+
+def test_cli_import_is_lazy_and_within_budget() -> None:
+    """Importing `coco` / the CLI pulls in no data, plotting or logging stack."""
+    code = f"""
+import json, sys, time
+t0 = time.perf_counter()
+import coco
+import coco.cli.main
+elapsed = time.perf_counter() - t0
+loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "loaded": loaded}}))
+"""
+    out = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(out)
+    assert result["loaded"] == []
+    assert result["elapsed"] < IMPORT_BUDGET_S
+
+
+def test_cli_help_lists_commands() -> None:
+    """Top-level and `figures` help render without loading data."""
+    runner = CliRunner()
+    result = runner.invoke(app, ["--help"])
+    assert result.exit_code == 0
+    for command in ["load", "baselines", "correlations", "figures"]:
+        assert command in result.output
+
+    result = runner.invoke(app, ["figures", "--help"])
+    assert result.exit_code == 0
+    for command in ["user-timelines", "ifp-hists", "corr-matrix", "ifp-timeline"]:
+        assert command in result.output
+
+
+def test_cli_validates_and_forwards_options(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Sidecar formats are a fixed choice; `correlations --ci` reaches `corr_pairs_table`."""
+    calls = {}
+
+    def record(name: str, result: object) -> Callable[..., object]:
+        def fake(*_: object, **kwargs: object) -> object:
+            calls[name] = kwargs
+            return result
+
+        return fake
+
+    summary = pl.DataFrame({"entity": ["1000-0"], "status": ["rendered"]})
+    monkeypatch.setattr(batch, "render_forecast_priors_hists", record("hists", summary))
+    monkeypatch.setattr(SurveyForecasts, "load", lambda: SurveyForecasts(lf=pl.LazyFrame()))
+    monkeypatch.setattr(
+        plot_ifp_correlations, "corr_pairs_table", record("corr", pl.LazyFrame({"r": [0.5]}))
+    )
+    runner = CliRunner()
+
+    result = runner.invoke(app, ["figures", "ifp-hists", "--data-format", "parquet"])
+    assert result.exit_code == 2
+    assert "hists" not in calls
+    result = runner.invoke(app, ["figures", "ifp-hists", "--data-format", "arrow"])
+    assert result.exit_code == 0
+    assert calls["hists"]["data_format"] == "arrow"
+    assert type(calls["hists"]["data_format"]) is str
+
+    result = runner.invoke(app, ["correlations", "--resamples", "10", "--ci", "0.9"])
+    assert result.exit_code == 0
+    assert (calls["corr"]["n_resamples"], calls["corr"]["ci"]) == (10, 0.9)
+    assert runner.invoke(app, ["correlations", "--ci", "1.5"]).exit_code == 2
@@ -0,0 +1,69 @@
+# Columnar cache for parsed source CSVs
+# %%
+
+import os
+from pathlib import Path
+
+import polars as pl
+import pytest
+
+from coco.gjp.models.columnar_cache import cached_scan
+
+
+def _parser(calls: list[Path]):
+    def parse(path: Path) -> pl.LazyFrame:
+        calls.append(path)
+        return pl.scan_csv(path).with_columns(pl.col("d").str.to_date("%Y-%m-%d"))
+
+    return parse
+
+
+def test_cached_scan_builds_once_and_invalidates(tmp_path: Path) -> None:
+    """The parsed copy is reused until the source content (or version) changes."""
+    source = tmp_path / "src.csv"
+    source.write_text("a,d\n1,2012-01-01\n2,2012-01-02\n")
+    cache_dir = tmp_path / "cache"
+    calls: list[Path] = []
+    parse = _parser(calls)
+
+    df = cached_scan(source, parse, cache_dir=cache_dir).collect()
+    assert df.schema["d"] == pl.Date
+    assert len(calls) == 1
+
+    # Cache hit
+    assert cached_scan(source, parse, cache_dir=cache_dir).collect().equals(df)
+    assert len(calls) == 1
+
+    # mtime changes but content does not: hash matches, still a hit
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    cached_scan(source, parse, cache_dir=cache_dir)
+    assert len(calls) == 1
+
+    # Content changes: rebuild
+    source.write_text("a,d\n1,2012-01-01\n2,2012-01-02\n3,2012-01-03\n")
+    assert len(cached_scan(source, parse, cache_dir=cache_dir).collect()) == 3
+    assert len(calls) == 2
+
+    # Parser version bump: rebuild
+    cached_scan(source, parse, version=2, cache_dir=cache_dir)
+    assert len(calls) == 3
+
+
+def test_cached_scan_leaves_no_temp_file_on_failure(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A cache write interrupted midway removes its temp file and leaves no cache behind."""
+    source = tmp_path / "src.csv"
+    source.write_text("a,d\n1,2012-01-01\n")
+    cache_dir = tmp_path / "cache"
+
+    def interrupted(self: pl.DataFrame, file: Path, **kwargs: object) -> None:
+        Path(file).write_bytes(b"PAR1")
+        msg = "interrupted"
+        raise OSError(msg)
+
+    monkeypatch.setattr(pl.DataFrame, "write_parquet", interrupted)
+    with pytest.raises(OSError, match="interrupted"):
+        cached_scan(source, _parser([]), cache_dir=cache_dir)
+    assert list(cache_dir.iterdir()) == []
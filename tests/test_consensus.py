@@ -0,0 +1,63 @@
+# As-of crowd consensus step functions
+# %%
+
+import datetime as dt
+
+import numpy as np
+import polars as pl
+
+from coco.gjp.models.consensus import Consensus
+
+
+def _forecasts() -> pl.DataFrame:
+    t = dt.datetime(2013, 1, 1)
+    rows = [  # (user, value, fcast_type, hours after t)
+        ("u1", 0.2, 0, 0),
+        ("u2", 0.6, 0, 1),
+        ("u3", 0.9, 0, 2),
+        ("u1", 0.4, 1, 3),  # update replaces u1's standing forecast
+        ("u2", 0.6, 4, 4),  # withdraw removes u2
+        ("u3", 0.5, 1, 5),  # two forecasts at the same time: one step
+        ("u2", 0.1, 1, 5),  # u2 forecasts again after withdrawing
+    ]
+    return pl.DataFrame(
+        {
+            "ifp_id": "1000-0",
+            "answer_option": "a",
+            "user_id": [r[0] for r in rows],
+            "value": [r[1] for r in rows],
+            "fcast_type": [r[2] for r in rows],
+            "timestamp": [t + dt.timedelta(hours=r[3]) for r in rows],
+            "forecast_id": list(range(len(rows))),
+        }
+    )
+
+
+def test_steps_follow_standing_forecasts() -> None:
+    """Each step is the mean/median of users' latest forecasts, without withdrawn users."""
+    consensus = Consensus.from_forecasts(_forecasts().sample(fraction=1.0, shuffle=True, seed=0))
+    steps = consensus.steps
+    assert steps["n_users"].to_list() == [1, 2, 3, 3, 2, 3]
+    np.testing.assert_allclose(steps["mean"], [0.2, 0.4, 1.7 / 3, 1.9 / 3, 0.65, 1.0 / 3])
+    np.testing.assert_allclose(steps["median"], [0.2, 0.4, 0.6, 0.6, 0.65, 0.4])
+
+
+def test_point_and_batch_lookups_agree() -> None:
+    """`at` (one as-of join) and `lookup` give the step in force at each time."""
+    consensus = Consensus.from_forecasts(_forecasts())
+    t = dt.datetime(2013, 1, 1)
+    times = [t - dt.timedelta(hours=1), t, t + dt.timedelta(minutes=90), t + dt.timedelta(hours=5)]
+    queries = pl.DataFrame({"ifp_id": "1000-0", "timestamp": times[::-1]})
+
+    result = consensus.at(queries)
+    assert result["timestamp"].to_list() == times[::-1]
+    assert result["consensus_n"].to_list() == [3, 2, 1, 0]
+    np.testing.assert_allclose(result["consensus_mean"][:3], [1.0 / 3, 0.4, 0.2])
+    assert result["consensus_median"][3] is None
+    for when, mean in zip(queries["timestamp"], result["consensus_mean"], strict=True):
+        step = consensus.lookup("1000-0", when)
+        assert (step is None and mean is None) or step["mean"] == mean
+    assert consensus.lookup("1001-0", t) is None
+
+    before = consensus.at(queries, inclusive=False)
+    assert before["consensus_n"].to_list() == [2, 2, 0, 0]
@@ -0,0 +1,40 @@
+# Dictionary encoding for ids and low-cardinality columns
+# %%
+
+import polars as pl
+
+from coco.gjp.models.encoding import build_dictionaries, decode, encode, is_compact
+
+
+def test_encoded_frames_join_group_and_decode() -> None:
+    """Frames encoded with shared dictionaries join/group like strings and decode back."""
+    ifps = pl.DataFrame({"ifp_id": ["1002-0", "1001-0"], "q_status": ["closed", "voided"]})
+    fcasts = pl.DataFrame(
+        {
+            "ifp_id": ["1001-0", "1002-0", "1002-0"],
+            "user_id": ["00010", "00002", "00010"],
+            "answer_option": ["a", "a", "b"],
+            "team": [None, "12", "12"],
+            "value": [0.1, 0.2, 0.3],
+        }
+    )
+    dictionaries = build_dictionaries([ifps.lazy(), fcasts.lazy()])
+    assert dictionaries["ifp_id"].categories.to_list() == ["1001-0", "1002-0"]
+
+    ifps_c = encode(ifps, dictionaries)
+    fcasts_c = encode(fcasts, dictionaries)
+    assert is_compact(fcasts_c)
+    assert not is_compact(fcasts)
+
+    joined = fcasts_c.join(ifps_c, on="ifp_id").filter(pl.col("q_status") != "voided")
+    sums = joined.group_by("user_id").agg(pl.col("value").sum()).sort("user_id")
+
+    expected = (
+        fcasts.join(ifps, on="ifp_id")
+        .filter(pl.col("q_status") != "voided")
+        .group_by("user_id")
+        .agg(pl.col("value").sum())
+        .sort("user_id")
+    )
+    assert decode(sums).equals(expected)
+    assert decode(fcasts_c).equals(fcasts)
@@ -0,0 +1,36 @@
+# Physical layouts of survey forecasts for per-user / per-IFP reads
+# %%
+
+import datetime as dt
+from pathlib import Path
+import random
+
+import polars as pl
+
+from coco.gjp.models.forecast_layout import ForecastLayout
+
+
+def test_forecast_layout_prunes_and_roundtrips(tmp_path: Path) -> None:
+    """Per-user/per-IFP reads return exactly the matching rows from a subset of the data."""
+    rng = random.Random(0)
+    df = pl.DataFrame(
+        {
+            "ifp_id": [f"{rng.randint(1000, 1100)}-0" for _ in range(5_000)],
+            "user_id": [f"{rng.randint(0, 500):05d}" for _ in range(5_000)],
+            "value": [rng.random() for _ in range(5_000)],
+            "timestamp": [
+                dt.datetime(2013, 1, 1) + dt.timedelta(minutes=i) for i in range(5_000)
+            ],
+        }
+    )
+    layout = ForecastLayout(tmp_path, n_buckets=16, row_group_size=256)
+    layout.write(df)
+    assert ForecastLayout(tmp_path).n_buckets == 16
+
+    users = ["00003", "00042"]
+    assert len(layout.bucket_paths(users)) <= 2
+    got = layout.scan_users(users).collect().sort("timestamp")
+    assert got.equals(df.filter(pl.col("user_id").is_in(users)).sort("timestamp"))
+
+    got = layout.scan_ifps(["1050-0"]).collect().sort("timestamp")
+    assert got.equals(df.filter(pl.col("ifp_id") == "1050-0").sort("timestamp"))
@@ -0,0 +1,93 @@
+# Pairwise-complete correlations between IFPs over users' baselines
+# %%
+
+import random
+
+import numpy as np
+import polars as pl
+
+from coco.gjp.models.baseline_matrix import BaselineMatrix
+from coco.gjp.models.ifp_correlations import overlap_corr, pairwise_corr, topk_corr
+
+
+def _baseline_p_a(seed: int = 0) -> pl.DataFrame:
+    """Sparse random baselines, including a constant IFP and a near-empty IFP."""
+    rng = random.Random(seed)
+    rows = {
+        (f"{rng.randint(0, 80):05d}", f"{rng.randint(1000, 1012)}-0"): round(rng.random(), 2)
+        for _ in range(500)
+    }
+    rows |= {(f"{u:05d}", "2000-0"): 0.3 for u in range(10)}  # constant
+    rows |= {("00001", "2001-0"): 0.5}  # single user
+    return pl.DataFrame(
+        [{"user_id": u, "ifp_id": i, "baseline_p_a": v} for (u, i), v in rows.items()]
+    )
+
+
+def test_pairwise_corr_matches_polars_corr() -> None:
+    """Masked matrix products give the same corr (and overlap counts) as pl.corr per pair."""
+    df = _baseline_p_a()
+    matrix = BaselineMatrix.from_baseline_p_a(df)
+    ifp_ids = matrix.ifp_ids
+
+    pivot = df.pivot(values="baseline_p_a", index="user_id", on="ifp_id")
+    expected = pivot.select(
+        [pl.corr(x, y).alias(f"{x}::{y}") for x in ifp_ids for y in ifp_ids]
+    ).row(0)
+    expected_n = pivot.select(
+        [
+            (pl.col(x).is_not_null() & pl.col(y).is_not_null()).sum().alias(f"{x}::{y}")
+            for x in ifp_ids
+            for y in ifp_ids
+        ]
+    ).row(0)
+
+    got = pairwise_corr(matrix, ifp_ids)
+    assert got["ifp_id_x"].to_list() == [x for x in ifp_ids for _ in ifp_ids]
+    assert got["ifp_id_y"].to_list() == [y for _ in ifp_ids for y in ifp_ids]
+    np.testing.assert_allclose(got["corr"].to_numpy(), np.array(expected), atol=1e-9)
+    assert got["n"].to_list() == list(expected_n)
+
+
+def test_topk_corr_matches_full_ranking() -> None:
+    """Tiled streaming top-k keeps the same partners as ranking the full pairwise table."""
+    df = _baseline_p_a(seed=1)
+    matrix = BaselineMatrix.from_baseline_p_a(df)
+    ifp_ids = matrix.ifp_ids
+    k, min_n = 3, 4
+
+    full = (
+        pairwise_corr(matrix, ifp_ids)
+        .filter(
+            (pl.col("ifp_id_x") != pl.col("ifp_id_y"))
+            & (pl.col("n") >= min_n)
+            & pl.col("corr").is_finite()
+        )
+        .with_columns((pl.col("corr") ** 2).alias("r2"))
+    )
+    # A tiny budget forces many tiles (including partial ones)
+    got = topk_corr(matrix, ifp_ids, k=k, min_n=min_n, memory_budget_bytes=1000)
+
+    for ifp_id in ifp_ids:
+        want_r2 = full.filter(pl.col("ifp_id_x") == ifp_id)["r2"].sort(descending=True)[:k]
+        row = got.filter(pl.col("ifp_id_x") == ifp_id)
+        np.testing.assert_allclose(row["r2"].to_numpy(), want_r2.to_numpy(), atol=1e-12)
+        assert row["rank"].to_list() == list(range(1, len(row) + 1))
+        assert (row["n"] >= min_n).all()
+
+
+def test_overlap_corr_matches_pairwise_corr() -> None:
+    """Overlap-pruned pairs are exactly the upper-triangle pairs with n >= min_n."""
+    df = _baseline_p_a(seed=2)
+    matrix = BaselineMatrix.from_baseline_p_a(df)
+    ifp_ids = matrix.ifp_ids
+    min_n = 5
+
+    rank = {ifp_id: i for i, ifp_id in enumerate(ifp_ids)}
+    want = pairwise_corr(matrix, ifp_ids).filter(
+        (pl.col("ifp_id_x").replace_strict(rank) < pl.col("ifp_id_y").replace_strict(rank))
+        & (pl.col("n") >= min_n)
+    )
+    got = overlap_corr(matrix, ifp_ids, min_n=min_n)
+    assert got.select("ifp_id_x", "ifp_id_y", "n").equals(want.select("ifp_id_x", "ifp_id_y", "n"))
+    np.testing.assert_allclose(got["corr"].to_numpy(), want["corr"].to_numpy(), atol=1e-9)
@@ -0,0 +1,49 @@
+# Shared-user / shared-IFP counts from sparse indicator products
+# %%
+
+import random
+
+import polars as pl
+
+from coco.gjp.models.baseline_matrix import BaselineMatrix
+from coco.gjp.models.overlap import ifp_overlap, user_overlap
+
+
+def _baseline_p_a(seed: int = 0) -> pl.DataFrame:
+    rng = random.Random(seed)
+    rows = {
+        (f"{rng.randint(0, 40):05d}", f"{rng.randint(1000, 1015)}-0"): rng.random()
+        for _ in range(200)
+    }
+    return pl.DataFrame(
+        [{"user_id": u, "ifp_id": i, "baseline_p_a": v} for (u, i), v in rows.items()]
+    )
+
+
+def _brute_force(df: pl.DataFrame, *, key: str, other: str, min_shared: int) -> pl.DataFrame:
+    """Self-join on `other` and count, keeping unordered pairs x < y."""
+    pairs = df.select(key, other)
+    return (
+        pairs.join(pairs, on=other, suffix="_y")
+        .rename({key: f"{key}_x"})
+        .filter(pl.col(f"{key}_x") < pl.col(f"{key}_y"))
+        .group_by(f"{key}_x", f"{key}_y")
+        .agg(pl.len().cast(pl.Int64).alias("n"))
+        .filter(pl.col("n") >= min_shared)
+        .sort(f"{key}_x", f"{key}_y")
+    )
+
+
+def test_overlap_counts_match_self_join() -> None:
+    """Indicator products count the same shared users (IFP pairs) / IFPs (user pairs)."""
+    df = _baseline_p_a()
+    matrix = BaselineMatrix.from_baseline_p_a(df)
+
+    for min_shared in [1, 3]:
+        got = ifp_overlap(matrix, min_shared=min_shared)
+        want = _brute_force(df, key="ifp_id", other="user_id", min_shared=min_shared)
+        assert got.equals(want)
+
+        got = user_overlap(matrix, min_shared=min_shared)
+        want = _brute_force(df, key="user_id", other="ifp_id", min_shared=min_shared)
+        assert got.equals(want)
@@ -0,0 +1,36 @@
+# Memory-budgeted dataset registry
+# %%
+
+import polars as pl
+
+from coco.gjp.models.registry import DatasetRegistry
+
+
+def _frame(n: int) -> pl.DataFrame:
+    return pl.DataFrame({"x": pl.int_range(n, eager=True)})
+
+
+def test_registry_hits_misses_and_eviction() -> None:
+    """Entries are reused on hit and evicted LRU-first once over budget."""
+    size = int(_frame(1000).estimated_size())
+    registry = DatasetRegistry(budget_bytes=2 * size)
+
+    registry.get(1, lambda: _frame(1000))
+    registry.get(2, lambda: _frame(1000))
+    registry.get(1, lambda: _frame(1000))  # hit; 2 is now least recently used
+    assert (registry.hits, registry.misses) == (1, 2)
+
+    registry.get(3, lambda: _frame(1000))
+    assert 2 not in registry
+    assert 1 in registry
+    assert 3 in registry
+    assert registry.evictions == 1
+    assert registry.nbytes <= registry.budget_bytes
+
+
+def test_registry_skips_frames_over_budget() -> None:
+    """A frame larger than the whole budget is returned but not cached."""
+    registry = DatasetRegistry(budget_bytes=8)
+    df = registry.get("big", lambda: _frame(1000))
+    assert len(df) == 1000
+    assert "big" not in registry
@@ -0,0 +1,65 @@
+# Time-weighted daily Brier scores from forecast intervals
+# %%
+
+import datetime as dt
+
+import numpy as np
+import polars as pl
+
+from coco.gjp.models.scoring import BrierScores
+
+
+def _forecasts() -> pl.DataFrame:
+    ifps = {  # ifp_id -> (date_start, date_closed, outcome)
+        "1000-0": (dt.date(2013, 1, 1), dt.date(2013, 1, 10), "a"),
+        "1001-0": (dt.date(2013, 1, 1), dt.date(2013, 1, 4), "c"),
+    }
+    forecasts = [  # (user, ctt, ifp, fcast_type, timestamp, {option: value})
+        ("u1", "1a", "1000-0", 0, dt.datetime(2013, 1, 2, 9), {"a": 0.6, "b": 0.4}),
+        ("u1", "1a", "1000-0", 1, dt.datetime(2013, 1, 5, 10), {"a": 0.8, "b": 0.2}),
+        ("u1", "1a", "1000-0", 1, dt.datetime(2013, 1, 5, 12), {"a": 1.0, "b": 0.0}),
+        ("u1", "1a", "1000-0", 4, dt.datetime(2013, 1, 8, 9), {"a": 1.0, "b": 0.0}),
+        ("u1", "1a", "1001-0", 0, dt.datetime(2013, 1, 1, 9), {"a": 0.5, "b": 0.5}),
+        ("u2", "1b", "1000-0", 0, dt.datetime(2012, 12, 30, 9), {"a": 0.5, "b": 0.5}),
+        ("u2", "1b", "1000-0", 1, dt.datetime(2013, 1, 12, 9), {"a": 0.0, "b": 1.0}),
+    ]
+    rows = [
+        {
+            "user_id": user,
+            "ctt": ctt,
+            "ifp_id": ifp,
+            "forecast_id": i,
+            "fcast_type": fcast_type,
+            "answer_option": option,
+            "value": value,
+            "fcast_date": timestamp.date(),
+            "timestamp": timestamp,
+            **dict(zip(["date_start", "date_closed", "outcome"], ifps[ifp], strict=True)),
+        }
+        for i, (user, ctt, ifp, fcast_type, timestamp, values) in enumerate(forecasts)
+        for option, value in values.items()
+    ]
+    return pl.DataFrame(rows)
+
+
+def test_daily_brier_scores_carry_forecasts_forward() -> None:
+    """Forecasts stand until the next one, a withdrawal (inclusive) or the close date."""
+    scores = BrierScores.from_forecasts(_forecasts().sample(fraction=1.0, shuffle=True, seed=0))
+
+    # u1/1000-0: 0.32 on Jan 2-4, then the last forecast of Jan 5 (Brier 0) until the
+    # withdrawal on Jan 8. u1/1001-0: the unreported outcome "c" counts as p = 0. u2: from
+    # the question's start to its close; the forecast after the close is not scored.
+    user_ifp = scores.user_ifp()
+    assert user_ifp["days"].to_list() == [7, 4, 10]
+    expected = [0.32 * 3 / 7, 0.25 + 0.25 + 1.0, 0.5]
+    np.testing.assert_allclose(user_ifp["mean_daily_brier"], expected)
+
+    per_user = scores.per_user()
+    assert per_user["n_ifps"].to_list() == [2, 1]
+    np.testing.assert_allclose(per_user["mean_daily_brier"], [(expected[0] + 1.5) / 2, 0.5])
+    per_ifp = scores.per_ifp()
+    assert per_ifp["n_users"].to_list() == [2, 1]
+    np.testing.assert_allclose(per_ifp["mean_daily_brier"], [(expected[0] + 0.5) / 2, 1.5])
+    per_ctt = scores.per_condition("ctt")
+    assert per_ctt["ctt"].to_list() == ["1a", "1b"]
+    np.testing.assert_allclose(per_ctt["mean_daily_brier"], per_user["mean_daily_brier"])
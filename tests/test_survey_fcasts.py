@@ -0,0 +1,167 @@
+# Versioned survey forecasts: dataset versions and the materialized studied frame
+# %%
+
+import datetime as dt
+from functools import partial
+from pathlib import Path
+import random
+
+import polars as pl
+import pytest
+
+from coco.gjp.models import survey_fcasts
+from coco.gjp.models.baseline_store import BaselineStore
+from coco.gjp.models.columnar_cache import source_fingerprint
+from coco.gjp.models.registry import REGISTRY
+from coco.gjp.models.survey_fcasts import SurveyForecasts
+
+
+def test_dataset_version_follows_source_fingerprints(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """The version hashes the IFP and year sources; editing one of them changes it."""
+    monkeypatch.setattr(survey_fcasts, "SURVEY_FCASTS_DIR", tmp_path)
+    monkeypatch.setattr(survey_fcasts, "IFP_CSV_PATH", tmp_path / "ifps.csv")
+    monkeypatch.setattr(
+        survey_fcasts, "source_fingerprint", partial(source_fingerprint, cache_dir=tmp_path)
+    )
+    (tmp_path / "ifps.csv").write_text("ifp_id\n1000-0\n")
+    for year in (1, 2):
+        (tmp_path / f"survey_fcasts.yr{year}.csv").write_text("user_id\n00001\n")
+
+    version = SurveyForecasts.dataset_version((1, 2))
+    assert SurveyForecasts.dataset_version((1, 2)) == version
+    assert SurveyForecasts.dataset_version((1,)) != version
+
+    (tmp_path / "survey_fcasts.yr2.csv").write_text("user_id\n00002\n")
+    changed = SurveyForecasts.dataset_version((1, 2))
+    assert changed != version
+    (tmp_path / "ifps.csv").write_text("ifp_id\n1001-0\n")
+    assert SurveyForecasts.dataset_version((1, 2)) not in {version, changed}
+
+
+def test_studied_is_served_from_the_registry(monkeypatch: pytest.MonkeyPatch) -> None:
+    """A versioned dataset joins the studied IFPs once; unversioned data joins every time."""
+    calls = []
+
+    def join(lf: pl.LazyFrame) -> pl.LazyFrame:
+        calls.append(lf)
+        return lf.with_columns(short_title=pl.lit("Thing"))
+
+    monkeypatch.setattr(SurveyForecasts, "_join_studied_ifps", staticmethod(join))
+    lf = pl.LazyFrame({"ifp_id": ["1000-0"], "user_id": ["00001"]})
+    sf = SurveyForecasts(lf=lf, version="test-studied-registry")
+    try:
+        first = sf.studied().collect()
+        assert sf.filter_studied().collect().equals(first)
+        assert len(calls) == 1
+        assert ("studied", "test-studied-registry", False) in REGISTRY
+    finally:
+        REGISTRY.clear()
+
+    unversioned = SurveyForecasts(lf=lf)
+    unversioned.studied()
+    unversioned.studied()
+    assert len(calls) == 3
+
+
+def _forecasts(n: int = 500, seed: int = 0) -> pl.DataFrame:
+    """Random binary forecasts of 10 users on 5 IFPs."""
+    rng = random.Random(seed)
+    t0 = dt.datetime(2012, 1, 1)
+    rows = []
+    for forecast_id in rng.sample(range(10 * n), n):
+        ts = t0 + dt.timedelta(hours=rng.randint(0, 300))
+        ifp_id, value = f"{rng.randint(1000, 1004)}-0", round(rng.random(), 2)
+        for option, p in [("a", value), ("b", 1 - value)]:
+            rows.append(
+                {
+                    "ifp_id": ifp_id,
+                    "user_id": f"{forecast_id % 10:05d}",
+                    "answer_option": option,
+                    "value": p,
+                    "timestamp": ts,
+                    "fcast_date": ts.date(),
+                    "forecast_id": forecast_id,
+                }
+            )
+    return pl.DataFrame(rows)
+
+
+def _sorted(lf: pl.LazyFrame) -> pl.DataFrame:
+    df = lf.collect()
+    return df.sort(df.columns)
+
+
+@pytest.mark.parametrize("versioned", [False, True])
+def test_entity_baselines_match_filtered_baselines(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, *, versioned: bool
+) -> None:
+    """`*_for` queries equal the full baselines filtered to the same users/IFPs."""
+    monkeypatch.setattr(SurveyForecasts, "_join_studied_ifps", staticmethod(lambda lf: lf))
+    forecasts = _forecasts()
+    if versioned:
+        store = BaselineStore(tmp_path)
+        store.sync({1: "v1"}, lambda _: forecasts.lazy())
+        monkeypatch.setattr(SurveyForecasts, "baseline_store", lambda _: store)
+    sf = SurveyForecasts(lf=forecasts.lazy(), years=(1,), version="v1" if versioned else None)
+
+    users, ifps = {"00001", "00004"}, ("1002-0",)
+    for kwargs, predicate in [
+        ({"user_ids": users}, pl.col("user_id").is_in(users)),
+        ({"ifp_ids": ifps}, pl.col("ifp_id").is_in(ifps)),
+        (
+            {"user_ids": users, "ifp_ids": ifps},
+            pl.col("user_id").is_in(users) & pl.col("ifp_id").is_in(ifps),
+        ),
+    ]:
+        got = _sorted(sf.baselines_for(**kwargs))
+        assert got.height > 0
+        assert got.equals(_sorted(sf.baselines().filter(predicate)))
+        got = _sorted(sf.baseline_p_a_for(**kwargs))
+        assert got.height > 0
+        assert got.equals(_sorted(sf.baseline_p_a().filter(predicate)))
+
+    counts = sf.user_baseline_counts().collect()
+    assert counts["len"].is_sorted()
+    expected = sf.baselines().group_by("user_id").len().collect()
+    assert dict(counts.iter_rows()) == dict(expected.iter_rows())
+
+
+def test_entity_baselines_reject_bad_arguments() -> None:
+    """A bare string is not a collection of ids; forecasts need the baseline columns."""
+    sf = SurveyForecasts(lf=_forecasts().lazy())
+    with pytest.raises(TypeError, match="single string"):
+        sf.baselines_for(user_ids="00001")
+    with pytest.raises(TypeError, match="single string"):
+        sf.baseline_p_a_for(ifp_ids="1000-0")
+
+    no_values = _forecasts().drop("value").lazy()
+    with pytest.raises(ValueError, match=r"Missing required columns: \['value'\]"):
+        sf.baselines_for(user_ids=["00001"], lf=no_values)
+    with pytest.raises(ValueError, match=r"Missing required columns: \['value'\]"):
+        sf.baseline_p_a_for(lf=no_values)
+
+
+def test_baseline_matrix_follows_ingested_batches(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Batches appended to the baseline store give a new matrix under the same version."""
+    monkeypatch.setattr(SurveyForecasts, "_join_studied_ifps", staticmethod(lambda lf: lf))
+    monkeypatch.setattr(survey_fcasts, "BASELINE_MATRIX_DIR", tmp_path / "matrix")
+    store = BaselineStore(tmp_path / "store")
+    forecasts = _forecasts()
+    store.sync({1: "v1"}, lambda _: forecasts.lazy())
+    monkeypatch.setattr(SurveyForecasts, "baseline_store", lambda _: store)
+    sf = SurveyForecasts(lf=forecasts.lazy(), years=(1,), version="v1")
+
+    first = sf.baseline_matrix()
+    assert sf.baseline_matrix_path() == sf.baseline_matrix_path()
+    assert "00010" not in first.user_ids
+
+    batch = _forecasts(n=20, seed=1).with_columns(user_id=pl.lit("00010"))
+    assert store.ingest(batch.lazy(), year=1) > 0
+    second = sf.baseline_matrix()
+    assert "00010" in second.user_ids
+    assert second.nnz > first.nnz
+    assert len(list((tmp_path / "matrix").iterdir())) == 2